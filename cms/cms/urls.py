@@ -19,7 +19,10 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from main.admin import request_timing_view
+
 urlpatterns = [
+    path('admin/request-timing/', admin.site.admin_view(request_timing_view), name='request_timing'),  # 請求計時統計
     path('admin/', admin.site.urls),
     path('nested_admin/', include('nested_admin.urls')),
     path('ckeditor/', include('ckeditor_uploader.urls')),
@@ -6,3 +6,5 @@ class HomepageConfig(AppConfig):
     name = 'homepage'
     verbose_name = '首頁管理'
 
+    def ready(self):
+        from . import signals  # noqa: F401
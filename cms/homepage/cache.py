@@ -0,0 +1,147 @@
+"""
+首頁快取（stale-while-revalidate）
+
+首頁是流量最大的頁面而且很少變更：整頁 HTML 預先組好放在快取中，請求只讀快取、不查詢資料庫。
+
+- 快取項目超過 HOMEPAGE_CACHE_SOFT_TTL 秒，或顯示的套票 / Hero 圖片在頁面快取中的相依版本改變時
+  （例如改價、修改套票內容、背景工作產生了圖片衍生檔）視為過期
+- 過期時由一個請求取得重建鎖（single_flight.get_lock，檔案快取為鎖檔），在背景執行緒重建；
+  其他請求（包括這個請求）照樣取得舊的頁面
+- 精選套票、大陸、首頁設定與 Hero 圖片變更時，由信號（homepage/signals.py）在交易提交後主動重建
+- 只有快取中完全沒有首頁時（第一次啟動或快取被清除）才在請求中同步產生，
+  並以 single_flight 確保同時進來的請求只產生一次，其他請求等待結果
+
+首頁 HTML 不依請求而變（樣板沒有使用 user / csrf_token），登入與匿名訪客共用同一份快取。
+"""
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+
+from main.geography import geography
+from main.images import load_pictures
+from main.models import Package
+from main.page_cache import bump_dependencies, dependency_key, get_dependency_versions
+from main.queries import package_card_queryset
+from main.routers import reading_from_replica
+from main.single_flight import get_lock, single_flight
+from .models import HeroSlide, HomepageSettings
+
+logger = logging.getLogger(__name__)
+
+HOMEPAGE_CACHE_KEY = 'homepage:page'
+HOMEPAGE_REFRESH_LOCK_KEY = 'homepage:refreshing'
+# 首頁本身的相依鍵（與頁面快取共用版本 token），主動重建前先更新
+HOMEPAGE_DEPENDENCY = 'homepage:*'
+
+
+def build_context():
+    """組出首頁樣板的 context"""
+    # 獲取所有活動的套票（與列表頁共用 PackageCard 讀取模型）
+    packages = list(package_card_queryset().filter(is_featured=True)[:6])  # 只顯示前 6 個套票
+
+    secondary_featured_packages = list(
+        package_card_queryset()
+        .filter(is_secondary_featured=True)
+        .order_by("-package_updated_at", "-created_at")[:4]
+    )
+
+    # 獲取所有活動的大陸（由地區登錄表提供，不需查詢）
+    continents = geography().active_continents
+
+    # 讀取首頁設定與 Hero 輪播圖片（篩選寫在 Prefetch 內，圖片與檔案資料以 select_related 一併載入）
+    settings_obj = (
+        HomepageSettings.objects.filter(is_active=True)
+        .prefetch_related(Prefetch(
+            "slides",
+            queryset=HeroSlide.objects.filter(is_active=True, image__isnull=False)
+            .select_related("image")
+            .order_by("order", "id"),
+            to_attr="active_slides",
+        ))
+        .first()
+    )
+    hero_slides = settings_obj.active_slides if settings_obj else []
+
+    return {
+        "packages": packages,
+        "continents": continents,
+        "secondary_featured_packages": secondary_featured_packages,
+        "page_title": "首頁",
+        "hero_slides": hero_slides,
+        "pictures": load_pictures([(slide.image, "hero") for slide in hero_slides]),
+    }
+
+
+def rebuild_homepage():
+    """重新產生首頁並寫入快取，回傳快取項目"""
+    # 首頁與列表的版本在查詢前讀取：重建期間若有變更，這次的結果會被視為過期
+    versions = get_dependency_versions([HOMEPAGE_DEPENDENCY, dependency_key(Package)])
+    context = build_context()
+    # 首頁上的套票與 Hero 圖片：背景工作產生衍生檔後只更新這些資料列的版本
+    row_keys = [
+        dependency_key(Package, card.pk)
+        for card in context["packages"] + context["secondary_featured_packages"]
+    ] + [dependency_key(HeroSlide, slide.pk) for slide in context["hero_slides"]]
+    versions.update(get_dependency_versions(row_keys))
+    entry = {
+        "content": render_to_string("homepage/home.html", context),
+        # 在公開請求中讀取複本時（只有快取完全沒有首頁的情況），下一個請求即在背景由主資料庫重建
+        "built_at": 0 if reading_from_replica() else time.time(),
+        "versions": versions,
+    }
+    cache.set(HOMEPAGE_CACHE_KEY, entry, timeout=None)
+    return entry
+
+
+def _is_stale(entry):
+    if time.time() - entry["built_at"] > settings.HOMEPAGE_CACHE_SOFT_TTL:
+        return True
+    return get_dependency_versions(entry["versions"]) != entry["versions"]
+
+
+def _refresh(lock):
+    try:
+        rebuild_homepage()
+    except Exception:
+        logger.exception("首頁背景重建失敗")
+    finally:
+        lock.release()
+        # 背景執行緒有自己的資料庫連線，結束前關閉
+        connections.close_all()
+
+
+def refresh_homepage():
+    """在背景重建首頁；已有其他請求 / 行程在重建時不重複執行，回傳是否啟動了重建"""
+    lock = get_lock(HOMEPAGE_REFRESH_LOCK_KEY)
+    if not lock.acquire():
+        return False
+    # daemon 執行緒不會延遲行程結束；重建中止時鎖隨行程釋放（鎖檔）或逾期（cache.add），
+    # 首頁仍是過期狀態，下一個請求會再重建
+    threading.Thread(target=_refresh, args=(lock,), name="homepage-refresh", daemon=True).start()
+    return True
+
+
+def invalidate_homepage():
+    """首頁資料已變更（交易提交後呼叫）：讓目前的快取過期並在背景重建"""
+    bump_dependencies(HOMEPAGE_DEPENDENCY)
+    refresh_homepage()
+
+
+def get_homepage():
+    """取得首頁 HTML；過期時照樣回傳舊的頁面並在背景重建"""
+    entry = cache.get(HOMEPAGE_CACHE_KEY)
+    if entry is None:
+        return single_flight(
+            HOMEPAGE_CACHE_KEY,
+            lambda: rebuild_homepage()["content"],
+            lambda: (cache.get(HOMEPAGE_CACHE_KEY) or {}).get("content"),
+        )
+    if _is_stale(entry):
+        refresh_homepage()
+    return entry["content"]
@@ -0,0 +1,60 @@
+"""
+homepage 應用的模型信號：首頁顯示的資料變更時，在交易提交後重建首頁快取
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from main.models import Continent, Package
+from .cache import invalidate_homepage
+from .models import HeroSlide, HomepageSettings
+
+# 決定套票是否出現在首頁的欄位
+HOMEPAGE_FIELDS = ('is_featured', 'is_secondary_featured', 'is_active')
+
+
+def _homepage_state(instance):
+    # 直接讀 __dict__，避免觸發延遲載入欄位的查詢
+    return tuple(instance.__dict__.get(name) for name in HOMEPAGE_FIELDS)
+
+
+def _on_homepage(state):
+    is_featured, is_secondary_featured, is_active = state
+    return bool(is_active and (is_featured or is_secondary_featured))
+
+
+@receiver(post_init, sender=Package)
+def remember_homepage_state(sender, instance, **kwargs):
+    instance._homepage_state = _homepage_state(instance)
+
+
+@receiver(post_save, sender=Package)
+def rebuild_homepage_for_package(sender, instance, raw=False, **kwargs):
+    """
+    精選旗標或上下架改變，或首頁上的套票內容改變時重建；
+    其他套票的儲存不影響首頁
+    """
+    if raw:
+        return
+    previous = instance._homepage_state
+    current = _homepage_state(instance)
+    instance._homepage_state = current
+    if _on_homepage(previous) or _on_homepage(current):
+        transaction.on_commit(invalidate_homepage)
+
+
+@receiver(post_delete, sender=Package)
+def rebuild_homepage_for_deleted_package(sender, instance, **kwargs):
+    if _on_homepage(instance._homepage_state):
+        transaction.on_commit(invalidate_homepage)
+
+
+@receiver(post_save, sender=Continent)
+@receiver(post_save, sender=HomepageSettings)
+@receiver(post_save, sender=HeroSlide)
+@receiver(post_delete, sender=Continent)
+@receiver(post_delete, sender=HomepageSettings)
+@receiver(post_delete, sender=HeroSlide)
+def rebuild_homepage_for_row(sender, raw=False, **kwargs):
+    if not raw:
+        transaction.on_commit(invalidate_homepage)
@@ -1,12 +1,17 @@
 import json
 
 from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
 import nested_admin
 from django.contrib import messages
-from django.shortcuts import redirect
+from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
+from django.db.models import F, Q
 from django.urls import path, reverse
 from django.utils.html import format_html
-from django.http import HttpResponseRedirect, JsonResponse
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from django.utils import timezone
 
 from .models import (
     Continent,
@@ -22,11 +27,60 @@ from .models import (
     RoomImage,
     DailyItinerary,
     ItineraryImage,
+    Job,
 )
-from .utils import generate_content_with_perplexity
+from .jobs import enqueue, job_status
+from . import timing
+from .price_grid import grid_prices, save_price_changes
+from .tree_saving import BatchedInlineFormSet, save_formsets
 
 # Register your models here.
 
+class RelatedSearchFilter(admin.FieldListFilter):
+    """
+    以關鍵字搜尋關聯的篩選器：側欄只有一個輸入框，不會把關聯資料表整張載入成選項，
+    資料量大的套票、城市等關聯使用這個篩選器。
+
+    用法：list_filter = [('package', RelatedSearchFilter.on('name', 'slug'))]
+    """
+    template = 'admin/main/search_filter.html'
+    search_fields = ['name']
+
+    @classmethod
+    def on(cls, *search_fields):
+        return type(cls.__name__, (cls,), {'search_fields': list(search_fields)})
+
+    def __init__(self, field, request, params, model, model_admin, field_path):
+        self.parameter_name = f'{field_path}__search'
+        super().__init__(field, request, params, model, model_admin, field_path)
+        self.value = str(self.used_parameters.get(self.parameter_name, '')).strip()
+
+    def expected_parameters(self):
+        return [self.parameter_name]
+
+    def queryset(self, request, queryset):
+        if not self.value:
+            return queryset
+        condition = Q()
+        for name in self.search_fields:
+            condition |= Q(**{f'{self.field_path}__{name}__icontains': self.value})
+        return queryset.filter(condition)
+
+    def choices(self, changelist):
+        yield {
+            'selected': bool(self.value),
+            'value': self.value,
+            'parameter_name': self.parameter_name,
+            # 送出時保留其他篩選、搜尋與排序條件，並回到第一頁
+            'hidden_params': [
+                (name, value) for name, value in changelist.params.items()
+                if name not in (self.parameter_name, PAGE_VAR)
+            ],
+            'clear_query_string': changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+
+
 @admin.register(Continent)
 class ContinentAdmin(admin.ModelAdmin):
     """大陸管理界面"""
@@ -44,6 +98,7 @@ class CountryAdmin(admin.ModelAdmin):
     """國家管理界面"""
     list_display = ['name', 'continent', 'name_en', 'slug', 'is_active', 'created_at']
     list_filter = ['continent', 'is_active', 'created_at']
+    list_select_related = ['continent']
     search_fields = ['name', 'name_en', 'slug']
     list_editable = ['is_active']
     readonly_fields = ['created_at', 'updated_at']
@@ -55,13 +110,39 @@ class CountryAdmin(admin.ModelAdmin):
 class CityAdmin(admin.ModelAdmin):
     """城市管理界面"""
     list_display = ['name', 'country', 'name_en', 'slug', 'is_active', 'created_at']
-    list_filter = ['country', 'is_active', 'created_at']
+    list_filter = [('country', RelatedSearchFilter.on('name', 'name_en')), 'is_active', 'created_at']
+    list_select_related = ['country__continent']
     search_fields = ['name', 'name_en', 'slug', 'country__name']
     list_editable = ['is_active']
     readonly_fields = ['created_at', 'updated_at']
     prepopulated_fields = {'slug': ('name_en',)}
     ordering = ['country__name', 'name']
 
+    def get_list_display(self, request):
+        return super().get_list_display(request) + ['price_grid_link']
+
+    @admin.display(description='房價表')
+    def price_grid_link(self, obj):
+        return format_html('<a href="{}">編輯房價</a>', reverse('admin:main_city_prices', args=[obj.pk]))
+
+    def get_urls(self):
+        return [
+            path(
+                '<int:city_id>/prices/',
+                self.admin_site.admin_view(self.price_grid_view),
+                name='main_city_prices',
+            ),
+        ] + super().get_urls()
+
+    def price_grid_view(self, request, city_id):
+        """城市內所有套票的房價表"""
+        city = get_object_or_404(City, pk=city_id)
+        return price_grid_response(
+            request, self.admin_site, f'{city.name} 的房價表',
+            grid_prices(room_type__hotel__period__package__city=city), show_package=True,
+            back_url=reverse('admin:main_city_changelist'),
+        )
+
 
 @admin.register(PackageType)
 class PackageTypeAdmin(admin.ModelAdmin):
@@ -89,14 +170,20 @@ class PackageAdmin(nested_admin.NestedModelAdmin):
     """套票管理界面"""
     change_form_template = "admin/main/package/change_form.html"
     list_display = ['name', 'slug', 'city', 'package_type', 'price', 'is_active', 'is_featured', 'is_secondary_featured', 'created_at', 'copy_package_link']
-    list_filter = ['city__country__continent', 'city__country', 'city', 'package_type', 'is_active', 'is_featured', 'is_secondary_featured', 'created_at']
+    list_filter = [
+        'city__country__continent',
+        ('city__country', RelatedSearchFilter.on('name', 'name_en')),
+        ('city', RelatedSearchFilter.on('name', 'name_en')),
+        'package_type', 'is_active', 'is_featured', 'is_secondary_featured', 'created_at',
+    ]
+    list_select_related = ['city__country', 'package_type']
     search_fields = ['name', 'slug', 'subtitle', 'package_type__name', 'city__name', 'city__country__name']
     list_editable = ['price', 'is_active', 'is_featured', 'is_secondary_featured']
     readonly_fields = ['created_at', 'updated_at']
     ordering = ['-created_at']
     filter_horizontal = ['tags']
     prepopulated_fields = {'slug': ('name',)}
-    actions = ['copy_selected_packages']
+    actions = ['copy_selected_packages', 'prebuild_selected_pdfs', 'warm_selected_thumbnails']
     
     fieldsets = (
         ('基本資訊', {
@@ -133,6 +220,17 @@ class PackageAdmin(nested_admin.NestedModelAdmin):
         }),
     )
     inlines = []
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'city':
+            # 選項顯示「城市 (國家)」
+            kwargs['queryset'] = City.objects.select_related('country')
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def save_related(self, request, form, formsets, change):
+        # 子資料只寫入有變更的列，並批次更新衍生資料（見 tree_saving.py）
+        form.save_m2m()
+        save_formsets(formsets)
     
     def copy_package_link(self, obj):
         """複製套票連結"""
@@ -146,22 +244,33 @@ class PackageAdmin(nested_admin.NestedModelAdmin):
     copy_package_link.short_description = '複製套票'
     copy_package_link.allow_tags = True
     
+    def _enqueue_for_selected(self, request, queryset, task_name, label):
+        """將選中的套票交給背景工作處理，並提供工作狀態連結"""
+        job = enqueue(task_name, {'package_ids': list(queryset.values_list('pk', flat=True))}, user=request.user)
+        url = reverse('admin:main_job_change', args=[job.pk])
+        self.message_user(
+            request,
+            format_html('已將 {} 個套票排入背景工作「{}」，<a href="{}">查看進度</a>', queryset.count(), label, url),
+            level=messages.SUCCESS,
+        )
+
     def copy_selected_packages(self, request, queryset):
-        """批量複製選中的套票"""
-        copied_count = 0
-        for package in queryset:
-            try:
-                new_package = package.copy_package()
-                copied_count += 1
-            except Exception as e:
-                self.message_user(request, f'複製套票 "{package.name}" 時發生錯誤: {str(e)}', level=messages.ERROR)
-        
-        if copied_count > 0:
-            self.message_user(request, f'成功複製了 {copied_count} 個套票', level=messages.SUCCESS)
-        else:
-            self.message_user(request, '沒有套票被複製', level=messages.WARNING)
-    
+        """批量複製選中的套票（背景執行）"""
+        self._enqueue_for_selected(request, queryset, 'copy_packages', '複製套票')
+
     copy_selected_packages.short_description = '複製選中的套票'
+
+    def prebuild_selected_pdfs(self, request, queryset):
+        """預先產生選中套票的每天行程 PDF（背景執行）"""
+        self._enqueue_for_selected(request, queryset, 'prebuild_itinerary_pdfs', '產生行程 PDF')
+
+    prebuild_selected_pdfs.short_description = '預先產生每天行程 PDF'
+
+    def warm_selected_thumbnails(self, request, queryset):
+        """預先產生選中套票的圖片縮圖（背景執行）"""
+        self._enqueue_for_selected(request, queryset, 'warm_thumbnails', '產生縮圖')
+
+    warm_selected_thumbnails.short_description = '預先產生圖片縮圖'
     
     def get_urls(self):
         """添加自定義URL"""
@@ -177,8 +286,36 @@ class PackageAdmin(nested_admin.NestedModelAdmin):
                 self.admin_site.admin_view(self.generate_ai_description_view),
                 name='main_package_generate_ai_description',
             ),
+            path(
+                '<int:package_id>/branches/<str:branch>/<int:object_id>/',
+                self.admin_site.admin_view(self.branch_view),
+                name='main_package_branch',
+            ),
+            path(
+                '<int:package_id>/prices/',
+                self.admin_site.admin_view(self.price_grid_view),
+                name='main_package_prices',
+            ),
         ]
         return custom_urls + urls
+
+    def branch_view(self, request, package_id, branch, object_id):
+        """載入（GET）或儲存（POST）套票底下的一個子樹"""
+        if branch not in PACKAGE_BRANCHES:
+            raise Http404
+        model, admin_class = PACKAGE_BRANCHES[branch]
+        if not model.objects.filter(pk=object_id, package_id=package_id).exists():
+            raise Http404
+        return admin_class(model, self.admin_site).changeform_view(request, str(object_id))
+
+    def price_grid_view(self, request, package_id):
+        """套票所有房價的表格"""
+        package = get_object_or_404(Package, pk=package_id)
+        return price_grid_response(
+            request, self.admin_site, f'{package.name} 的房價表',
+            grid_prices(room_type__hotel__period__package=package), show_package=False,
+            back_url=reverse('admin:main_package_change', args=[package.pk]),
+        )
     
     def copy_package_view(self, request, package_id):
         """複製套票視圖"""
@@ -199,7 +336,8 @@ class PackageAdmin(nested_admin.NestedModelAdmin):
         處理 AI 自動生成套票描述的請求
 
         參考舊專案 sns.PackageAdmin.generate_ai_description_view 的行為，
-        但改為使用 main.utils.generate_content_with_perplexity，並將詳細錯誤訊息回傳前端。
+        改為建立背景工作（main.tasks.generate_ai_description），立即回傳工作狀態網址，
+        詳細錯誤訊息會出現在工作狀態中。
         """
         if request.method != 'POST':
             return JsonResponse({'success': False, 'error': '只接受 POST 請求'}, status=405)
@@ -230,24 +368,19 @@ class PackageAdmin(nested_admin.NestedModelAdmin):
                 status=400,
             )
 
-        # 呼叫 Perplexity API
-        generated_content, error = generate_content_with_perplexity(ai_prompt)
-
-        if generated_content:
-            package.description = generated_content
-            package.save()
-            return JsonResponse(
-                {'success': True, 'content': generated_content},
-                status=200,
-            )
-
-        # 失敗時將詳細錯誤訊息帶回前端，方便除錯
+        # Perplexity API 最久需要 60 秒，交給背景工作執行，前端以 status_url 輪詢結果
+        job = enqueue(
+            'generate_ai_description',
+            {'package_id': package.pk, 'prompt': ai_prompt},
+            user=request.user,
+        )
         return JsonResponse(
             {
-                'success': False,
-                'error': error or 'AI 生成內容失敗，請檢查 API 設定或稍後再試',
+                'success': True,
+                'job_id': job.pk,
+                'status_url': reverse('admin:main_job_status', args=[job.pk]),
             },
-            status=500,
+            status=202,
         )
 
 
@@ -257,7 +390,8 @@ class PackageAdmin(nested_admin.NestedModelAdmin):
 class RoomPriceInline(nested_admin.NestedStackedInline):
     """房間價格內聯"""
     model = RoomPrice
-    extra = 1
+    formset = BatchedInlineFormSet
+    extra = 0
     fieldsets = (
         ('價格資訊', {
             'fields': ('price', 'price_description', 'is_active')
@@ -265,11 +399,16 @@ class RoomPriceInline(nested_admin.NestedStackedInline):
     )
     classes = ['collapse']
 
+    def get_queryset(self, request):
+        # 表單標題顯示 __str__，一併載入上層避免逐筆查詢
+        return super().get_queryset(request).select_related('room_type')
+
 
 class RoomImageInline(nested_admin.NestedStackedInline):
     """房間圖片內聯"""
     model = RoomImage
-    extra = 1
+    formset = BatchedInlineFormSet
+    extra = 0
     fieldsets = (
         ('圖片資訊', {
             'fields': ('image', 'image_description', 'is_active')
@@ -277,12 +416,17 @@ class RoomImageInline(nested_admin.NestedStackedInline):
     )
     classes = ['collapse']
 
+    def get_queryset(self, request):
+        # 表單標題顯示 __str__，一併載入上層避免逐筆查詢
+        return super().get_queryset(request).select_related('room_type')
+
 
 # 第三層：房型 Inline
 class RoomTypeInline(nested_admin.NestedStackedInline):
     """房型內聯"""
     model = RoomType
-    extra = 1
+    formset = BatchedInlineFormSet
+    extra = 0
     fieldsets = (
         ('房型資訊', {
             'fields': ('room_type_name', 'is_active')
@@ -292,12 +436,17 @@ class RoomTypeInline(nested_admin.NestedStackedInline):
     show_change_link = True
     classes = ['collapse']
 
+    def get_queryset(self, request):
+        # 表單標題顯示 __str__，一併載入上層避免逐筆查詢
+        return super().get_queryset(request).select_related('hotel')
+
 
 # 第二層：酒店 Inline
 class HotelInline(nested_admin.NestedStackedInline):
     """酒店內聯"""
     model = Hotel
-    extra = 1
+    formset = BatchedInlineFormSet
+    extra = 0
     fieldsets = (
         ('酒店資訊', {
             'fields': ('hotel_name', 'is_active')
@@ -306,78 +455,125 @@ class HotelInline(nested_admin.NestedStackedInline):
     inlines = [RoomTypeInline]
     show_change_link = True
 
+    def get_queryset(self, request):
+        # 表單標題顯示 __str__，一併載入上層避免逐筆查詢
+        return super().get_queryset(request).select_related('period')
+
+
+def branch_placeholder(obj, branch, label):
+    """套票編輯頁中子樹的收合區塊，展開時才以 AJAX 載入表單"""
+    if obj is None or obj.pk is None:
+        return f'儲存後即可編輯{label}'
+    url = reverse('admin:main_package_branch', args=[obj.package_id, branch, obj.pk])
+    return format_html(
+        '<div class="lazy-branch" data-url="{}">'
+        '<button type="button" class="button lazy-branch-toggle">展開{}</button>'
+        '<span class="lazy-branch-status"></span>'
+        '<div class="lazy-branch-body" hidden></div>'
+        '</div>',
+        url, label,
+    )
+
 
-# 第一層：期間 Inline
+# 第一層：期間 Inline（酒店以下的子樹展開時才載入，見 PackageBranchAdmin）
 class PeriodInline(nested_admin.NestedStackedInline):
     """期間內聯"""
     model = Period
+    formset = BatchedInlineFormSet
     extra = 1
     fieldsets = (
         ('期間資訊', {
-            'fields': ('period_text', 'is_active')
+            'fields': ('period_text', 'is_active', 'hotels_branch')
         }),
     )
-    inlines = [HotelInline]
+    readonly_fields = ['hotels_branch']
     show_change_link = True
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('package')
+
+    @admin.display(description='酒店與房型')
+    def hotels_branch(self, obj):
+        return branch_placeholder(obj, 'period', '酒店與房型')
+
 
 # ========== 獨立 Admin 配置 ==========
+# 列表依模型的 Meta ordering 排序，但上層以外鍵 id 取代上層的 Meta ordering（避免排序時 JOIN 上層表），
+# 由各模型的（外鍵, 排序欄位）索引支援；pk 讓分頁順序固定
 
 @admin.register(RoomPrice)
 class RoomPriceAdmin(admin.ModelAdmin):
     """房間價格管理界面"""
     list_display = ['room_type', 'price', 'price_description', 'is_active', 'created_at']
-    list_filter = ['is_active', 'created_at']
+    list_filter = [('room_type__hotel__period__package', RelatedSearchFilter.on('name', 'slug')), 'is_active', 'created_at']
+    list_select_related = ['room_type__hotel']
     search_fields = ['room_type__room_type_name', 'price', 'price_description']
     list_editable = ['is_active']
     readonly_fields = ['created_at', 'updated_at']
-    ordering = ['room_type', 'price']
+    ordering = ['room_type_id', 'price', 'pk']
+    show_full_result_count = False
 
 
 @admin.register(RoomImage)
 class RoomImageAdmin(admin.ModelAdmin):
     """房間圖片管理界面"""
     list_display = ['room_type', 'image', 'image_description', 'is_active', 'created_at']
-    list_filter = ['is_active', 'created_at']
+    list_filter = [('room_type__hotel__period__package', RelatedSearchFilter.on('name', 'slug')), 'is_active', 'created_at']
+    list_select_related = ['room_type__hotel']
     search_fields = ['room_type__room_type_name', 'image_description']
     list_editable = ['is_active']
     readonly_fields = ['created_at', 'updated_at']
-    ordering = ['room_type', 'created_at']
+    ordering = ['room_type_id', 'created_at', 'pk']
+    show_full_result_count = False
 
 
 @admin.register(RoomType)
 class RoomTypeAdmin(admin.ModelAdmin):
     """房型管理界面"""
     list_display = ['room_type_name', 'hotel', 'is_active', 'created_at']
-    list_filter = ['is_active', 'created_at']
+    list_filter = [('hotel__period__package', RelatedSearchFilter.on('name', 'slug')), 'is_active', 'created_at']
+    list_select_related = ['hotel__period']
     search_fields = ['room_type_name', 'hotel__hotel_name']
     list_editable = ['is_active']
     readonly_fields = ['created_at', 'updated_at']
-    ordering = ['hotel', 'room_type_name']
+    ordering = ['hotel_id', 'room_type_name', 'pk']
+    show_full_result_count = False
     inlines = [RoomPriceInline, RoomImageInline]
 
 
 @admin.register(Hotel)
 class HotelAdmin(admin.ModelAdmin):
     """酒店管理界面"""
-    list_display = ['hotel_name', 'period', 'is_active', 'created_at']
-    list_filter = ['is_active', 'created_at']
+    list_display = ['hotel_name', 'period_label', 'is_active', 'created_at']
+    list_filter = [('period__package', RelatedSearchFilter.on('name', 'slug')), 'is_active', 'created_at']
     search_fields = ['hotel_name', 'period__period_text', 'period__package__name']
     list_editable = ['is_active']
     readonly_fields = ['created_at', 'updated_at']
-    ordering = ['period', 'hotel_name']
+    ordering = ['period_id', 'hotel_name', 'pk']
+    show_full_result_count = False
     inlines = [RoomTypeInline]
 
+    def get_queryset(self, request):
+        # 列表只需要套票名稱，不載入整筆套票（描述等大型欄位）
+        return super().get_queryset(request).annotate(
+            period_text_value=F('period__period_text'), package_name=F('period__package__name'),
+        )
+
+    @admin.display(description='所屬期間', ordering='period_id')
+    def period_label(self, obj):
+        return f"{obj.package_name} - {obj.period_text_value}"
+
 
 @admin.register(Period)
 class PeriodAdmin(admin.ModelAdmin):
     """期間管理界面"""
-    list_display = ['period_text', 'package', 'is_active', 'created_at']
-    list_filter = ['package', 'is_active', 'created_at']
+    list_display = ['period_text', 'package_label', 'is_active', 'created_at']
+    list_filter = [('package', RelatedSearchFilter.on('name', 'slug')), 'is_active', 'created_at']
     search_fields = ['period_text', 'package__name']
     list_editable = ['is_active']
     readonly_fields = ['created_at', 'updated_at']
-    ordering = ['package', 'period_text']
+    ordering = ['package_id', 'period_text', 'pk']
+    show_full_result_count = False
     fieldsets = (
         ('基本資訊', {
             'fields': ('package', 'period_text')
@@ -392,6 +588,14 @@ class PeriodAdmin(admin.ModelAdmin):
     )
     inlines = [HotelInline]
 
+    def get_queryset(self, request):
+        # 列表只需要套票名稱，不載入整筆套票（描述等大型欄位）
+        return super().get_queryset(request).annotate(package_name=F('package__name'))
+
+    @admin.display(description='所屬套票', ordering='package_id')
+    def package_label(self, obj):
+        return obj.package_name
+
 
 # ========== 每天行程管理配置 ==========
 
@@ -399,16 +603,21 @@ class PeriodAdmin(admin.ModelAdmin):
 class ItineraryImageInline(nested_admin.NestedTabularInline):
     """行程相片內聯"""
     model = ItineraryImage
-    extra = 1
+    formset = BatchedInlineFormSet
+    extra = 0
     fields = ('image', 'caption', 'display_order', 'is_featured', 'is_active')
     readonly_fields = []
     ordering = ['display_order', 'created_at']
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('itinerary')
+
 
-# 每天行程 Inline（用於套票管理中）
+# 每天行程 Inline（用於套票管理中；相片展開時才載入，見 PackageBranchAdmin）
 class DailyItineraryInline(nested_admin.NestedStackedInline):
     """每天行程內聯"""
     model = DailyItinerary
+    formset = BatchedInlineFormSet
     extra = 1
     fieldsets = (
         ('基本資訊', {
@@ -420,9 +629,153 @@ class DailyItineraryInline(nested_admin.NestedStackedInline):
         ('顯示設定', {
             'fields': ('display_order', 'is_active'),
         }),
+        ('行程相片', {
+            'fields': ('images_branch',),
+        }),
     )
+    readonly_fields = ['images_branch']
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('package')
+
+    @admin.display(description='行程相片')
+    def images_branch(self, obj):
+        return branch_placeholder(obj, 'itinerary', '行程相片')
+
+
+class PackageBranchAdmin(nested_admin.NestedModelAdmin):
+    """
+    套票編輯頁中依需求載入的子樹：期間 → 酒店 → 房型 → 價格 / 圖片，以及每天行程 → 相片。
+
+    不註冊到管理後台，由 PackageAdmin.branch_view 轉交；只輸出 inline 表單片段，
+    儲存時只寫入這個子樹（期間 / 行程本身的欄位在套票表單中編輯），成功時回傳 JSON。
+    """
+    change_form_template = 'admin/main/package/branch_form.html'
+    branch = ''
+
+    def get_fields(self, request, obj=None):
+        return []
+
+    def get_formset_kwargs(self, request, obj, inline, prefix):
+        # 同一頁可同時展開多個子樹，前綴加上子樹名稱與 id 避免衝突
+        kwargs = super().get_formset_kwargs(request, obj, inline, prefix)
+        kwargs['prefix'] = f'{self.branch}-{obj.pk}-{prefix}'
+        return kwargs
+
+    def save_model(self, request, obj, form, change):
+        pass
+
+    def save_related(self, request, form, formsets, change):
+        save_formsets(formsets)
+
+    def response_change(self, request, obj):
+        return JsonResponse({'success': True})
+
+
+class PeriodBranchAdmin(PackageBranchAdmin):
+    branch = 'period'
+    inlines = [HotelInline]
+
+
+class ItineraryBranchAdmin(PackageBranchAdmin):
+    branch = 'itinerary'
     inlines = [ItineraryImageInline]
 
 
+PACKAGE_BRANCHES = {
+    'period': (Period, PeriodBranchAdmin),
+    'itinerary': (DailyItinerary, ItineraryBranchAdmin),
+}
+
+
 # 將期間資訊和每天行程作為套票的內聯編輯，實現完整的嵌套結構
 PackageAdmin.inlines = [PeriodInline, DailyItineraryInline]
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """背景工作管理界面"""
+    change_form_template = "admin/main/job/change_form.html"
+    list_display = ['id', 'task', 'status', 'attempts', 'created_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'task', 'created_at']
+    list_select_related = ['created_by']
+    search_fields = ['task', 'error']
+    readonly_fields = [
+        'task', 'payload', 'status', 'result', 'error', 'attempts', 'max_attempts', 'run_after',
+        'locked_by', 'locked_at', 'created_by', 'created_at', 'finished_at',
+    ]
+    ordering = ['-created_at']
+    actions = ['retry_jobs']
+
+    def has_add_permission(self, request):
+        return False
+
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                '<int:job_id>/status/',
+                self.admin_site.admin_view(self.job_status_view),
+                name='main_job_status',
+            ),
+        ]
+        return custom_urls + urls
+
+    def job_status_view(self, request, job_id):
+        """供前端輪詢的工作狀態"""
+        try:
+            job = Job.objects.get(pk=job_id)
+        except Job.DoesNotExist:
+            return JsonResponse({'success': False, 'error': '找不到指定的工作'}, status=404)
+        return JsonResponse({'success': True, **job_status(job)})
+
+    def retry_jobs(self, request, queryset):
+        """將失敗的工作重新排入佇列"""
+        count = queryset.filter(status=Job.STATUS_FAILED).update(
+            status=Job.STATUS_PENDING, attempts=0, run_after=timezone.now(), finished_at=None,
+        )
+        self.message_user(request, f'已重新排入 {count} 筆工作', level=messages.SUCCESS)
+
+    retry_jobs.short_description = '重新執行失敗的工作'
+
+
+def price_grid_response(request, admin_site, title, prices, show_package, back_url):
+    """
+    房價表（見 price_grid.py）：GET 顯示表格，POST 接收 JSON {"changes": [...]} 並一次寫入，回傳 JSON。
+    """
+    if not request.user.has_perm('main.change_roomprice'):
+        raise PermissionDenied
+
+    if request.method == 'POST':
+        try:
+            changes = json.loads(request.body or b'{}').get('changes') or []
+            updated, errors = save_price_changes(prices, changes)
+        except (json.JSONDecodeError, AttributeError, ValidationError):
+            return JsonResponse({'success': False, 'error': '無效的請求資料格式'}, status=400)
+        if errors:
+            return JsonResponse({'success': False, 'errors': errors}, status=400)
+        return JsonResponse({'success': True, 'updated': updated})
+
+    context = {
+        **admin_site.each_context(request),
+        'title': title,
+        'prices': prices,
+        'show_package': show_package,
+        'back_url': back_url,
+    }
+    return TemplateResponse(request, 'admin/main/price_grid.html', context)
+
+
+def request_timing_view(request):
+    """請求計時統計（僅限工作人員，由 cms/urls.py 以 admin_site.admin_view 包裝）"""
+    if request.method == 'POST':
+        timing.reset()
+        messages.success(request, '已清除計時統計')
+        return redirect('request_timing')
+    context = {
+        **admin.site.each_context(request),
+        'title': '請求計時',
+        'stats': timing.endpoint_stats(),
+        'sample_rate': timing.sample_rate(),
+    }
+    return TemplateResponse(request, 'admin/request_timing.html', context)
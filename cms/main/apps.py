@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
+        from .nplusone import install, is_enabled
+
+        # N+1 偵測的掛勾會包裝 Django 的關聯存取，只在啟用偵測時安裝（測試由 NPlusOneTestRunner 安裝）
+        if is_enabled():
+            install()
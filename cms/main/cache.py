@@ -0,0 +1,80 @@
+"""
+套票卡片片段快取
+
+列表頁與首頁的每張套票卡片都會以 (套票 pk, updated_at) 為鍵快取渲染結果。
+套票本身儲存時 updated_at 會改變，快取鍵自然更新；
+城市 / 國家 / 大陸 / 標籤變更或套票刪除時，則遞增全域的卡片世代號，讓舊片段全部失效。
+
+卡片世代號、地區版本與整頁快取的相依版本都存放在 version_cache()，不會與頁面一起被清除或淘汰。
+"""
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_GENERATION_KEY = 'package-card:generation'
+
+# 版本 token 使用的快取別名（見 settings.CACHES）
+VERSION_CACHE_ALIAS = 'versions'
+
+
+def version_cache():
+    """存放版本 token 的快取；未設定 versions 別名時（例如 Redis）與預設快取相同"""
+    if VERSION_CACHE_ALIAS in settings.CACHES:
+        return caches[VERSION_CACHE_ALIAS]
+    return cache
+
+
+def get_card_generation():
+    """取得目前的卡片世代號"""
+    versions = version_cache()
+    generation = versions.get(CARD_GENERATION_KEY)
+    if generation is None:
+        versions.add(CARD_GENERATION_KEY, 1, timeout=None)
+        generation = versions.get(CARD_GENERATION_KEY, 1)
+    return generation
+
+
+def bump_card_generation():
+    """遞增卡片世代號，使所有已快取的卡片片段失效"""
+    versions = version_cache()
+    try:
+        versions.incr(CARD_GENERATION_KEY)
+    except ValueError:
+        versions.set(CARD_GENERATION_KEY, 2, timeout=None)
+
+
+def card_cache_key(package, template_name, generation):
+    """組出單張卡片的快取鍵"""
+    updated_at = package.updated_at.timestamp() if package.updated_at else 0
+    return f'package-card:{generation}:{template_name}:{package.pk}:{updated_at}'
+
+
+def render_package_cards(packages, template_name):
+    """
+    渲染一組套票卡片。
+
+    一次以 get_many 取回整頁的快取片段，只有未命中的卡片才會渲染模板，
+    再以 set_many 寫回，避免每張卡片各自存取快取後端。
+    """
+    packages = list(packages)
+    if not packages:
+        return mark_safe('')
+
+    generation = get_card_generation()
+    keys = [card_cache_key(package, template_name, generation) for package in packages]
+    cached = cache.get_many(keys)
+
+    fragments = []
+    missing = {}
+    for key, package in zip(keys, packages):
+        fragment = cached.get(key)
+        if fragment is None:
+            fragment = render_to_string(template_name, {'package': package})
+            missing[key] = fragment
+        fragments.append(fragment)
+
+    if missing:
+        cache.set_many(missing, timeout=settings.PACKAGE_CARD_CACHE_TIMEOUT)
+
+    return mark_safe(''.join(fragments))
@@ -0,0 +1,36 @@
+"""
+快取後端
+
+Django 的 FileBasedCache 每次寫入都會呼叫 _cull()，列出整個快取目錄以判斷是否超過 MAX_ENTRIES，
+整頁快取與版本 token 的寫入成本因此隨項目數成長；超過上限時又隨機刪除項目，可能刪到沒有期限的版本 token。
+
+這裡的 FileBasedCache 改為每個行程每 CULL_INTERVAL 秒最多檢查一次（MAX_ENTRIES 因此是大約的上限），
+OPTIONS 設定 CULL=False 時完全不清除，用於版本 token 的快取（見 settings.CACHES 的 versions）。
+"""
+import threading
+import time
+
+from django.core.cache.backends import filebased
+
+# 各快取目錄下次檢查的時間（同一行程的所有執行緒共用）
+_next_cull = {}
+_next_cull_lock = threading.Lock()
+
+
+class FileBasedCache(filebased.FileBasedCache):
+
+    def __init__(self, dir, params):
+        super().__init__(dir, params)
+        options = params.get('OPTIONS', {})
+        self._cull_enabled = options.get('CULL', True)
+        self._cull_interval = options.get('CULL_INTERVAL', 60)
+
+    def _cull(self):
+        if not self._cull_enabled:
+            return
+        now = time.monotonic()
+        with _next_cull_lock:
+            if now < _next_cull.get(self._dir, 0):
+                return
+            _next_cull[self._dir] = now + self._cull_interval
+        super()._cull()
@@ -0,0 +1,30 @@
+"""
+系統檢查
+
+整頁快取、卡片片段快取、地區登錄表與首頁快取的失效都是在快取中更新版本 token，
+儲存資料的行程（後台的 gunicorn worker、run_worker、管理指令）與讀取快取的行程必須看到同一個快取。
+LocMemCache 只存在於各自的行程內，其他行程會一直提供舊的頁面直到快取逾時，因此不允許使用。
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+from .cache import VERSION_CACHE_ALIAS
+
+# 只存在於單一行程內的快取後端
+PROCESS_LOCAL_CACHE_BACKENDS = {
+    'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    errors = []
+    for alias in ('default', VERSION_CACHE_ALIAS):
+        backend = settings.CACHES.get(alias, {}).get('BACKEND')
+        if backend in PROCESS_LOCAL_CACHE_BACKENDS:
+            errors.append(Error(
+                f'快取 {alias} 使用只存在於單一行程內的 LocMemCache，其他行程的儲存不會讓這個行程的頁面快取失效。',
+                hint='設定 CACHE_BACKEND=file（同一台主機）或 CACHE_BACKEND=redis（多台主機）。',
+                id='main.E001',
+            ))
+    return errors
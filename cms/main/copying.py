@@ -0,0 +1,209 @@
+"""
+套票深層複製
+
+一次載入整棵套票樹（期間 → 酒店 → 房型 → 價格 / 圖片，行程 → 相片），
+查詢數固定，再依層級以 bulk_create 寫入，並以舊 pk → 新物件的對照表串起下一層的外鍵。
+整個複製在同一個 transaction 內完成，任何一層失敗都不會留下半套資料。
+
+bulk_create 不會呼叫 save() 也不會送出 post_save 信號，
+因此 save() 內的價格解析在這裡直接處理，卡片、最低房價與全文索引則在最後批次更新。
+"""
+from functools import reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.text import slugify
+
+from .fulltext import refresh_search_documents
+from .models import (
+    DailyItinerary,
+    Hotel,
+    ItineraryImage,
+    Package,
+    Period,
+    RoomImage,
+    RoomPrice,
+    RoomType,
+)
+from .pricing import parse_price, update_min_room_prices
+from .read_models import refresh_package_cards
+
+# 套票本身要複製的欄位（其餘欄位使用預設值或由程式決定）
+PACKAGE_COPY_FIELDS = [
+    'package_type_id', 'city_id', 'subtitle', 'description', 'ai_prompt_description', 'price',
+    'price_include_item', 'price_exclude_item', 'price_vaild_date', 'flight_info', 'tips', 'main_image',
+    'rich_text_table_one', 'rich_text_table', 'rich_text_table_three',
+]
+
+COPY_PREFETCH = [
+    'tags',
+    'periods__hotels__room_types__prices',
+    'periods__hotels__room_types__images',
+    'daily_itineraries__images',
+]
+
+
+def _copy_slugs(sources, overrides):
+    """
+    為複製的套票產生 slug：預設為「原 slug-copy」，同城市已有相同 slug 時依序加上 -2、-3...
+    既有 slug 以一個查詢取得。
+    """
+    bases = {}
+    for package in sources:
+        name, slug = overrides.get(package.pk, (None, None))
+        if slug:
+            bases[package.pk] = (slug, False)
+        else:
+            base = package.slug or slugify(package.name) or 'package'
+            bases[package.pk] = (f"{base}-copy", True)
+
+    conditions = [
+        Q(city_id=package.city_id, slug__startswith=bases[package.pk][0])
+        for package in sources if bases[package.pk][1]
+    ]
+    taken = set()
+    if conditions:
+        taken = set(Package.objects.filter(reduce(or_, conditions)).values_list('city_id', 'slug'))
+
+    slugs = {}
+    for package in sources:
+        base, generated = bases[package.pk]
+        slug = base
+        if generated:
+            counter = 2
+            while (package.city_id, slug) in taken:
+                slug = f"{base}-{counter}"
+                counter += 1
+        taken.add((package.city_id, slug))
+        slugs[package.pk] = slug
+    return slugs
+
+
+def copy_packages(packages, overrides=None):
+    """
+    複製多個套票，回傳新套票列表（順序與來源相同）。
+
+    packages 可以是套票查詢、套票列表或 pk 列表；
+    overrides 為 {來源 pk: (新名稱, 新 slug)}，未指定時名稱加上「(複製)」。
+    複製的套票預設為非啟用、非精選。
+    """
+    overrides = overrides or {}
+    if isinstance(packages, (list, tuple, set)):
+        pks = [getattr(package, 'pk', package) for package in packages]
+    else:
+        pks = list(packages.values_list('pk', flat=True))
+    if not pks:
+        return []
+
+    by_pk = {package.pk: package for package in Package.objects.filter(pk__in=pks).prefetch_related(*COPY_PREFETCH)}
+    sources = [by_pk[pk] for pk in pks if pk in by_pk]
+
+    with transaction.atomic():
+        slugs = _copy_slugs(sources, overrides)
+
+        # 第一層：套票
+        new_packages = []
+        for source in sources:
+            name = overrides.get(source.pk, (None, None))[0]
+            new_package = Package(
+                name=name or f"{source.name} (複製)",
+                slug=slugs[source.pk],
+                is_active=False,  # 複製的套票預設為非啟用狀態
+                is_featured=False,  # 複製的套票預設為非精選
+                is_secondary_featured=False,  # 複製的套票預設為非次要精選
+                **{field: getattr(source, field) for field in PACKAGE_COPY_FIELDS},
+            )
+            new_package.price_amount, new_package.price_currency = parse_price(new_package.price)
+            new_packages.append(new_package)
+        Package.objects.bulk_create(new_packages)
+        package_map = {source.pk: new for source, new in zip(sources, new_packages)}
+
+        # 標籤
+        Through = Package.tags.through
+        Through.objects.bulk_create([
+            Through(package_id=package_map[source.pk].pk, packagetag_id=tag.pk)
+            for source in sources for tag in source.tags.all()
+        ])
+
+        # 第二層：期間、每天行程
+        period_pairs = [
+            (period, Period(package=package_map[source.pk], period_text=period.period_text, is_active=period.is_active))
+            for source in sources for period in source.periods.all()
+        ]
+        itinerary_pairs = [
+            (itinerary, DailyItinerary(
+                package=package_map[source.pk],
+                day_number=itinerary.day_number,
+                title=itinerary.title,
+                description=itinerary.description,
+                meal_info=itinerary.meal_info,
+                accommodation=itinerary.accommodation,
+                transportation=itinerary.transportation,
+                notes=itinerary.notes,
+                display_order=itinerary.display_order,
+                is_active=itinerary.is_active,
+            ))
+            for source in sources for itinerary in source.daily_itineraries.all()
+        ]
+        Period.objects.bulk_create([new for _, new in period_pairs])
+        DailyItinerary.objects.bulk_create([new for _, new in itinerary_pairs])
+
+        # 第三層：酒店、行程相片（Django-Filer 的圖片會被參照，不會複製實體檔案）
+        hotel_pairs = [
+            (hotel, Hotel(period=new_period, hotel_name=hotel.hotel_name, is_active=hotel.is_active))
+            for period, new_period in period_pairs for hotel in period.hotels.all()
+        ]
+        Hotel.objects.bulk_create([new for _, new in hotel_pairs])
+        ItineraryImage.objects.bulk_create([
+            ItineraryImage(
+                itinerary=new_itinerary,
+                image_id=image.image_id,
+                caption=image.caption,
+                display_order=image.display_order,
+                is_featured=image.is_featured,
+                is_active=image.is_active,
+            )
+            for itinerary, new_itinerary in itinerary_pairs for image in itinerary.images.all()
+        ])
+
+        # 第四層：房型
+        room_type_pairs = [
+            (room_type, RoomType(hotel=new_hotel, room_type_name=room_type.room_type_name, is_active=room_type.is_active))
+            for hotel, new_hotel in hotel_pairs for room_type in hotel.room_types.all()
+        ]
+        RoomType.objects.bulk_create([new for _, new in room_type_pairs])
+
+        # 第五層：房間價格與圖片
+        new_prices = []
+        for room_type, new_room_type in room_type_pairs:
+            for price in room_type.prices.all():
+                new_price = RoomPrice(
+                    room_type=new_room_type,
+                    price=price.price,
+                    price_description=price.price_description,
+                    is_active=price.is_active,
+                )
+                new_price.price_amount, new_price.price_currency = parse_price(new_price.price)
+                new_prices.append(new_price)
+        RoomPrice.objects.bulk_create(new_prices)
+        RoomImage.objects.bulk_create([
+            RoomImage(
+                room_type=new_room_type,
+                image=image.image,
+                image_description=image.image_description,
+                is_active=image.is_active,
+            )
+            for room_type, new_room_type in room_type_pairs for image in room_type.images.all()
+        ])
+
+        _refresh_derived_data([package.pk for package in new_packages])
+
+    return new_packages
+
+
+def _refresh_derived_data(package_ids):
+    """bulk_create 不會觸發信號，批次更新最低房價、卡片與全文索引"""
+    update_min_room_prices(package_ids)
+    refresh_package_cards(package_ids)
+    refresh_search_documents(package_ids)
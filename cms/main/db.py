@@ -0,0 +1,39 @@
+"""
+大量資料的分批讀取
+
+重建與回填指令（rebuild_package_cards、rebuild_search_index、backfill_prices、generate_image_derivatives、
+prebuild_itinerary_pdfs）需要讀過整個目錄，不能一次把結果全部載入記憶體：
+
+- PostgreSQL 以 QuerySet.iterator() 開啟 server-side cursor，資料庫端逐批送出
+- 停用 server-side cursor 時（DATABASE_DISABLE_SERVER_SIDE_CURSORS，經由 PgBouncer transaction pooling），
+  psycopg2 會在執行查詢時取回全部結果，改為依主鍵分頁，每批兩個查詢
+- SQLite 的 cursor 本來就逐批讀取，直接使用 iterator()
+"""
+from django.db import connections
+
+
+def uses_server_side_cursors(using):
+    connection = connections[using]
+    return connection.vendor == 'postgresql' and not connection.settings_dict.get('DISABLE_SERVER_SIDE_CURSORS')
+
+
+def chunked(queryset, chunk_size):
+    """
+    逐筆產生 queryset 的結果，記憶體中最多保留 chunk_size 筆（prefetch_related 也依批次執行）。
+
+    依主鍵分頁時結果依主鍵排序；其他情況保留 queryset 原本的排序。
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql' or uses_server_side_cursors(queryset.db):
+        yield from queryset.iterator(chunk_size=chunk_size)
+        return
+
+    ordered = queryset.order_by('pk')
+    last_pk = None
+    while True:
+        page = ordered if last_pk is None else ordered.filter(pk__gt=last_pk)
+        pks = list(page.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return
+        yield from ordered.filter(pk__in=pks)
+        last_pk = pks[-1]
@@ -0,0 +1,132 @@
+"""
+套票分面搜尋
+
+PackageFacet 表為每個啟用中的套票預先展開各維度的分面值，
+搜尋時每個維度只需要一個以 (dimension, value, package) 索引支援的彙總查詢，
+查詢數量固定，與套票總數無關。
+"""
+from django.db.models import Count
+
+from .models import PackageFacet
+
+# 搜尋參數名稱與分面維度相同，例如 ?city=3&city=5&tag=2&price=10000-20000&days=5
+FACET_DIMENSIONS = [dimension for dimension, _ in PackageFacet.DIMENSION_CHOICES]
+
+# 價格區間（下限含、上限不含；None 表示無上限）
+PRICE_BUCKETS = [
+    (0, 10000),
+    (10000, 20000),
+    (20000, 30000),
+    (30000, 50000),
+    (50000, 100000),
+    (100000, None),
+]
+
+
+def price_bucket(amount):
+    """回傳價格所屬的 (value, label, sort_key)，無價格時回傳 None"""
+    if amount is None:
+        return None
+    for low, high in PRICE_BUCKETS:
+        if amount >= low and (high is None or amount < high):
+            if high is None:
+                return f'{low}-', f'{low:,} 以上', low
+            return f'{low}-{high}', f'{low:,} - {high:,}', low
+    return None
+
+
+def build_facets(package, card, trip_days):
+    """由套票與其卡片建立（尚未儲存的）分面資料；未啟用的套票不建立任何分面"""
+    if not card.is_active:
+        return []
+
+    facets = []
+
+    def add(dimension, value, label, sort_key=0):
+        facets.append(PackageFacet(
+            package_id=package.pk,
+            dimension=dimension,
+            value=str(value),
+            label=label[:100],
+            sort_key=sort_key,
+        ))
+
+    if card.continent_id:
+        add('continent', card.continent_id, card.continent_name)
+    if card.country_id:
+        add('country', card.country_id, card.country_name)
+    if card.city_id:
+        add('city', card.city_id, card.city_name)
+    if package.package_type_id:
+        add('package_type', package.package_type_id, card.package_type_name)
+    for tag in package.tags.all():
+        if tag.is_active:
+            add('tag', tag.pk, tag.name)
+    bucket = price_bucket(card.from_price)
+    if bucket:
+        add('price', *bucket)
+    if trip_days:
+        add('days', trip_days, f'{trip_days} 天', trip_days)
+
+    return facets
+
+
+def parse_facet_filters(params):
+    """從 GET 參數取出已選擇的分面值：{dimension: [value, ...]}"""
+    selected = {}
+    for dimension in FACET_DIMENSIONS:
+        values = [value for value in params.getlist(dimension) if value]
+        if values:
+            selected[dimension] = values
+    return selected
+
+
+def _restrict(queryset, selected, exclude_dimension=None, field='pk'):
+    """以子查詢套用分面條件（同維度為 OR，不同維度為 AND）"""
+    for dimension, values in selected.items():
+        if dimension == exclude_dimension:
+            continue
+        queryset = queryset.filter(**{
+            f'{field}__in': PackageFacet.objects.filter(
+                dimension=dimension, value__in=values,
+            ).values('package_id')
+        })
+    return queryset
+
+
+def filter_by_facets(queryset, selected):
+    """以已選擇的分面篩選套票卡片查詢"""
+    return _restrict(queryset, selected)
+
+
+def facet_counts(selected, package_ids=None):
+    """
+    計算每個維度的分面數量。
+
+    採「分離式」分面：計算某維度時忽略該維度自己的條件，
+    讓使用者可以在同一維度內切換或複選。每個維度一個查詢。
+    package_ids 為全文檢索的結果時，只計算這些套票。
+    """
+    base = PackageFacet.objects.all()
+    if package_ids is not None:
+        base = base.filter(package_id__in=package_ids)
+
+    results = {}
+    for dimension in FACET_DIMENSIONS:
+        queryset = _restrict(
+            base.filter(dimension=dimension),
+            selected,
+            exclude_dimension=dimension,
+            field='package_id',
+        )
+        rows = (
+            queryset.values('value', 'label', 'sort_key')
+            .annotate(count=Count('package_id'))
+            .order_by('sort_key', '-count', 'label')
+        )
+        chosen = set(selected.get(dimension, ()))
+        results[dimension] = [
+            {**row, 'selected': row['value'] in chosen}
+            for row in rows
+        ]
+    return results
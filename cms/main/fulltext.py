@@ -0,0 +1,269 @@
+"""
+中日韓（CJK）感知的全文檢索
+
+套票名稱、描述、每天行程與酒店名稱多為繁體中文，且描述為 CKEditor 產生的 HTML。
+這裡先去除 HTML，再把 CJK 文字切成「字元二元組」（bigram），英數字則以單字為單位，
+結果以空白分隔存進 SearchDocument，由資料庫的全文索引負責倒排與排名：
+
+- SQLite：FTS5 虛擬表（external content，由 trigger 同步），以 bm25() 排名
+- PostgreSQL：tsvector（'simple' 設定）+ GIN 索引，以 ts_rank() 排名；另有 pg_trgm 索引支援單字查詢
+- 其他資料庫：退回 plain_text 的 icontains 比對
+"""
+import html
+import re
+
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.html import strip_tags
+
+from .db import chunked
+from .models import Hotel, Package, SearchDocument
+
+# 依相關度排名的套票數；之後的結果仍會列出（總數與分面不受限），依套票編號排在後面
+SEARCH_RESULT_LIMIT = 500
+
+# 全量重建時每批處理的套票數
+REBUILD_BATCH_SIZE = 500
+
+# 標題欄位（名稱、副標題）在排名中的權重
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+
+FTS_TABLE = 'main_searchdocument_fts'
+
+CJK_RANGES = (
+    '㐀-䶿'   # CJK 擴充 A
+    '一-鿿'   # CJK 統一表意文字
+    '豈-﫿'   # CJK 相容表意文字
+    '぀-ヿ'   # 平假名 / 片假名
+    '가-힯'   # 韓文音節
+)
+TOKEN_PATTERN = re.compile(rf'[{CJK_RANGES}]+|[^\W_]+', re.UNICODE)
+CJK_PATTERN = re.compile(rf'[{CJK_RANGES}]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def strip_html(text):
+    """去除 CKEditor HTML 標籤與實體，並壓縮空白"""
+    if not text:
+        return ''
+    text = html.unescape(strip_tags(str(text)))
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def tokenize(text):
+    """
+    將文字切成索引用的詞：CJK 連續字元切成重疊的二元組（單一字元則保留本身），
+    其他文字以英數字單字為單位並轉成小寫。
+    """
+    tokens = []
+    for run in TOKEN_PATTERN.findall(text or ''):
+        if CJK_PATTERN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run.lower())
+    return tokens
+
+
+def build_document(package, itineraries, hotel_names):
+    """由套票與其行程、酒店名稱建立（尚未儲存的）搜尋文件"""
+    title = ' '.join(filter(None, [package.name, package.subtitle]))
+    body_parts = [strip_html(package.description)]
+    for itinerary in itineraries:
+        body_parts.extend([itinerary.title, strip_html(itinerary.description), strip_html(itinerary.notes)])
+    body_parts.extend(hotel_names)
+    body = ' '.join(filter(None, body_parts))
+
+    return SearchDocument(
+        package_id=package.pk,
+        title_tokens=' '.join(tokenize(title)),
+        body_tokens=' '.join(tokenize(body)),
+        plain_text=f'{title} {body}',
+    )
+
+
+def refresh_search_documents(package_ids):
+    """重建指定套票的搜尋文件；未啟用或已刪除的套票會從索引移除"""
+    package_ids = [pk for pk in set(package_ids) if pk is not None]
+    if not package_ids:
+        return 0
+
+    packages = (
+        Package.objects.filter(pk__in=package_ids, is_active=True)
+        .only('pk', 'name', 'subtitle', 'description')
+        .prefetch_related('daily_itineraries')
+    )
+    hotel_names = {}
+    hotels = Hotel.objects.filter(
+        period__package_id__in=package_ids, is_active=True, period__is_active=True,
+    ).values_list('period__package_id', 'hotel_name')
+    for package_id, hotel_name in hotels:
+        hotel_names.setdefault(package_id, []).append(hotel_name)
+
+    documents = [
+        build_document(
+            package,
+            [itinerary for itinerary in package.daily_itineraries.all() if itinerary.is_active],
+            hotel_names.get(package.pk, []),
+        )
+        for package in packages
+    ]
+
+    with transaction.atomic():
+        SearchDocument.objects.filter(package_id__in=package_ids).exclude(
+            package_id__in=[document.package_id for document in documents]
+        ).delete()
+        SearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['package'],
+            update_fields=['title_tokens', 'body_tokens', 'plain_text', 'updated_at'],
+        )
+    return len(documents)
+
+
+def rebuild_search_index():
+    """全量重建所有套票的搜尋文件，並清除已不存在或未啟用的套票"""
+    total = 0
+    batch = []
+    for pk in chunked(Package.objects.order_by('pk').values_list('pk', flat=True), REBUILD_BATCH_SIZE):
+        batch.append(pk)
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            total += refresh_search_documents(batch)
+            batch = []
+    if batch:
+        total += refresh_search_documents(batch)
+    SearchDocument.objects.exclude(package__is_active=True).delete()
+    return total
+
+
+def _match_expression(tokens):
+    """FTS5 查詢：每個詞以雙引號包住，全部需符合（AND）"""
+    return ' '.join('"{}"'.format(token.replace('"', '""')) for token in tokens)
+
+
+def _split_tokens(tokens):
+    """
+    將查詢詞分成 (索引詞, 單一 CJK 字元)。
+
+    索引只存多字元 CJK 的二元組（「石垣島」→「石垣」「垣島」），單一字元無法在索引中比對，
+    改以去除 HTML 後的純文字比對。
+    """
+    indexed, single_chars = [], []
+    for token in tokens:
+        if len(token) == 1 and CJK_PATTERN.match(token):
+            single_chars.append(token)
+        else:
+            indexed.append(token)
+    return indexed, single_chars
+
+
+def search_package_ids(query, limit=SEARCH_RESULT_LIMIT):
+    """依相關度排序回傳符合查詢的套票 id 列表"""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+
+    vendor = connection.vendor
+    indexed, single_chars = _split_tokens(tokens)
+
+    if vendor == 'sqlite' and indexed:
+        conditions = ''.join(' AND document.plain_text LIKE %s' for _ in single_chars)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT {FTS_TABLE}.rowid FROM {FTS_TABLE} '
+                f'JOIN main_searchdocument document ON document.package_id = {FTS_TABLE}.rowid '
+                f'WHERE {FTS_TABLE} MATCH %s{conditions} '
+                f'ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s',
+                [_match_expression(indexed), *[f'%{char}%' for char in single_chars],
+                 TITLE_WEIGHT, BODY_WEIGHT, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    if vendor == 'postgresql' and indexed:
+        # UPPER(plain_text) LIKE 與 icontains 相同，由 pg_trgm 索引支援
+        conditions = ''.join(' AND UPPER(plain_text) LIKE UPPER(%s)' for _ in single_chars)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT package_id FROM main_searchdocument '
+                f"WHERE search_vector @@ plainto_tsquery('simple', %s){conditions} "
+                "ORDER BY ts_rank(search_vector, plainto_tsquery('simple', %s)) DESC, package_id DESC "
+                'LIMIT %s',
+                [' '.join(indexed), *[f'%{char}%' for char in single_chars], ' '.join(indexed), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    # 只有單一 CJK 字元，或不支援全文索引的資料庫：以去除 HTML 後的純文字比對
+    # （PostgreSQL 上由 pg_trgm 索引支援）
+    return list(
+        matching_documents(query).order_by('-package_id').values_list('package_id', flat=True)[:limit]
+    )
+
+
+def matching_documents(query):
+    """
+    符合查詢的所有搜尋文件（不排名、不截斷）。
+
+    以 .values('package_id') 當作子查詢計算總數與分面，不受 SEARCH_RESULT_LIMIT 限制。
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return SearchDocument.objects.none()
+
+    vendor = connection.vendor
+    documents = SearchDocument.objects.all()
+    if vendor not in ('sqlite', 'postgresql'):
+        return documents.filter(plain_text__icontains=query.strip())
+
+    indexed, single_chars = _split_tokens(tokens)
+    for char in single_chars:
+        documents = documents.filter(plain_text__icontains=char)
+    if indexed and vendor == 'sqlite':
+        documents = documents.filter(package_id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [_match_expression(indexed)],
+        ))
+    elif indexed:
+        documents = documents.filter(RawSQL(
+            "main_searchdocument.search_vector @@ plainto_tsquery('simple', %s)", [' '.join(indexed)],
+            output_field=BooleanField(),
+        ))
+    return documents
+
+
+def rank_by_search(queryset, package_ids):
+    """
+    以 search_rank 標註套票（或卡片）查詢的排名：package_ids 依序為 0、1…，
+    不在 package_ids 內的結果排在最後。篩選符合的套票請搭配 matching_documents()。
+    """
+    if not package_ids:
+        return queryset.annotate(search_rank=Value(0, output_field=IntegerField()))
+    return queryset.annotate(search_rank=Case(
+        *[When(pk=pk, then=Value(rank)) for rank, pk in enumerate(package_ids)],
+        default=Value(len(package_ids)),
+        output_field=IntegerField(),
+    ))
+
+
+def icontains_package_ids(query, limit=SEARCH_RESULT_LIMIT):
+    """
+    舊有的搜尋方式：直接在原始欄位（含 RichText HTML）上做 icontains。
+    只供 benchmark_search 比較使用。
+    """
+    condition = (
+        Q(name__icontains=query)
+        | Q(subtitle__icontains=query)
+        | Q(description__icontains=query)
+        | Q(daily_itineraries__description__icontains=query)
+        | Q(daily_itineraries__notes__icontains=query)
+        | Q(periods__hotels__hotel_name__icontains=query)
+    )
+    return list(
+        Package.objects.filter(condition, is_active=True)
+        .distinct()
+        .order_by('-pk')
+        .values_list('pk', flat=True)[:limit]
+    )
@@ -0,0 +1,218 @@
+"""
+地區（大陸 / 國家 / 城市）的行程內登錄表
+
+詳情頁、PDF 與列表頁原本以三個 get_object_or_404 依序解析 大陸 / 國家 / 城市 slug，
+get_absolute_url 也會逐層延遲載入上層。地區資料量小、很少變更，這裡把整棵樹載入成
+不可變的 __slots__ 紀錄，依 slug 路徑與 pk 建立索引：解析 slug、麵包屑、選單與組網址都不需要查詢。
+
+- 每個行程各自保存一份登錄表，與快取中的版本 token（cache.version_cache）比對，版本改變時才重新載入（三個查詢）
+- 地區儲存或刪除時由信號（交易提交後再一次）更新版本 token（bump_geography_version），各行程下次使用時自行重新載入；
+  所有行程都必須使用同一個快取後端才看得到其他行程的更新（行程內的 LocMemCache 由系統檢查 main.E001 拒絕）
+- 紀錄只包含 pk、名稱、slug、是否啟用與上層紀錄；需要描述、圖片等欄位時仍應查詢模型
+"""
+import uuid
+
+from django.db import DEFAULT_DB_ALIAS
+from django.http import Http404
+from django.urls import reverse
+
+from .cache import version_cache
+from .models import City, Continent, Country
+
+GEOGRAPHY_VERSION_KEY = 'geography:version'
+
+
+class Region:
+    """地區紀錄的共同部分；model 指出對應的模型（page_cache.add_page_dependencies 以此組出相依鍵）"""
+
+    __slots__ = ('pk', 'name', 'name_en', 'slug', 'is_active', 'url')
+    model = None
+    parent_attr = None
+
+    def __init__(self, pk, name, name_en, slug, is_active, parent=None):
+        set_attr = object.__setattr__
+        set_attr(self, 'pk', pk)
+        set_attr(self, 'name', name)
+        set_attr(self, 'name_en', name_en)
+        set_attr(self, 'slug', slug)
+        set_attr(self, 'is_active', is_active)
+        if self.parent_attr:
+            set_attr(self, self.parent_attr, parent)
+        set_attr(self, 'url', self._build_url())
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} 為唯讀紀錄')
+
+    def __repr__(self):
+        return f'<{type(self).__name__} {self.pk}: {self.name}>'
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def id(self):
+        return self.pk
+
+    def get_absolute_url(self):
+        return self.url
+
+    def _build_url(self):
+        raise NotImplementedError
+
+
+class ContinentRecord(Region):
+    __slots__ = ()
+    model = Continent
+
+    def _build_url(self):
+        return reverse('main:package_list_by_continent', kwargs={'continent_slug': self.slug})
+
+
+class CountryRecord(Region):
+    __slots__ = ('continent',)
+    model = Country
+    parent_attr = 'continent'
+
+    def _build_url(self):
+        if self.continent:
+            return reverse('main:package_list_by_country', kwargs={
+                'continent_slug': self.continent.slug,
+                'country_slug': self.slug,
+            })
+        return reverse('main:package_list')
+
+
+class CityRecord(Region):
+    __slots__ = ('country',)
+    model = City
+    parent_attr = 'country'
+
+    @property
+    def continent(self):
+        return self.country.continent if self.country else None
+
+    def _build_url(self):
+        if self.country and self.country.continent:
+            return reverse('main:package_list_by_city', kwargs={
+                'continent_slug': self.country.continent.slug,
+                'country_slug': self.country.slug,
+                'city_slug': self.slug,
+            })
+        return reverse('main:package_list')
+
+    def package_url(self, package_slug):
+        """城市底下套票的詳情頁網址（上層不完整時回到套票列表）"""
+        if self.country and self.country.continent:
+            return reverse('main:package_detail', kwargs={
+                'continent_slug': self.country.continent.slug,
+                'country_slug': self.country.slug,
+                'city_slug': self.slug,
+                'package_slug': package_slug,
+            })
+        return reverse('main:package_list')
+
+
+class Geography:
+    """
+    一個版本的地區樹。
+
+    continents / countries / cities 以 pk 為鍵（含停用的地區，供組網址使用）；
+    slug 路徑索引只包含整條路徑都啟用的地區，與原本 is_active=True 的逐層查詢相同。
+    """
+
+    __slots__ = ('version', 'continents', 'countries', 'cities', 'active_continents', '_paths')
+
+    def __init__(self, version, continents, countries, cities):
+        self.version = version
+        self.continents = continents
+        self.countries = countries
+        self.cities = cities
+        self.active_continents = tuple(
+            sorted((c for c in continents.values() if c.is_active), key=lambda c: c.name)
+        )
+        paths = {}
+        for continent in continents.values():
+            if continent.is_active:
+                paths[(continent.slug,)] = (continent,)
+        for country in countries.values():
+            parent = paths.get((country.continent.slug,)) if country.continent else None
+            if country.is_active and parent and parent[0] is country.continent:
+                paths[(country.continent.slug, country.slug)] = (country.continent, country)
+        for city in cities.values():
+            country = city.country
+            if not (city.is_active and country and country.continent):
+                continue
+            parent = paths.get((country.continent.slug, country.slug))
+            if parent and parent[1] is country:
+                paths[(country.continent.slug, country.slug, city.slug)] = (country.continent, country, city)
+        self._paths = paths
+
+    def resolve(self, *slugs):
+        """
+        依 slug 路徑取得 (大陸, 國家, 城市) 中對應長度的紀錄；任一層不存在或停用時拋出 Http404。
+        """
+        try:
+            return self._paths[slugs]
+        except KeyError:
+            raise Http404('找不到此地區')
+
+
+def _load(version):
+    # 登錄表會沿用到下一次版本更新，一律由主資料庫載入，不受讀取複本延遲影響
+    continents = {
+        row['pk']: ContinentRecord(row['pk'], row['name'], row['name_en'], row['slug'], row['is_active'])
+        for row in Continent.objects.using(DEFAULT_DB_ALIAS).values('pk', 'name', 'name_en', 'slug', 'is_active')
+    }
+    countries = {
+        row['pk']: CountryRecord(
+            row['pk'], row['name'], row['name_en'], row['slug'], row['is_active'],
+            continents.get(row['continent_id']),
+        )
+        for row in Country.objects.using(DEFAULT_DB_ALIAS).values('pk', 'name', 'name_en', 'slug', 'is_active', 'continent_id')
+    }
+    cities = {
+        row['pk']: CityRecord(
+            row['pk'], row['name'], row['name_en'], row['slug'], row['is_active'],
+            countries.get(row['country_id']),
+        )
+        for row in City.objects.using(DEFAULT_DB_ALIAS).values('pk', 'name', 'name_en', 'slug', 'is_active', 'country_id')
+    }
+    return Geography(version, continents, countries, cities)
+
+
+def get_geography_version():
+    """
+    取得目前的地區版本 token。
+
+    以隨機 token 而非遞增的數字表示版本：快取被清除或淘汰後補上的是新的 token，
+    各行程一定會重新載入，不會因為數字從頭開始而沿用舊的登錄表。
+    """
+    versions = version_cache()
+    version = versions.get(GEOGRAPHY_VERSION_KEY)
+    if version is None:
+        versions.add(GEOGRAPHY_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = versions.get(GEOGRAPHY_VERSION_KEY)
+    return version
+
+
+def bump_geography_version():
+    """更新地區版本 token，各行程下次使用時重新載入登錄表"""
+    version_cache().set(GEOGRAPHY_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+_registry = None
+
+
+def geography():
+    """目前版本的地區登錄表（每次呼叫讀一次快取中的版本 token，版本改變時重新載入）"""
+    global _registry
+    version = get_geography_version()
+    registry = _registry
+    if registry is None or registry.version != version:
+        registry = _registry = _load(version)
+    return registry
+
+
+def resolve_regions(*slugs):
+    """geography().resolve 的捷徑，供視圖解析網址中的地區 slug"""
+    return geography().resolve(*slugs)
@@ -0,0 +1,181 @@
+"""
+響應式圖片衍生檔（WebP + JPEG）
+
+每種用途（card / hero / room / itinerary）在 settings.IMAGE_DERIVATIVES 定義寬度、裁切比例與 sizes，
+圖片儲存後由背景工作以 easy_thumbnails（含 Django-Filer 的主體位置裁切）產生各寬度的 WebP 與 JPEG，
+結果記錄在 ImageDerivative 清單表。樣板只讀清單（卡片則直接存在 PackageCard.image_picture），
+渲染時不需要存取儲存空間，也不會在第一位訪客請求時才產生縮圖。
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from easy_thumbnails.files import get_thumbnailer
+
+from .models import ImageDerivative
+
+# 需要衍生檔的圖片欄位：(模型, 欄位, 用途)
+IMAGE_SOURCES = [
+    ('main.Package', 'main_image', ['card', 'hero']),
+    ('main.RoomImage', 'image', ['room']),
+    ('main.ItineraryImage', 'image', ['itinerary']),
+    ('homepage.HeroSlide', 'image', ['hero']),
+]
+
+# 衍生檔格式，順序即 <picture> 中 <source> 的順序；最後一個作為 <img> 的後備格式
+DERIVATIVE_FORMATS = [('webp', 'image/webp'), ('jpg', 'image/jpeg')]
+
+
+def source_aliases(model):
+    """模型上需要衍生檔的 (欄位, 用途列表)"""
+    label = model._meta.label
+    return [(field, aliases) for source_label, field, aliases in IMAGE_SOURCES if source_label == label]
+
+
+def source_name(image):
+    """圖片在儲存空間中的名稱；可傳入 ImageField 的檔案或 Django-Filer 圖片"""
+    if not image:
+        return ''
+    if isinstance(image, FieldFile):
+        return image.name
+    return image.file.name
+
+
+def _thumbnailer(image, extension):
+    if isinstance(image, FieldFile):
+        thumbnailer = get_thumbnailer(image)
+        subject_location = None
+    else:
+        thumbnailer = image.easy_thumbnails_thumbnailer
+        subject_location = image.subject_location
+    thumbnailer.thumbnail_preserve_extensions = False
+    thumbnailer.thumbnail_extension = extension
+    thumbnailer.thumbnail_transparency_extension = extension
+    return thumbnailer, subject_location
+
+
+def generate_derivatives(image, alias):
+    """產生一張圖片在指定用途的所有衍生檔，並更新清單；回傳寫入的筆數"""
+    name = source_name(image)
+    if not name:
+        return 0
+    options = settings.IMAGE_DERIVATIVES[alias]
+    aspect_width, aspect_height = options['aspect']
+
+    rows = {}
+    for extension, _ in DERIVATIVE_FORMATS:
+        thumbnailer, subject_location = _thumbnailer(image, extension)
+        for width in options['widths']:
+            thumbnail_options = {
+                'size': (width, round(width * aspect_height / aspect_width)),
+                'crop': True,
+                'upscale': False,
+            }
+            if subject_location:
+                thumbnail_options['subject_location'] = subject_location
+            thumbnail = thumbnailer.get_thumbnail(thumbnail_options)
+            # 原圖比設定寬度小時不放大，不同設定可能得到同一張縮圖
+            rows[(extension, thumbnail.width)] = ImageDerivative(
+                source_name=name,
+                alias=alias,
+                format=extension,
+                width=thumbnail.width,
+                height=thumbnail.height,
+                url=thumbnail.url,
+            )
+
+    with transaction.atomic():
+        ImageDerivative.objects.filter(source_name=name, alias=alias).delete()
+        ImageDerivative.objects.bulk_create(rows.values())
+    return len(rows)
+
+
+def generate_for_instance(instance, force=False):
+    """產生模型實例上所有圖片欄位的衍生檔；force 為 False 時略過清單中已有的用途"""
+    count = 0
+    for field, aliases in source_aliases(type(instance)):
+        image = getattr(instance, field)
+        name = source_name(image)
+        if not name:
+            continue
+        existing = set() if force else set(
+            ImageDerivative.objects.filter(source_name=name, alias__in=aliases).values_list('alias', flat=True)
+        )
+        for alias in aliases:
+            if alias not in existing:
+                count += generate_derivatives(image, alias)
+    return count
+
+
+def missing_derivatives(instance):
+    """回傳模型實例上還沒有衍生檔的 (名稱, 用途)"""
+    wanted = [
+        (source_name(getattr(instance, field)), alias)
+        for field, aliases in source_aliases(type(instance)) for alias in aliases
+    ]
+    wanted = [(name, alias) for name, alias in wanted if name]
+    if not wanted:
+        return []
+    existing = set(
+        ImageDerivative.objects.filter(source_name__in={name for name, _ in wanted})
+        .values_list('source_name', 'alias').distinct()
+    )
+    return [pair for pair in wanted if pair not in existing]
+
+
+def build_picture(rows, alias):
+    """由同一張圖片、同一用途的清單資料組成樣板使用的 picture 資料（可 JSON 序列化）"""
+    by_format = defaultdict(list)
+    for row in rows:
+        by_format[row.format].append(row)
+    fallback = by_format.get(DERIVATIVE_FORMATS[-1][0])
+    if not fallback:
+        return None
+    fallback.sort(key=lambda row: row.width)
+    # src 使用不超過 800px 的最大寬度，給不支援 srcset 的瀏覽器
+    default = max((row for row in fallback if row.width <= 800), key=lambda row: row.width, default=fallback[0])
+    return {
+        'src': default.url,
+        'width': default.width,
+        'height': default.height,
+        'sizes': settings.IMAGE_DERIVATIVES[alias]['sizes'],
+        'sources': [
+            {
+                'type': mime_type,
+                'srcset': ', '.join(f'{row.url} {row.width}w' for row in sorted(by_format[extension], key=lambda row: row.width)),
+            }
+            for extension, mime_type in DERIVATIVE_FORMATS if by_format.get(extension)
+        ],
+    }
+
+
+def load_pictures(pairs):
+    """
+    一次查詢取得多張圖片的 picture 資料。
+
+    pairs 為 [(圖片或名稱, 用途), ...]，回傳 {(名稱, 用途): picture}；沒有衍生檔的圖片不會出現在結果中。
+    """
+    wanted = set()
+    for image, alias in pairs:
+        name = image if isinstance(image, str) else source_name(image)
+        if name:
+            wanted.add((name, alias))
+    if not wanted:
+        return {}
+
+    grouped = defaultdict(list)
+    rows = ImageDerivative.objects.filter(
+        source_name__in={name for name, _ in wanted},
+        alias__in={alias for _, alias in wanted},
+    )
+    for row in rows:
+        if (row.source_name, row.alias) in wanted:
+            grouped[(row.source_name, row.alias)].append(row)
+
+    pictures = {}
+    for key, key_rows in grouped.items():
+        picture = build_picture(key_rows, key[1])
+        if picture:
+            pictures[key] = picture
+    return pictures
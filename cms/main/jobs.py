@@ -0,0 +1,148 @@
+"""
+以資料庫為佇列的背景工作
+
+- enqueue() 建立 Job，立即回傳，不佔用 gunicorn worker
+- manage.py run_worker 以 claim_jobs() 取得工作，交給執行緒 / 行程池執行 execute_job()
+- 工作函式以 @task 註冊，參數來自 Job.payload（需可 JSON 序列化），回傳值存入 Job.result
+
+取得工作時先以條件更新（status=pending → running）搶占，
+PostgreSQL 另加 SELECT ... FOR UPDATE SKIP LOCKED，多個 worker 同時執行也不會重複取得同一筆工作。
+執行期間 worker 每 HEARTBEAT_INTERVAL 更新 locked_at（心跳），心跳停止超過 STALE_JOB_TIMEOUT 的工作
+才視為 worker 已中止並重新排入佇列；仍在執行的長時間工作（例如 PDF 預先產生）不會被其他 worker 重複執行。
+"""
+import logging
+import traceback
+from datetime import timedelta
+from importlib import import_module
+
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# 已註冊的工作：{名稱: 函式}
+TASKS = {}
+
+# 失敗重試的等待秒數（依已執行次數遞增）
+RETRY_DELAY_SECONDS = 30
+
+# worker 更新執行中工作心跳（locked_at）的間隔
+HEARTBEAT_INTERVAL = timedelta(seconds=30)
+
+# 心跳超過此時間未更新的執行中工作視為 worker 已中止，會重新排入佇列
+STALE_JOB_TIMEOUT = timedelta(minutes=2)
+
+
+def task(name, max_attempts=1):
+    """註冊背景工作函式"""
+    def decorator(func):
+        func.task_name = name
+        func.max_attempts = max_attempts
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def get_task(name):
+    # 工作定義在 main/tasks.py，延遲載入以避免循環匯入
+    import_module('main.tasks')
+    return TASKS[name]
+
+
+def enqueue(task_name, payload=None, user=None, run_after=None):
+    """建立背景工作；在交易中呼叫時，worker 會在交易提交後才看得到這筆工作"""
+    func = get_task(task_name)
+    return Job.objects.create(
+        task=task_name,
+        payload=payload or {},
+        max_attempts=func.max_attempts,
+        run_after=run_after or timezone.now(),
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def claim_jobs(worker_id, limit):
+    """搶占最多 limit 筆可執行的工作，回傳 Job 列表"""
+    if limit <= 0:
+        return []
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = Job.objects.filter(status=Job.STATUS_PENDING, run_after__lte=now).order_by('run_after', 'pk')
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = candidates.select_for_update(skip_locked=True)
+        pks = list(candidates.values_list('pk', flat=True)[:limit])
+        if not pks:
+            return []
+        # 條件更新：已被其他 worker 取走的工作狀態不再是 pending，不會被更新
+        Job.objects.filter(pk__in=pks, status=Job.STATUS_PENDING).update(
+            status=Job.STATUS_RUNNING,
+            locked_by=worker_id,
+            locked_at=now,
+        )
+    return list(Job.objects.filter(pk__in=pks, status=Job.STATUS_RUNNING, locked_by=worker_id, locked_at=now))
+
+
+def execute_job(job_id):
+    """
+    執行一筆已搶占的工作（在 worker 的執行緒或子行程中呼叫）。
+
+    成功時儲存結果；失敗時若還有重試次數則延後重新排入佇列，否則標記為失敗。
+    """
+    close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_id)
+        job.attempts += 1
+        try:
+            result = get_task(job.task)(**job.payload)
+        except Exception:
+            logger.exception('背景工作 %s #%s 執行失敗', job.task, job.pk)
+            job.error = traceback.format_exc()
+            if job.attempts < job.max_attempts:
+                job.status = Job.STATUS_PENDING
+                job.run_after = timezone.now() + timedelta(seconds=RETRY_DELAY_SECONDS * job.attempts)
+            else:
+                job.status = Job.STATUS_FAILED
+                job.finished_at = timezone.now()
+        else:
+            job.status = Job.STATUS_SUCCEEDED
+            job.result = result
+            job.error = ''
+            job.finished_at = timezone.now()
+        job.locked_by = ''
+        job.locked_at = None
+        job.save(update_fields=['status', 'result', 'error', 'attempts', 'run_after', 'locked_by', 'locked_at', 'finished_at'])
+        return job.status
+    finally:
+        close_old_connections()
+
+
+def heartbeat(worker_id, job_ids):
+    """更新這個 worker 執行中工作的心跳，回傳筆數"""
+    if not job_ids:
+        return 0
+    return Job.objects.filter(pk__in=job_ids, status=Job.STATUS_RUNNING, locked_by=worker_id).update(
+        locked_at=timezone.now(),
+    )
+
+
+def requeue_stale_jobs(timeout=STALE_JOB_TIMEOUT):
+    """將心跳逾時（worker 已中止）的工作重新排入佇列，回傳筆數"""
+    return Job.objects.filter(
+        status=Job.STATUS_RUNNING,
+        locked_at__lt=timezone.now() - timeout,
+    ).update(status=Job.STATUS_PENDING, locked_by='', locked_at=None)
+
+
+def job_status(job):
+    """管理後台輪詢用的工作狀態"""
+    return {
+        'id': job.pk,
+        'task': job.task,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'finished': job.is_finished,
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+    }
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from main.db import chunked
+from main.models import Package, RoomPrice
+from main.pricing import parse_price, room_price_minimums
+from main.read_models import refresh_package_cards
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = '解析現有的價格文字，回填數值價格、幣別與每個套票的最低房價，並更新套票卡片'
+
+    def handle(self, *args, **options):
+        room_prices = self._backfill(RoomPrice.objects.only('pk', 'price', 'price_amount', 'price_currency'))
+        self.stdout.write(f'房間價格：更新 {room_prices} 筆')
+
+        packages = self._backfill(Package.objects.only('pk', 'price', 'price_amount', 'price_currency'))
+        self.stdout.write(f'套票價格：更新 {packages} 筆')
+
+        minimums = room_price_minimums()
+        changed = []
+        for pk, min_room_price in chunked(Package.objects.values_list('pk', 'min_room_price'), BATCH_SIZE):
+            new_value = minimums.get(pk)
+            if new_value != min_room_price:
+                changed.append(Package(pk=pk, min_room_price=new_value))
+        with transaction.atomic():
+            Package.objects.bulk_update(changed, ['min_room_price'], batch_size=BATCH_SIZE)
+        self.stdout.write(f'最低房價：更新 {len(changed)} 個套票')
+
+        count = refresh_package_cards(Package.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'完成，已更新 {count} 張套票卡片'))
+
+    def _backfill(self, queryset):
+        """只寫回解析結果有變動的資料列，以 bulk_update 分批寫入"""
+        changed = []
+        for obj in chunked(queryset, BATCH_SIZE):
+            amount, currency = parse_price(obj.price)
+            if amount != obj.price_amount or currency != obj.price_currency:
+                obj.price_amount, obj.price_currency = amount, currency
+                changed.append(obj)
+        with transaction.atomic():
+            queryset.model.objects.bulk_update(changed, ['price_amount', 'price_currency'], batch_size=BATCH_SIZE)
+        return len(changed)
@@ -0,0 +1,174 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, connections, transaction
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from main.models import Package, RoomPrice
+from main.page_cache import dependency_key
+from main.timing import percentile
+from main.tree_saving import refresh_derived_data
+
+from .benchmark_pages import _git_commit, _package_urls
+
+
+class Command(BaseCommand):
+    help = (
+        '在後台持續寫入的同時量測前台讀取：讀取執行緒以停用快取的 in-process client 請求列表頁與套票詳情，'
+        '寫入執行緒模擬後台儲存套票與房價（只更新 updated_at，不改變資料內容）。'
+        '分別以 SQLite 與 PostgreSQL（DATABASE_URL）執行，再以 --compare 比較兩次結果'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--duration', type=float, default=20, help='量測秒數（預設 20）')
+        parser.add_argument('--readers', type=int, default=4, help='前台讀取執行緒數（預設 4）')
+        parser.add_argument('--writers', type=int, default=2, help='後台寫入執行緒數（預設 2）')
+        parser.add_argument('--packages', type=int, default=50, help='輪流使用的套票數（預設 50）')
+        parser.add_argument('--seed', type=int, default=0, help='挑選套票的亂數種子（預設 0）')
+        parser.add_argument('--output', default='benchmark-database.json', help='結果 JSON 路徑（預設 benchmark-database.json）')
+        parser.add_argument('--compare', help='與先前的結果 JSON 比較（例如 SQLite 的結果）')
+
+    def handle(self, *args, **options):
+        package_ids, urls = self._collect(options)
+        deadline = time.perf_counter() + options['duration']
+        readers, writers = max(0, options['readers']), max(0, options['writers'])
+
+        overrides = {
+            'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver'],
+            # 停用快取，讓每個讀取都經過資料庫
+            'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+        }
+        self.stdout.write(
+            f'資料庫：{connection.vendor}，{readers} 個讀取、{writers} 個寫入執行緒，量測 {options["duration"]:.0f} 秒'
+        )
+        with override_settings(**overrides), ThreadPoolExecutor(max_workers=max(1, readers + writers)) as executor:
+            read_jobs = [
+                executor.submit(self._loop, self._read, random.Random(options['seed'] + i), urls, deadline)
+                for i in range(readers)
+            ]
+            write_jobs = [
+                executor.submit(self._loop, self._write, random.Random(options['seed'] + 1000 + i), package_ids, deadline)
+                for i in range(writers)
+            ]
+            reads = [sample for job in read_jobs for sample in job.result()]
+            writes = [sample for job in write_jobs for sample in job.result()]
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'git_commit': _git_commit(),
+            'database': connection.vendor,
+            'options': {key: options[key] for key in ('duration', 'readers', 'writers', 'packages', 'seed')},
+            'reads': self._summary(reads, options['duration']),
+            'writes': self._summary(writes, options['duration']),
+        }
+        for name in ('reads', 'writes'):
+            self._print_row(name, report[name])
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'結果已寫入 {options["output"]}'))
+
+        if options['compare']:
+            self._compare(options['compare'], report)
+
+    def _collect(self, options):
+        package_ids = list(
+            Package.objects.filter(
+                is_active=True, city__isnull=False, city__country__isnull=False, city__country__continent__isnull=False,
+            ).exclude(slug='').order_by('pk').values_list('pk', flat=True)
+        )
+        if not package_ids:
+            raise CommandError('沒有可用的套票，請先執行 python manage.py seed_catalog')
+        rng = random.Random(options['seed'])
+        sample = rng.sample(package_ids, min(options['packages'], len(package_ids)))
+        urls = []
+        for package in Package.objects.filter(pk__in=sample).select_related('city__country__continent'):
+            package_urls = _package_urls(package)
+            urls += [package_urls['detail'], package_urls['list_city']]
+        return sample, urls
+
+    def _loop(self, operation, rng, choices, deadline):
+        """重複執行 operation 直到時間結束，回傳 [(秒數, 是否成功), ...]"""
+        samples = []
+        local = threading.local()
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                ok = operation(local, rng.choice(choices))
+                samples.append((time.perf_counter() - start, ok))
+        finally:
+            # 執行緒各自的資料庫連線
+            connections.close_all()
+        return samples
+
+    def _read(self, local, url):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client(raise_request_exception=False)
+        response = client.get(url)
+        response.close()
+        return response.status_code == 200
+
+    def _write(self, local, package_id):
+        """模擬後台儲存：套票本身與最多 20 筆房價，並更新衍生資料"""
+        try:
+            with transaction.atomic():
+                package = Package.objects.select_for_update().get(pk=package_id)
+                package.save()
+                prices = list(
+                    RoomPrice.objects.filter(room_type__hotel__period__package_id=package_id).order_by('pk')[:20]
+                )
+                now = timezone.now()
+                for price in prices:
+                    price.updated_at = now
+                RoomPrice.objects.bulk_update(prices, ['updated_at'])
+                refresh_derived_data({package_id}, {RoomPrice}, [dependency_key(RoomPrice, price.pk) for price in prices])
+        except DatabaseError as exc:
+            # SQLite 的 database is locked 等錯誤
+            self.stderr.write(f'寫入套票 {package_id} 失敗：{exc}')
+            return False
+        return True
+
+    def _summary(self, samples, duration):
+        latencies = sorted(sample[0] for sample in samples if sample[1])
+        errors = sum(1 for sample in samples if not sample[1])
+        if not latencies:
+            return {'operations': len(samples), 'errors': errors}
+        return {
+            'operations': len(samples),
+            'errors': errors,
+            'throughput_ops': len(latencies) / duration,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'max_ms': latencies[-1] * 1000,
+        }
+
+    def _print_row(self, name, result):
+        if 'p50_ms' not in result:
+            self.stdout.write(f'{name:<8}沒有成功的操作（錯誤 {result["errors"]}）')
+            return
+        self.stdout.write(
+            f'{name:<8}{result["throughput_ops"]:>8.1f} ops/s'
+            f'  p50 {result["p50_ms"]:>8.1f}  p95 {result["p95_ms"]:>8.1f}  p99 {result["p99_ms"]:>8.1f}'
+            f'  最慢 {result["max_ms"]:>8.1f} ms  錯誤 {result["errors"]}'
+        )
+
+    def _compare(self, path, report):
+        with open(path, encoding='utf-8') as previous_file:
+            previous = json.load(previous_file)
+        self.stdout.write(f'與 {path}（{previous.get("database")}）比較：')
+        for name in ('reads', 'writes'):
+            before, after = previous.get(name, {}), report[name]
+            if 'p95_ms' not in before or 'p95_ms' not in after:
+                continue
+            self.stdout.write(
+                f'{name:<8}吞吐量 {before["throughput_ops"]:.1f} → {after["throughput_ops"]:.1f} ops/s'
+                f'  p95 {before["p95_ms"]:.1f} → {after["p95_ms"]:.1f} ms'
+                f'  錯誤 {before["errors"]} → {after["errors"]}'
+            )
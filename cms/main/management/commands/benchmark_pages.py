@@ -0,0 +1,184 @@
+import json
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from main.models import Package
+from main.timing import RequestTiming, percentile
+
+ENDPOINTS = ['home', 'list', 'list_continent', 'list_country', 'list_city', 'detail', 'pdf']
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _package_urls(package):
+    city = package.city
+    country = city.country
+    continent = country.continent
+    slugs = {'continent_slug': continent.slug, 'country_slug': country.slug, 'city_slug': city.slug}
+    return {
+        'list_continent': reverse('main:package_list_by_continent', kwargs={'continent_slug': continent.slug}),
+        'list_country': reverse('main:package_list_by_country', kwargs={
+            'continent_slug': continent.slug, 'country_slug': country.slug,
+        }),
+        'list_city': reverse('main:package_list_by_city', kwargs=slugs),
+        'detail': reverse('main:package_detail', kwargs={**slugs, 'package_slug': package.slug}),
+        'pdf': reverse('main:package_daily_itinerary_pdf', kwargs={**slugs, 'package_slug': package.slug}),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        '以多執行緒的 in-process client 對首頁、列表頁、套票詳情與 PDF 做負載量測，'
+        '輸出吞吐量、p50 / p95 / p99 延遲與查詢數到 JSON，可用 --compare 與前一次結果比較'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=ENDPOINTS, help='要量測的頁面（預設全部）')
+        parser.add_argument('--requests', type=int, default=200, help='每個頁面的請求數（預設 200）')
+        parser.add_argument('--concurrency', type=int, default=4, help='同時發出請求的執行緒數（預設 4）')
+        parser.add_argument('--packages', type=int, default=50, help='輪流使用的套票數（預設 50）')
+        parser.add_argument('--warmup', type=int, default=10, help='每個頁面正式量測前的暖機請求數（預設 10）')
+        parser.add_argument('--seed', type=int, default=0, help='挑選套票的亂數種子（預設 0）')
+        parser.add_argument('--no-cache', action='store_true', help='以 DummyCache 停用所有快取，量測未快取的渲染路徑')
+        parser.add_argument('--output', default='benchmark.json', help='結果 JSON 路徑（預設 benchmark.json）')
+        parser.add_argument('--compare', help='與先前的結果 JSON 比較')
+
+    def handle(self, *args, **options):
+        self._local = threading.local()
+        urls = self._collect_urls(options)
+
+        overrides = {'ALLOWED_HOSTS': [*settings.ALLOWED_HOSTS, 'testserver']}
+        if options['no_cache']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+        results = {}
+        with override_settings(**overrides):
+            for endpoint in options['endpoints']:
+                endpoint_urls = urls[endpoint]
+                for i in range(options['warmup']):
+                    self._request(endpoint_urls[i % len(endpoint_urls)])
+                results[endpoint] = self._run(endpoint_urls, options['requests'], options['concurrency'])
+                self._print_row(endpoint, results[endpoint])
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'git_commit': _git_commit(),
+            'database': connection.vendor,
+            'options': {
+                key: options[key] for key in ('endpoints', 'requests', 'concurrency', 'packages', 'warmup', 'seed', 'no_cache')
+            },
+            'catalog': {'packages': Package.objects.count(), 'active_packages': Package.objects.filter(is_active=True).count()},
+            'endpoints': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'結果已寫入 {options["output"]}'))
+
+        if options['compare']:
+            self._compare(options['compare'], report)
+
+    def _collect_urls(self, options):
+        package_ids = list(
+            Package.objects.filter(
+                is_active=True, city__isnull=False, city__country__isnull=False, city__country__continent__isnull=False,
+            ).exclude(slug='').order_by('pk').values_list('pk', flat=True)
+        )
+        if not package_ids:
+            raise CommandError('沒有可用的套票，請先執行 python manage.py seed_catalog')
+        rng = random.Random(options['seed'])
+        sample = rng.sample(package_ids, min(options['packages'], len(package_ids)))
+        packages = Package.objects.filter(pk__in=sample).select_related('city__country__continent').order_by('pk')
+
+        urls = {'home': [reverse('homepage:home')], 'list': [reverse('main:package_list')]}
+        for package in packages:
+            for endpoint, url in _package_urls(package).items():
+                urls.setdefault(endpoint, []).append(url)
+        return urls
+
+    def _client(self):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client(raise_request_exception=False)
+        return client
+
+    def _request(self, url):
+        """發出一個請求，回傳 (秒數, 狀態碼, 查詢數, SQL 秒數)"""
+        timing = RequestTiming()
+        with ExitStack() as stack:
+            for conn in connections.all():
+                stack.enter_context(conn.execute_wrapper(timing))
+            start = time.perf_counter()
+            response = self._client().get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        response.close()
+        return elapsed, response.status_code, timing.query_count, timing.sql_time
+
+    def _run(self, urls, count, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            samples = list(executor.map(self._request, (urls[i % len(urls)] for i in range(count))))
+        wall = time.perf_counter() - started
+
+        latencies = sorted(sample[0] for sample in samples)
+        queries = [sample[2] for sample in samples]
+        return {
+            'requests': count,
+            'errors': sum(1 for sample in samples if sample[1] >= 400),
+            'status_codes': {str(code): sum(1 for sample in samples if sample[1] == code) for code in {s[1] for s in samples}},
+            'throughput_rps': count / wall if wall else None,
+            'p50_ms': percentile(latencies, 0.5) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+            'mean_ms': sum(latencies) / count * 1000,
+            'queries_mean': sum(queries) / count,
+            'queries_max': max(queries),
+            'sql_mean_ms': sum(sample[3] for sample in samples) / count * 1000,
+        }
+
+    def _print_row(self, endpoint, result):
+        self.stdout.write(
+            f'{endpoint:<16}{result["throughput_rps"]:>8.1f} req/s'
+            f'  p50 {result["p50_ms"]:>8.1f}  p95 {result["p95_ms"]:>8.1f}  p99 {result["p99_ms"]:>8.1f} ms'
+            f'  查詢 {result["queries_mean"]:>5.1f}（最多 {result["queries_max"]}）'
+            f'  錯誤 {result["errors"]}'
+        )
+
+    def _compare(self, path, report):
+        with open(path, encoding='utf-8') as previous_file:
+            previous = json.load(previous_file)
+        self.stdout.write(f'與 {path}（{previous.get("git_commit") or "未知版本"}）比較：')
+        for endpoint, result in report['endpoints'].items():
+            before = previous.get('endpoints', {}).get(endpoint)
+            if not before:
+                continue
+
+            def change(key):
+                if not before[key]:
+                    return '   n/a'
+                return f'{(result[key] - before[key]) / before[key] * 100:+6.1f}%'
+
+            self.stdout.write(
+                f'{endpoint:<16}吞吐量 {change("throughput_rps")}  p95 {change("p95_ms")}'
+                f'  查詢數 {before["queries_mean"]:.1f} → {result["queries_mean"]:.1f}'
+            )
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from main.fulltext import icontains_package_ids, search_package_ids
+
+DEFAULT_QUERIES = ['潛水', '沖繩', '船潛', '海龜', '酒店', '浮潛 早餐', 'Nitrox']
+
+
+class Command(BaseCommand):
+    help = '比較全文檢索（FTS5 / tsvector）與原本 icontains 搜尋的耗時與結果數'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', help=f'搜尋字詞；預設為 {" / ".join(DEFAULT_QUERIES)}')
+        parser.add_argument('--repeat', type=int, default=20, help='每個字詞重複執行次數（預設 20）')
+
+    def _measure(self, func, query, repeat):
+        timings = []
+        result = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func(query)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return len(result), timings[len(timings) // 2], timings[-1]
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or DEFAULT_QUERIES
+        repeat = max(1, options['repeat'])
+
+        self.stdout.write(f'資料庫：{connection.vendor}，每個字詞執行 {repeat} 次（毫秒，中位數 / 最大值）')
+        self.stdout.write(f'{"字詞":<12}{"全文檢索":>24}{"icontains":>24}')
+        for query in queries:
+            fts_count, fts_median, fts_max = self._measure(search_package_ids, query, repeat)
+            like_count, like_median, like_max = self._measure(icontains_package_ids, query, repeat)
+            self.stdout.write(
+                f'{query:<12}'
+                f'{fts_count:>6} 筆 {fts_median:>7.2f} / {fts_max:>7.2f}'
+                f'{like_count:>6} 筆 {like_median:>7.2f} / {like_max:>7.2f}'
+            )
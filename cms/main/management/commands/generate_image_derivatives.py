@@ -0,0 +1,34 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from main.db import chunked
+from main.images import IMAGE_SOURCES, generate_for_instance
+from main.read_models import rebuild_all_package_cards
+
+
+class Command(BaseCommand):
+    help = '為既有圖片補產生響應式衍生檔（WebP + JPEG），並重建套票卡片；新上傳的圖片會由背景工作自動產生'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='即使清單中已有衍生檔也重新產生')
+
+    def handle(self, *args, **options):
+        total = 0
+        for label, field, _ in IMAGE_SOURCES:
+            model = apps.get_model(label)
+            queryset = model.objects.exclude(**{f'{field}__isnull': True})
+            if model._meta.get_field(field).get_internal_type() != 'ForeignKey':
+                queryset = queryset.exclude(**{field: ''})
+            else:
+                queryset = queryset.select_related(field)
+            count = 0
+            for instance in chunked(queryset, 200):
+                try:
+                    count += generate_for_instance(instance, force=options['force'])
+                except Exception as exc:
+                    self.stderr.write(f'{label} #{instance.pk} 產生失敗：{exc}')
+            self.stdout.write(f'{label}：{count} 個衍生檔')
+            total += count
+
+        cards = rebuild_all_package_cards()
+        self.stdout.write(self.style.SUCCESS(f'共產生 {total} 個衍生檔，重建 {cards} 張卡片'))
@@ -0,0 +1,63 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from main.db import chunked
+from main.pdf import ensure_itinerary_pdf, pdf_package_queryset, pdf_storage_path
+
+
+def _init_worker():
+    """子行程初始化：spawn 模式下需重新載入 Django，並確保不沿用父行程的資料庫連線"""
+    django.setup()
+    connections.close_all()
+
+
+def _build_pdf(package_id, force):
+    package = pdf_package_queryset().get(pk=package_id)
+    path, built = ensure_itinerary_pdf(package, force=force)
+    return package_id, path, built
+
+
+class Command(BaseCommand):
+    help = '預先產生過期的每天行程 PDF（以多個行程平行執行），讓下載不必等待 ReportLab'
+
+    def add_arguments(self, parser):
+        parser.add_argument('package_ids', nargs='*', type=int, help='只處理指定的套票 id；未指定時處理所有啟用中的套票')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='平行行程數（預設為 CPU 數量）')
+        parser.add_argument('--force', action='store_true', help='即使目前版本已存在也重新產生')
+
+    def handle(self, *args, **options):
+        packages = pdf_package_queryset()
+        if options['package_ids']:
+            packages = packages.filter(pk__in=options['package_ids'])
+
+        force = options['force']
+        stale = [
+            package.pk for package in chunked(packages, 500)
+            if force or not default_storage.exists(pdf_storage_path(package))
+        ]
+        if not stale:
+            self.stdout.write(self.style.SUCCESS('所有 PDF 都是最新版本'))
+            return
+
+        self.stdout.write(f'需要產生 {len(stale)} 份 PDF，使用 {options["workers"]} 個行程')
+        # 建立子行程前關閉連線，避免子行程共用父行程的資料庫連線
+        connections.close_all()
+        built = failed = 0
+        with ProcessPoolExecutor(max_workers=max(1, options['workers']), initializer=_init_worker) as executor:
+            futures = {executor.submit(_build_pdf, package_id, force): package_id for package_id in stale}
+            for future in as_completed(futures):
+                try:
+                    package_id, path, _ = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'套票 {futures[future]} 產生失敗：{exc}')
+                else:
+                    built += 1
+                    self.stdout.write(f'  {package_id} → {path}')
+
+        self.stdout.write(self.style.SUCCESS(f'已產生 {built} 份 PDF，失敗 {failed} 份'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from main.models import Package
+from main.read_models import rebuild_all_package_cards, refresh_package_cards
+
+
+class Command(BaseCommand):
+    help = (
+        '重建套票讀取模型：卡片（PackageCard，列表頁與首頁使用）與搜尋分面索引（PackageFacet）。'
+        '第一次部署時 migrate 會在卡片表為空時排入同名的背景工作；沒有執行 run_worker 時，'
+        '請在 migrate 之後執行這個指令。以 update() 或 SQL 直接修改資料後也需要重建。'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'package_ids',
+            nargs='*',
+            type=int,
+            help='只重建指定的套票 id；未指定時全量重建',
+        )
+
+    def handle(self, *args, **options):
+        package_ids = options['package_ids']
+        if package_ids:
+            count = refresh_package_cards(Package.objects.filter(pk__in=package_ids))
+        else:
+            count = rebuild_all_package_cards()
+        self.stdout.write(self.style.SUCCESS(f'已重建 {count} 張套票卡片'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from main.fulltext import rebuild_search_index, refresh_search_documents
+
+
+class Command(BaseCommand):
+    help = '重建套票全文檢索文件（SearchDocument）；資料庫端的 FTS5 / tsvector 索引會自動同步'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'package_ids',
+            nargs='*',
+            type=int,
+            help='只重建指定的套票 id；未指定時全量重建',
+        )
+
+    def handle(self, *args, **options):
+        package_ids = options['package_ids']
+        if package_ids:
+            count = refresh_search_documents(package_ids)
+        else:
+            count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'已重建 {count} 份全文檢索文件'))
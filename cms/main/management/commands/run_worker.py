@@ -0,0 +1,90 @@
+import os
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from main.jobs import HEARTBEAT_INTERVAL, claim_jobs, execute_job, heartbeat, requeue_stale_jobs
+
+
+def _init_process():
+    django.setup()
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = '執行背景工作 worker（以資料庫為佇列，不需要 Redis）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='同時執行的工作數（預設 4）')
+        parser.add_argument(
+            '--pool', choices=['thread', 'process'], default='thread',
+            help='thread 適合等待外部 API 的工作；process 適合 PDF 等耗 CPU 的工作（預設 thread）',
+        )
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='佇列為空時的輪詢間隔秒數（預設 1）')
+        parser.add_argument('--once', action='store_true', help='執行完目前佇列中的工作後結束')
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        poll_interval = options['poll_interval']
+        worker_id = f'{socket.gethostname()}:{os.getpid()}'
+        stopping = threading.Event()
+
+        def stop(signum, frame):
+            self.stdout.write('收到停止訊號，等待執行中的工作完成...')
+            stopping.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        if options['pool'] == 'process':
+            connections.close_all()
+            executor = ProcessPoolExecutor(max_workers=concurrency, initializer=_init_process)
+        else:
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job')
+
+        self.stdout.write(f'worker {worker_id} 啟動（{options["pool"]} × {concurrency}）')
+        running = {}
+        next_heartbeat = 0
+        with executor:
+            while not stopping.is_set():
+                close_old_connections()
+                if time.monotonic() >= next_heartbeat:
+                    # 更新執行中工作的心跳，並重新排入其他 worker 中止後留下的工作
+                    heartbeat(worker_id, [job.pk for job in running.values()])
+                    requeued = requeue_stale_jobs()
+                    if requeued:
+                        self.stdout.write(f'重新排入 {requeued} 筆心跳逾時的工作')
+                    next_heartbeat = time.monotonic() + HEARTBEAT_INTERVAL.total_seconds()
+
+                for job in claim_jobs(worker_id, concurrency - len(running)):
+                    self.stdout.write(f'開始 {job}')
+                    running[executor.submit(execute_job, job.pk)] = job
+
+                if not running:
+                    if options['once']:
+                        break
+                    stopping.wait(poll_interval)
+                    continue
+
+                done, _ = wait(running, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    try:
+                        status = future.result()
+                    except Exception as exc:
+                        status = f'worker 錯誤：{exc}'
+                    self.stdout.write(f'結束 {job.task} #{job.pk}：{status}')
+
+            # 停止時等待執行中的工作完成，期間照常更新心跳
+            while running:
+                heartbeat(worker_id, [job.pk for job in running.values()])
+                done, _ = wait(running, timeout=HEARTBEAT_INTERVAL.total_seconds())
+                for future in done:
+                    running.pop(future)
+        self.stdout.write(self.style.SUCCESS('worker 已停止'))
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from main.fulltext import rebuild_search_index
+from main.seeding import seed_catalog
+
+
+class Command(BaseCommand):
+    help = '產生壓力測試用的套票目錄（地區、套票、期間 × 酒店 × 房型 × 價格 / 圖片、每天行程與相片）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--packages', type=int, default=50000, help='套票數量（預設 50000）')
+        parser.add_argument('--countries', type=int, default=4, help='每個大陸的國家數（預設 4）')
+        parser.add_argument('--cities', type=int, default=5, help='每個國家的城市數（預設 5）')
+        parser.add_argument('--days', type=int, default=3, help='每個套票的行程天數（預設 3）')
+        parser.add_argument('--day-images', type=int, default=1, help='每天行程的相片數（預設 1）')
+        parser.add_argument('--periods', type=int, default=1, help='每個套票的期間數（預設 1）')
+        parser.add_argument('--hotels', type=int, default=1, help='每個期間的酒店數（預設 1）')
+        parser.add_argument('--room-types', type=int, default=1, help='每間酒店的房型數（預設 1）')
+        parser.add_argument('--prices', type=int, default=1, help='每個房型的價格數（預設 1）')
+        parser.add_argument('--room-images', type=int, default=1, help='每個房型的圖片數（預設 1）')
+        parser.add_argument('--html-size', type=int, default=2000, help='套票描述 HTML 的字元數（預設 2000）')
+        parser.add_argument('--batch-size', type=int, default=2000, help='每批寫入的套票數（預設 2000）')
+        parser.add_argument('--seed', type=int, default=0, help='亂數種子；不同種子可重複執行以累加資料（預設 0）')
+        parser.add_argument('--skip-read-models', action='store_true', help='不重建卡片、分面與全文檢索')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = seed_catalog(
+            packages=options['packages'],
+            countries_per_continent=options['countries'],
+            cities_per_country=options['cities'],
+            days_per_package=options['days'],
+            periods_per_package=options['periods'],
+            hotels_per_period=options['hotels'],
+            room_types_per_hotel=options['room_types'],
+            prices_per_room_type=options['prices'],
+            images_per_room_type=options['room_images'],
+            images_per_day=options['day_images'],
+            description_size=options['html_size'],
+            batch_size=options['batch_size'],
+            rebuild_read_models=not options['skip_read_models'],
+            seed=options['seed'],
+        )
+        if not options['skip_read_models']:
+            counts['search_documents'] = rebuild_search_index()
+
+        for name, count in counts.items():
+            self.stdout.write(f'{name:<20}{count:>10}')
+        self.stdout.write(self.style.SUCCESS(f'完成，耗時 {time.perf_counter() - started:.1f} 秒'))
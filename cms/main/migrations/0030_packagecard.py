@@ -0,0 +1,69 @@
+# Generated by Django 4.2 on 2026-10-18 06:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0029_package_ai_prompt_description'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageCard',
+            fields=[
+                ('package', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='main.package', verbose_name='套票')),
+                ('name', models.CharField(max_length=200, verbose_name='套票名稱')),
+                ('slug', models.SlugField(blank=True, max_length=200, verbose_name='URL 代碼')),
+                ('subtitle', models.CharField(blank=True, max_length=300, verbose_name='副標題')),
+                ('price', models.CharField(blank=True, max_length=100, null=True, verbose_name='套票價格')),
+                ('image_url', models.CharField(blank=True, max_length=500, verbose_name='主要圖片網址')),
+                ('detail_url', models.CharField(blank=True, help_text='缺少 slug 資訊時為空白', max_length=500, verbose_name='詳情頁網址')),
+                ('package_type_name', models.CharField(blank=True, max_length=100, verbose_name='套票種類名稱')),
+                ('continent_name', models.CharField(blank=True, max_length=100, verbose_name='大陸名稱')),
+                ('country_name', models.CharField(blank=True, max_length=100, verbose_name='國家名稱')),
+                ('city_name', models.CharField(blank=True, max_length=100, verbose_name='城市名稱')),
+                ('tags', models.JSONField(blank=True, default=list, verbose_name='套票特色')),
+                ('is_active', models.BooleanField(default=True, verbose_name='是否啟用')),
+                ('is_featured', models.BooleanField(default=False, verbose_name='是否精選')),
+                ('is_secondary_featured', models.BooleanField(default=False, verbose_name='是否為次要精選')),
+                ('created_at', models.DateTimeField(verbose_name='套票創建時間')),
+                ('package_updated_at', models.DateTimeField(verbose_name='套票更新時間')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+                ('city', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.city', verbose_name='城市')),
+                ('continent', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.continent', verbose_name='大陸')),
+                ('country', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='main.country', verbose_name='國家')),
+            ],
+            options={
+                'verbose_name': '套票卡片',
+                'verbose_name_plural': '套票卡片',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(fields=['is_active', '-created_at'], name='card_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(fields=['is_active', 'is_featured', '-created_at'], name='card_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(fields=['is_active', 'is_secondary_featured', '-package_updated_at'], name='card_secondary_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(fields=['continent', 'is_active', '-created_at'], name='card_continent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(fields=['country', 'is_active', '-created_at'], name='card_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(fields=['city', 'is_active', '-created_at'], name='card_city_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2 on 2026-10-18 06:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0030_packagecard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='min_room_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, help_text='由期間 → 酒店 → 房型 → 房間價格自動計算', max_digits=12, null=True, verbose_name='最低房價'),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='price_amount',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='價格數值'),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='price_currency',
+            field=models.CharField(blank=True, editable=False, max_length=3, verbose_name='幣別'),
+        ),
+        migrations.AddField(
+            model_name='packagecard',
+            name='from_price',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='最低房價，沒有房價時為套票價格', max_digits=12, null=True, verbose_name='起價'),
+        ),
+        migrations.AddField(
+            model_name='packagecard',
+            name='price_amount',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='價格數值'),
+        ),
+        migrations.AddField(
+            model_name='packagecard',
+            name='price_currency',
+            field=models.CharField(blank=True, max_length=3, verbose_name='幣別'),
+        ),
+        migrations.AddField(
+            model_name='roomprice',
+            name='price_amount',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=12, null=True, verbose_name='價格數值'),
+        ),
+        migrations.AddField(
+            model_name='roomprice',
+            name='price_currency',
+            field=models.CharField(blank=True, editable=False, max_length=3, verbose_name='幣別'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(fields=['is_active', 'from_price'], name='card_from_price_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2 on 2026-10-18 06:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0031_numeric_prices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(choices=[('continent', '大陸'), ('country', '國家'), ('city', '城市'), ('package_type', '套票種類'), ('tag', '特色標籤'), ('price', '價格區間'), ('days', '行程天數')], max_length=20, verbose_name='分面維度')),
+                ('value', models.CharField(max_length=50, verbose_name='分面值')),
+                ('label', models.CharField(max_length=100, verbose_name='顯示名稱')),
+                ('sort_key', models.IntegerField(default=0, help_text='價格區間與天數依此排序', verbose_name='排序值')),
+                ('package', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='main.package', verbose_name='套票')),
+            ],
+            options={
+                'verbose_name': '套票分面索引',
+                'verbose_name_plural': '套票分面索引',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='packagefacet',
+            index=models.Index(fields=['dimension', 'value', 'package'], name='facet_dim_value_pkg_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='packagefacet',
+            constraint=models.UniqueConstraint(fields=('package', 'dimension', 'value'), name='facet_unique_value'),
+        ),
+    ]
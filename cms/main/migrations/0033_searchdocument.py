@@ -0,0 +1,77 @@
+# Generated by Django 4.2 on 2026-10-18 06:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# 依資料庫建立實際的全文索引：SQLite 使用 FTS5 外部內容表（以 trigger 同步），
+# PostgreSQL 使用 tsvector 產生欄位 + GIN 索引，並以 pg_trgm 索引支援單字 icontains。
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE main_searchdocument_fts USING fts5("
+    "title_tokens, body_tokens, content='main_searchdocument', content_rowid='package_id', tokenize='unicode61')",
+    "CREATE TRIGGER main_searchdocument_ai AFTER INSERT ON main_searchdocument BEGIN "
+    "INSERT INTO main_searchdocument_fts(rowid, title_tokens, body_tokens) "
+    "VALUES (new.package_id, new.title_tokens, new.body_tokens); END",
+    "CREATE TRIGGER main_searchdocument_ad AFTER DELETE ON main_searchdocument BEGIN "
+    "INSERT INTO main_searchdocument_fts(main_searchdocument_fts, rowid, title_tokens, body_tokens) "
+    "VALUES ('delete', old.package_id, old.title_tokens, old.body_tokens); END",
+    "CREATE TRIGGER main_searchdocument_au AFTER UPDATE ON main_searchdocument BEGIN "
+    "INSERT INTO main_searchdocument_fts(main_searchdocument_fts, rowid, title_tokens, body_tokens) "
+    "VALUES ('delete', old.package_id, old.title_tokens, old.body_tokens); "
+    "INSERT INTO main_searchdocument_fts(rowid, title_tokens, body_tokens) "
+    "VALUES (new.package_id, new.title_tokens, new.body_tokens); END",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS main_searchdocument_au",
+    "DROP TRIGGER IF EXISTS main_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS main_searchdocument_ai",
+    "DROP TABLE IF EXISTS main_searchdocument_fts",
+]
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "ALTER TABLE main_searchdocument ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('simple', title_tokens), 'A') || "
+    "setweight(to_tsvector('simple', body_tokens), 'B')) STORED",
+    "CREATE INDEX main_searchdocument_vector_idx ON main_searchdocument USING GIN (search_vector)",
+    "CREATE INDEX main_searchdocument_trgm_idx ON main_searchdocument USING GIN (UPPER(plain_text) gin_trgm_ops)",
+]
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS main_searchdocument_trgm_idx",
+    "DROP INDEX IF EXISTS main_searchdocument_vector_idx",
+    "ALTER TABLE main_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for statement in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+create_fulltext_index = _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD})
+drop_fulltext_index = _run({'sqlite': SQLITE_REVERSE, 'postgresql': POSTGRES_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0032_packagefacet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('package', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='main.package', verbose_name='套票')),
+                ('title_tokens', models.TextField(blank=True, verbose_name='標題詞彙')),
+                ('body_tokens', models.TextField(blank=True, verbose_name='內容詞彙')),
+                ('plain_text', models.TextField(blank=True, verbose_name='純文字內容')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+            ],
+            options={
+                'verbose_name': '套票全文檢索文件',
+                'verbose_name_plural': '套票全文檢索文件',
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
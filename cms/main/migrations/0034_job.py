@@ -0,0 +1,44 @@
+# Generated by Django 4.2 on 2026-10-18 06:48
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('main', '0033_searchdocument'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('task', models.CharField(max_length=100, verbose_name='工作類型')),
+                ('payload', models.JSONField(blank=True, default=dict, verbose_name='參數')),
+                ('status', models.CharField(choices=[('pending', '等待中'), ('running', '執行中'), ('succeeded', '已完成'), ('failed', '失敗')], default='pending', max_length=20, verbose_name='狀態')),
+                ('result', models.JSONField(blank=True, null=True, verbose_name='結果')),
+                ('error', models.TextField(blank=True, verbose_name='錯誤訊息')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='已執行次數')),
+                ('max_attempts', models.PositiveIntegerField(default=1, verbose_name='最多執行次數')),
+                ('run_after', models.DateTimeField(verbose_name='最早執行時間')),
+                ('locked_by', models.CharField(blank=True, max_length=100, verbose_name='執行中的 worker')),
+                ('locked_at', models.DateTimeField(blank=True, null=True, verbose_name='最後心跳時間')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='創建時間')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成時間')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='建立者')),
+            ],
+            options={
+                'verbose_name': '背景工作',
+                'verbose_name_plural': '背景工作',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 4.2 on 2026-10-18 07:00
+
+from django.db import migrations, models
+
+
+def fill_has_price(apps, schema_editor):
+    PackageCard = apps.get_model('main', 'PackageCard')
+    PackageCard.objects.filter(from_price__isnull=False).update(has_price=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0034_job'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='packagecard',
+            name='card_active_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='packagecard',
+            name='card_featured_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='packagecard',
+            name='card_secondary_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='packagecard',
+            name='card_continent_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='packagecard',
+            name='card_country_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='packagecard',
+            name='card_city_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='packagecard',
+            name='card_from_price_idx',
+        ),
+        migrations.AddField(
+            model_name='packagecard',
+            name='has_price',
+            field=models.BooleanField(default=False, help_text='價格排序用：沒有起價的套票排在最後', verbose_name='是否有起價'),
+        ),
+        migrations.RunPython(fill_has_price, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='dailyitinerary',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['package', 'day_number', 'display_order'], name='itinerary_pkg_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-created_at', '-package'], name='card_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(fields=['is_active'], name='card_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_featured', True)), fields=['-created_at'], name='card_featured_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(condition=models.Q(('is_active', True), ('is_secondary_featured', True)), fields=['-package_updated_at', '-created_at'], name='card_secondary_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['continent', '-created_at'], name='card_continent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['country', '-created_at'], name='card_country_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['city', '-created_at'], name='card_city_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['from_price', 'package'], name='card_from_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-has_price', 'from_price', 'package'], name='card_price_asc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='packagecard',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-has_price', '-from_price', '-package'], name='card_price_desc_idx'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-18 07:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0035_public_read_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageDerivative',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source_name', models.CharField(help_text='原圖在儲存空間中的路徑', max_length=500, verbose_name='原圖名稱')),
+                ('alias', models.CharField(max_length=50, verbose_name='用途')),
+                ('format', models.CharField(max_length=10, verbose_name='格式')),
+                ('width', models.PositiveIntegerField(verbose_name='寬度')),
+                ('height', models.PositiveIntegerField(verbose_name='高度')),
+                ('url', models.CharField(max_length=1000, verbose_name='網址')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='創建時間')),
+            ],
+            options={
+                'verbose_name': '圖片衍生檔',
+                'verbose_name_plural': '圖片衍生檔',
+            },
+        ),
+        migrations.AddField(
+            model_name='packagecard',
+            name='image_picture',
+            field=models.JSONField(blank=True, default=dict, verbose_name='主要圖片縮圖'),
+        ),
+        migrations.AddConstraint(
+            model_name='imagederivative',
+            constraint=models.UniqueConstraint(fields=('source_name', 'alias', 'format', 'width'), name='derivative_unique_variant'),
+        ),
+    ]
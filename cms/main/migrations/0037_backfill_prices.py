@@ -0,0 +1,66 @@
+from django.db import migrations
+from django.db.models import Min
+
+from main.pricing import parse_price
+
+BATCH_SIZE = 1000
+
+
+def _pages(queryset):
+    """依主鍵分批讀取（每批先讀完再寫入，SQLite 也不會在讀取中途修改同一張表）"""
+    last_pk = None
+    while True:
+        page = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        rows = list(page.order_by('pk')[:BATCH_SIZE])
+        if not rows:
+            return
+        yield rows
+        last_pk = rows[-1].pk
+
+
+def backfill_prices(apps, schema_editor):
+    """解析現有的價格文字，回填數值價格與幣別，再計算每個套票的最低房價（與 backfill_prices 指令相同）"""
+    Package = apps.get_model('main', 'Package')
+    RoomPrice = apps.get_model('main', 'RoomPrice')
+
+    for model in (RoomPrice, Package):
+        for rows in _pages(model.objects.only('pk', 'price', 'price_amount', 'price_currency')):
+            changed = []
+            for obj in rows:
+                amount, currency = parse_price(obj.price)
+                if amount != obj.price_amount or currency != obj.price_currency:
+                    obj.price_amount, obj.price_currency = amount, currency
+                    changed.append(obj)
+            model.objects.bulk_update(changed, ['price_amount', 'price_currency'])
+
+    minimums = dict(
+        RoomPrice.objects.filter(
+            is_active=True,
+            price_amount__isnull=False,
+            room_type__is_active=True,
+            room_type__hotel__is_active=True,
+            room_type__hotel__period__is_active=True,
+        )
+        .values('room_type__hotel__period__package_id')
+        .annotate(min_price=Min('price_amount'))
+        .order_by()
+        .values_list('room_type__hotel__period__package_id', 'min_price')
+    )
+    for rows in _pages(Package.objects.only('pk', 'min_room_price')):
+        changed = []
+        for package in rows:
+            if minimums.get(package.pk) != package.min_room_price:
+                package.min_room_price = minimums.get(package.pk)
+                changed.append(package)
+        Package.objects.bulk_update(changed, ['min_room_price'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0036_image_derivatives'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_prices, migrations.RunPython.noop),
+    ]
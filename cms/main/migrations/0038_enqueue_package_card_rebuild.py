@@ -0,0 +1,38 @@
+import logging
+
+from django.db import migrations
+from django.utils import timezone
+
+logger = logging.getLogger('main.migrations')
+
+
+def enqueue_card_rebuild(apps, schema_editor):
+    """
+    卡片表為空、但已有套票時，排入 rebuild_package_cards 背景工作。
+
+    卡片的內容（網址、標籤、起價、圖片衍生檔…）由 read_models.build_card 決定，無法以歷史模型重現，
+    因此遷移只建立工作，由 run_worker 以目前的程式碼重建；沒有執行 worker 時請執行同名的管理指令。
+    """
+    Package = apps.get_model('main', 'Package')
+    PackageCard = apps.get_model('main', 'PackageCard')
+    Job = apps.get_model('main', 'Job')
+    db_alias = schema_editor.connection.alias
+
+    if PackageCard.objects.using(db_alias).exists() or not Package.objects.using(db_alias).exists():
+        return
+    Job.objects.using(db_alias).create(task='rebuild_package_cards', payload={}, run_after=timezone.now())
+    logger.warning(
+        '套票卡片表為空：已排入 rebuild_package_cards 背景工作，列表頁與首頁在 run_worker 執行後才會顯示套票；'
+        '沒有執行 worker 時請執行 python manage.py rebuild_package_cards'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0037_backfill_prices'),
+    ]
+
+    operations = [
+        migrations.RunPython(enqueue_card_rebuild, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 4.2 on 2026-10-18 09:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0038_enqueue_package_card_rebuild'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='hotel',
+            name='period',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='hotels', to='main.period', verbose_name='所屬期間'),
+        ),
+        migrations.AlterField(
+            model_name='period',
+            name='package',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='periods', to='main.package', verbose_name='所屬套票'),
+        ),
+        migrations.AlterField(
+            model_name='roomimage',
+            name='room_type',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='images', to='main.roomtype', verbose_name='所屬房型'),
+        ),
+        migrations.AlterField(
+            model_name='roomprice',
+            name='room_type',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='prices', to='main.roomtype', verbose_name='所屬房型'),
+        ),
+        migrations.AlterField(
+            model_name='roomtype',
+            name='hotel',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='room_types', to='main.hotel', verbose_name='所屬酒店'),
+        ),
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['period', 'hotel_name'], name='hotel_period_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='period',
+            index=models.Index(fields=['package', 'period_text'], name='period_pkg_text_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomimage',
+            index=models.Index(fields=['room_type', 'created_at'], name='roomimage_type_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomprice',
+            index=models.Index(fields=['room_type', 'price'], name='roomprice_type_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomtype',
+            index=models.Index(fields=['hotel', 'room_type_name'], name='roomtype_hotel_name_idx'),
+        ),
+    ]
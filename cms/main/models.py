@@ -1,4 +1,5 @@
 from django.db import models
+from django.conf import settings
 from django.urls import reverse
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.text import slugify
@@ -6,8 +7,16 @@ from ckeditor.fields import RichTextField
 from ckeditor_uploader.fields import RichTextUploadingField
 from filer.fields.image import FilerImageField
 
+from .pricing import parse_price
+
 # Create your models here.
 
+def _geography():
+    # geography.py 匯入本模組，在呼叫時才匯入
+    from .geography import geography
+    return geography()
+
+
 class Continent(models.Model):
     """大陸模型"""
     name = models.CharField(max_length=100, verbose_name="大陸名稱")
@@ -62,6 +71,10 @@ class Country(models.Model):
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
+        # 已儲存的國家由地區登錄表組出網址，不必載入大陸
+        record = _geography().countries.get(self.pk)
+        if record is not None:
+            return record.url
         if self.continent:
             return reverse('main:package_list_by_country', kwargs={
                 'continent_slug': self.continent.slug,
@@ -71,7 +84,7 @@ class Country(models.Model):
 
 class Period(models.Model):
     """期間模型"""
-    package = models.ForeignKey('Package', on_delete=models.CASCADE, verbose_name="所屬套票", related_name='periods')
+    package = models.ForeignKey('Package', on_delete=models.CASCADE, verbose_name="所屬套票", related_name='periods', db_index=False)
     period_text = models.CharField(max_length=200, verbose_name="期間文字", help_text="例如：第1天、第2-3天等")
     is_active = models.BooleanField(default=True, verbose_name="是否啟用")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="創建時間")
@@ -81,6 +94,11 @@ class Period(models.Model):
         verbose_name = "期間"
         verbose_name_plural = "期間"
         ordering = ['package', 'period_text']
+        # 外鍵查詢（prefetch、串聯刪除）與管理後台列表的排序共用此索引，取代外鍵本身的索引；
+        # Hotel、RoomType、RoomPrice、RoomImage 同樣做法
+        indexes = [
+            models.Index(fields=['package', 'period_text'], name='period_pkg_text_idx'),
+        ]
 
     def __str__(self):
         return f"{self.package.name} - {self.period_text}"
@@ -88,7 +106,7 @@ class Period(models.Model):
 
 class Hotel(models.Model):
     """酒店模型"""
-    period = models.ForeignKey(Period, on_delete=models.CASCADE, verbose_name="所屬期間", related_name='hotels')
+    period = models.ForeignKey(Period, on_delete=models.CASCADE, verbose_name="所屬期間", related_name='hotels', db_index=False)
     hotel_name = models.CharField(max_length=200, verbose_name="酒店名稱")
     is_active = models.BooleanField(default=True, verbose_name="是否啟用")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="創建時間")
@@ -98,6 +116,9 @@ class Hotel(models.Model):
         verbose_name = "酒店"
         verbose_name_plural = "酒店"
         ordering = ['period', 'hotel_name']
+        indexes = [
+            models.Index(fields=['period', 'hotel_name'], name='hotel_period_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.hotel_name} ({self.period.period_text})"
@@ -105,7 +126,7 @@ class Hotel(models.Model):
 
 class RoomType(models.Model):
     """房型模型"""
-    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, verbose_name="所屬酒店", related_name='room_types')
+    hotel = models.ForeignKey(Hotel, on_delete=models.CASCADE, verbose_name="所屬酒店", related_name='room_types', db_index=False)
     room_type_name = models.CharField(max_length=100, verbose_name="房型名稱", help_text="例如：標準房、豪華房等")
     is_active = models.BooleanField(default=True, verbose_name="是否啟用")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="創建時間")
@@ -115,6 +136,9 @@ class RoomType(models.Model):
         verbose_name = "房型"
         verbose_name_plural = "房型"
         ordering = ['hotel', 'room_type_name']
+        indexes = [
+            models.Index(fields=['hotel', 'room_type_name'], name='roomtype_hotel_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.hotel.hotel_name} - {self.room_type_name}"
@@ -122,9 +146,12 @@ class RoomType(models.Model):
 
 class RoomPrice(models.Model):
     """房間價格模型"""
-    room_type = models.ForeignKey(RoomType, on_delete=models.CASCADE, verbose_name="所屬房型", related_name='prices')
+    room_type = models.ForeignKey(RoomType, on_delete=models.CASCADE, verbose_name="所屬房型", related_name='prices', db_index=False)
     price = models.CharField(max_length=100, verbose_name="價格", help_text="房間價格")
     price_description = models.CharField(max_length=200, verbose_name="價格說明", blank=True, help_text="例如：旺季價格、淡季價格等")
+    # 由 price 文字解析出的數值價格（儲存時自動更新）
+    price_amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="價格數值", blank=True, null=True, db_index=True, editable=False)
+    price_currency = models.CharField(max_length=3, verbose_name="幣別", blank=True, editable=False)
     is_active = models.BooleanField(default=True, verbose_name="是否啟用")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="創建時間")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
@@ -133,15 +160,25 @@ class RoomPrice(models.Model):
         verbose_name = "房間價格"
         verbose_name_plural = "房間價格"
         ordering = ['room_type', 'price']
+        indexes = [
+            models.Index(fields=['room_type', 'price'], name='roomprice_type_price_idx'),
+        ]
 
     def __str__(self):
         description = f" ({self.price_description})" if self.price_description else ""
         return f"{self.room_type.room_type_name} - {self.price}{description}"
 
+    def save(self, *args, **kwargs):
+        self.price_amount, self.price_currency = parse_price(self.price)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'price' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'price_amount', 'price_currency'}
+        super().save(*args, **kwargs)
+
 
 class RoomImage(models.Model):
     """房間圖片模型"""
-    room_type = models.ForeignKey(RoomType, on_delete=models.CASCADE, verbose_name="所屬房型", related_name='images')
+    room_type = models.ForeignKey(RoomType, on_delete=models.CASCADE, verbose_name="所屬房型", related_name='images', db_index=False)
     image = models.ImageField(upload_to='room_images/', verbose_name="房間圖片")
     image_description = models.CharField(max_length=200, verbose_name="圖片說明", blank=True)
     is_active = models.BooleanField(default=True, verbose_name="是否啟用")
@@ -152,6 +189,9 @@ class RoomImage(models.Model):
         verbose_name = "房間圖片"
         verbose_name_plural = "房間圖片"
         ordering = ['room_type', 'created_at']
+        indexes = [
+            models.Index(fields=['room_type', 'created_at'], name='roomimage_type_created_idx'),
+        ]
 
     def __str__(self):
         description = f" - {self.image_description}" if self.image_description else ""
@@ -183,6 +223,9 @@ class City(models.Model):
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
+        record = _geography().cities.get(self.pk)
+        if record is not None:
+            return record.url
         if self.country and self.country.continent:
             return reverse('main:package_list_by_city', kwargs={
                 'continent_slug': self.country.continent.slug,
@@ -243,6 +286,20 @@ class Package(models.Model):
         help_text="輸入提示詞讓 AI 自動生成套票描述"
     )
     price = models.CharField(max_length=100, verbose_name="套票價格", blank=True, null=True)
+
+    # 由 price 文字解析出的數值價格（儲存時自動更新），以及由房價彙總的最低價
+    price_amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="價格數值", blank=True, null=True, db_index=True, editable=False)
+    price_currency = models.CharField(max_length=3, verbose_name="幣別", blank=True, editable=False)
+    min_room_price = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        verbose_name="最低房價",
+        blank=True,
+        null=True,
+        db_index=True,
+        editable=False,
+        help_text="由期間 → 酒店 → 房型 → 房間價格自動計算",
+    )
     
     # 套票詳細資訊
     price_include_item = RichTextUploadingField(verbose_name="價格包含項目", blank=True, config_name='basic')
@@ -300,6 +357,7 @@ class Package(models.Model):
         verbose_name = "套票"
         verbose_name_plural = "套票"
         ordering = ['-created_at']
+        # 公開頁面只以 (city, slug) 查詢套票；列表與首頁讀取 PackageCard，索引見 PackageCard.Meta
         unique_together = [['city', 'slug']]
 
     def __str__(self):
@@ -312,9 +370,17 @@ class Package(models.Model):
             if not base_slug:
                 base_slug = f"package-{self.pk or ''}"
             self.slug = base_slug
+        self.price_amount, self.price_currency = parse_price(self.price)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'price' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'price_amount', 'price_currency'}
         super().save(*args, **kwargs)
 
     def get_absolute_url(self):
+        # 城市 / 國家 / 大陸的 slug 由地區登錄表取得，不必延遲載入上層
+        city = _geography().cities.get(self.city_id)
+        if city is not None:
+            return city.package_url(self.slug)
         if self.city and self.city.country and self.city.country.continent:
             return reverse('main:package_detail', kwargs={
                 'continent_slug': self.city.country.continent.slug,
@@ -331,104 +397,23 @@ class Package(models.Model):
             return round(discount, 0)
         return 0
 
+    @property
+    def from_price(self):
+        """「起」價：有房價時取最低房價，否則使用套票價格"""
+        if self.min_room_price is not None:
+            return self.min_room_price
+        return self.price_amount
+
     @property
     def country(self):
         """取得所屬國家"""
         return self.city.country if self.city else None
     
     def copy_package(self, new_name=None, new_slug=None):
-        """複製套票"""
-        # 創建新的套票實例
-        new_package = Package(
-            package_type=self.package_type,
-            city=self.city,
-            name=new_name or f"{self.name} (複製)",
-            slug=new_slug or f"{self.slug}-copy" if self.slug else None,
-            subtitle=self.subtitle,
-            description=self.description,
-            price=self.price,
-            price_include_item=self.price_include_item,
-            price_exclude_item=self.price_exclude_item,
-            price_vaild_date=self.price_vaild_date,
-            flight_info=self.flight_info,
-            tips=self.tips,
-            main_image=self.main_image,
-            is_active=False,  # 複製的套票預設為非啟用狀態
-            is_featured=False,  # 複製的套票預設為非精選
-            is_secondary_featured=False,  # 複製的套票預設為非次要精選
-            rich_text_table_one=self.rich_text_table_one,
-            rich_text_table=self.rich_text_table,
-            rich_text_table_three=self.rich_text_table_three,
-        )
-        new_package.save()
-        
-        # 複製標籤
-        new_package.tags.set(self.tags.all())
-        
-        # 複製期間資訊
-        for period in self.periods.all():
-            new_period = Period.objects.create(
-                package=new_package,
-                period_text=period.period_text,
-                is_active=period.is_active
-            )
-            # 複製酒店資訊
-            for hotel in period.hotels.all():
-                new_hotel = Hotel.objects.create(
-                    period=new_period,
-                    hotel_name=hotel.hotel_name,
-                    is_active=hotel.is_active
-                )
-                # 複製房型資訊
-                for room_type in hotel.room_types.all():
-                    new_room_type = RoomType.objects.create(
-                        hotel=new_hotel,
-                        room_type_name=room_type.room_type_name,
-                        is_active=room_type.is_active
-                    )
-                    # 複製價格資訊
-                    for price in room_type.prices.all():
-                        RoomPrice.objects.create(
-                            room_type=new_room_type,
-                            price=price.price,
-                            price_description=price.price_description,
-                            is_active=price.is_active
-                        )
-                    # 複製圖片資訊
-                    for image in room_type.images.all():
-                        RoomImage.objects.create(
-                            room_type=new_room_type,
-                            image=image.image,
-                            image_description=image.image_description,
-                            is_active=image.is_active
-                        )
-        
-        # 複製每天行程資訊
-        for itinerary in self.daily_itineraries.all():
-            new_itinerary = DailyItinerary.objects.create(
-                package=new_package,
-                day_number=itinerary.day_number,
-                title=itinerary.title,
-                description=itinerary.description,
-                meal_info=itinerary.meal_info,
-                accommodation=itinerary.accommodation,
-                transportation=itinerary.transportation,
-                notes=itinerary.notes,
-                display_order=itinerary.display_order,
-                is_active=itinerary.is_active
-            )
-            # 複製行程相片（Django-Filer 的圖片會被參照，不會複製實體檔案）
-            for image in itinerary.images.all():
-                ItineraryImage.objects.create(
-                    itinerary=new_itinerary,
-                    image=image.image,
-                    caption=image.caption,
-                    display_order=image.display_order,
-                    is_featured=image.is_featured,
-                    is_active=image.is_active
-                )
-        
-        return new_package
+        """複製套票（含期間、酒店、房型、價格、圖片與每天行程），見 main/copying.py"""
+        from .copying import copy_packages
+
+        return copy_packages([self], overrides={self.pk: (new_name, new_slug)})[0]
 
 
 class DailyItinerary(models.Model):
@@ -457,6 +442,13 @@ class DailyItinerary(models.Model):
         verbose_name_plural = "每天行程"
         ordering = ['package', 'day_number', 'display_order']
         unique_together = [['package', 'day_number']]
+        indexes = [
+            models.Index(
+                fields=['package', 'day_number', 'display_order'],
+                condition=models.Q(is_active=True),
+                name='itinerary_pkg_active_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.package.name} - 第{self.day_number}天：{self.title}"
@@ -498,3 +490,220 @@ class ItineraryImage(models.Model):
             ).exclude(pk=self.pk).update(is_featured=False)
         super().save(*args, **kwargs)
     
+
+
+class PackageCard(models.Model):
+    """
+    套票卡片讀取模型（反正規化）
+
+    列表頁與首頁卡片所需的資料都整理在這一張表，查詢時不需再 join
+    套票種類、城市、國家、大陸與標籤。由信號增量維護，
+    也可以用 `python manage.py rebuild_package_cards` 全量重建。
+    """
+    package = models.OneToOneField(Package, on_delete=models.CASCADE, primary_key=True, related_name='card', verbose_name="套票")
+    name = models.CharField(max_length=200, verbose_name="套票名稱")
+    slug = models.SlugField(max_length=200, verbose_name="URL 代碼", blank=True)
+    subtitle = models.CharField(max_length=300, verbose_name="副標題", blank=True)
+    price = models.CharField(max_length=100, verbose_name="套票價格", blank=True, null=True)
+    price_amount = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="價格數值", blank=True, null=True)
+    price_currency = models.CharField(max_length=3, verbose_name="幣別", blank=True)
+    from_price = models.DecimalField(max_digits=12, decimal_places=2, verbose_name="起價", blank=True, null=True, help_text="最低房價，沒有房價時為套票價格")
+    has_price = models.BooleanField(default=False, verbose_name="是否有起價", help_text="價格排序用：沒有起價的套票排在最後")
+    image_url = models.CharField(max_length=500, verbose_name="主要圖片網址", blank=True)
+    detail_url = models.CharField(max_length=500, verbose_name="詳情頁網址", blank=True, help_text="缺少 slug 資訊時為空白")
+    package_type_name = models.CharField(max_length=100, verbose_name="套票種類名稱", blank=True)
+
+    # 地區資訊（外鍵用於篩選，名稱與 slug 直接顯示）
+    continent = models.ForeignKey(Continent, on_delete=models.SET_NULL, verbose_name="大陸", blank=True, null=True, related_name='+')
+    country = models.ForeignKey(Country, on_delete=models.SET_NULL, verbose_name="國家", blank=True, null=True, related_name='+')
+    city = models.ForeignKey(City, on_delete=models.SET_NULL, verbose_name="城市", blank=True, null=True, related_name='+')
+    continent_name = models.CharField(max_length=100, verbose_name="大陸名稱", blank=True)
+    country_name = models.CharField(max_length=100, verbose_name="國家名稱", blank=True)
+    city_name = models.CharField(max_length=100, verbose_name="城市名稱", blank=True)
+
+    # 標籤：[{"name": "...", "color": "#007bff"}, ...]
+    tags = models.JSONField(default=list, blank=True, verbose_name="套票特色")
+
+    # 主要圖片的 card 用途衍生檔（main/images.py 的 picture 資料），尚未產生時為空
+    image_picture = models.JSONField(default=dict, blank=True, verbose_name="主要圖片縮圖")
+
+    # 與套票同步的狀態與排序欄位
+    is_active = models.BooleanField(default=True, verbose_name="是否啟用")
+    is_featured = models.BooleanField(default=False, verbose_name="是否精選")
+    is_secondary_featured = models.BooleanField(default=False, verbose_name="是否為次要精選")
+    created_at = models.DateTimeField(verbose_name="套票創建時間")
+    package_updated_at = models.DateTimeField(verbose_name="套票更新時間")
+
+    # 卡片本身的更新時間（地區或標籤變更也會更新，用於卡片片段快取鍵）
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
+
+    class Meta:
+        verbose_name = "套票卡片"
+        verbose_name_plural = "套票卡片"
+        ordering = ['-created_at']
+        indexes = [
+            # 布林欄位放在索引前導欄時 SQLite 無法據以搜尋（WHERE "is_active" 不是等值比較），
+            # 因此公開查詢的 is_active / 精選條件都寫成部分索引（partial index）
+            models.Index(fields=['-created_at', '-package'], condition=models.Q(is_active=True), name='card_active_created_idx'),
+            # 列表總數 COUNT(*) ... WHERE is_active 只讀這個索引（覆蓋索引），不必讀整張卡片表
+            models.Index(fields=['is_active'], name='card_active_idx'),
+            models.Index(
+                fields=['-created_at'],
+                condition=models.Q(is_active=True, is_featured=True),
+                name='card_featured_idx',
+            ),
+            models.Index(
+                fields=['-package_updated_at', '-created_at'],
+                condition=models.Q(is_active=True, is_secondary_featured=True),
+                name='card_secondary_idx',
+            ),
+            models.Index(fields=['continent', '-created_at'], condition=models.Q(is_active=True), name='card_continent_idx'),
+            models.Index(fields=['country', '-created_at'], condition=models.Q(is_active=True), name='card_country_idx'),
+            models.Index(fields=['city', '-created_at'], condition=models.Q(is_active=True), name='card_city_idx'),
+            models.Index(fields=['from_price', 'package'], condition=models.Q(is_active=True), name='card_from_price_idx'),
+            # 價格排序：以 has_price 代替 NULLS LAST（SQLite 的索引無法提供 NULLS LAST 的順序）
+            models.Index(fields=['-has_price', 'from_price', 'package'], condition=models.Q(is_active=True), name='card_price_asc_idx'),
+            models.Index(fields=['-has_price', '-from_price', '-package'], condition=models.Q(is_active=True), name='card_price_desc_idx'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+    def get_absolute_url(self):
+        return self.detail_url or reverse('main:package_list')
+
+
+class PackageFacet(models.Model):
+    """
+    套票搜尋的預先計算分面索引
+
+    每個啟用中的套票在每個分面維度（大陸、國家、城市、種類、標籤、價格區間、天數）
+    各有一筆或多筆資料，搜尋頁的分面數量直接由這張表彙總，與 PackageCard 一起維護。
+    """
+    DIMENSION_CHOICES = [
+        ('continent', '大陸'),
+        ('country', '國家'),
+        ('city', '城市'),
+        ('package_type', '套票種類'),
+        ('tag', '特色標籤'),
+        ('price', '價格區間'),
+        ('days', '行程天數'),
+    ]
+
+    package = models.ForeignKey(Package, on_delete=models.CASCADE, related_name='facets', verbose_name="套票")
+    dimension = models.CharField(max_length=20, choices=DIMENSION_CHOICES, verbose_name="分面維度")
+    value = models.CharField(max_length=50, verbose_name="分面值")
+    label = models.CharField(max_length=100, verbose_name="顯示名稱")
+    sort_key = models.IntegerField(default=0, verbose_name="排序值", help_text="價格區間與天數依此排序")
+
+    class Meta:
+        verbose_name = "套票分面索引"
+        verbose_name_plural = "套票分面索引"
+        indexes = [
+            models.Index(fields=['dimension', 'value', 'package'], name='facet_dim_value_pkg_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['package', 'dimension', 'value'], name='facet_unique_value'),
+        ]
+
+    def __str__(self):
+        return f"{self.package_id} {self.dimension}={self.value}"
+
+
+class SearchDocument(models.Model):
+    """
+    套票全文檢索文件
+
+    由套票名稱、副標題、描述、每天行程與酒店名稱組成，去除 HTML 後把中文切成字元二元組，
+    以空白分隔存放；實際的倒排索引由資料庫建立（SQLite FTS5 / PostgreSQL tsvector），
+    見 main/fulltext.py 與 0033 遷移。
+    """
+    package = models.OneToOneField(Package, on_delete=models.CASCADE, primary_key=True, related_name='search_document', verbose_name="套票")
+    title_tokens = models.TextField(verbose_name="標題詞彙", blank=True)
+    body_tokens = models.TextField(verbose_name="內容詞彙", blank=True)
+    plain_text = models.TextField(verbose_name="純文字內容", blank=True)
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
+
+    class Meta:
+        verbose_name = "套票全文檢索文件"
+        verbose_name_plural = "套票全文檢索文件"
+
+    def __str__(self):
+        return str(self.package_id)
+
+
+class Job(models.Model):
+    """
+    背景工作
+
+    管理後台較慢的操作（AI 生成、批量複製、PDF 預先產生、縮圖預熱）寫入此表，
+    由 manage.py run_worker 取出執行；只使用資料庫作為佇列，不需要 Redis。
+    """
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, '等待中'),
+        (STATUS_RUNNING, '執行中'),
+        (STATUS_SUCCEEDED, '已完成'),
+        (STATUS_FAILED, '失敗'),
+    ]
+
+    task = models.CharField(max_length=100, verbose_name="工作類型")
+    payload = models.JSONField(default=dict, blank=True, verbose_name="參數")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, verbose_name="狀態")
+    result = models.JSONField(blank=True, null=True, verbose_name="結果")
+    error = models.TextField(blank=True, verbose_name="錯誤訊息")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="已執行次數")
+    max_attempts = models.PositiveIntegerField(default=1, verbose_name="最多執行次數")
+    run_after = models.DateTimeField(verbose_name="最早執行時間")
+    locked_by = models.CharField(max_length=100, blank=True, verbose_name="執行中的 worker")
+    locked_at = models.DateTimeField(blank=True, null=True, verbose_name="最後心跳時間")
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True,
+        related_name='+', verbose_name="建立者",
+    )
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="創建時間")
+    finished_at = models.DateTimeField(blank=True, null=True, verbose_name="完成時間")
+
+    class Meta:
+        verbose_name = "背景工作"
+        verbose_name_plural = "背景工作"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk}（{self.get_status_display()}）"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_SUCCEEDED, self.STATUS_FAILED)
+
+
+class ImageDerivative(models.Model):
+    """
+    圖片衍生檔清單
+
+    每張原圖在各用途（card / hero / room / itinerary）、各格式與寬度的縮圖，
+    由 main/images.py 在圖片儲存後產生。樣板只讀這張表組成 srcset，不需要存取儲存空間。
+    """
+    source_name = models.CharField(max_length=500, verbose_name="原圖名稱", help_text="原圖在儲存空間中的路徑")
+    alias = models.CharField(max_length=50, verbose_name="用途")
+    format = models.CharField(max_length=10, verbose_name="格式")
+    width = models.PositiveIntegerField(verbose_name="寬度")
+    height = models.PositiveIntegerField(verbose_name="高度")
+    url = models.CharField(max_length=1000, verbose_name="網址")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="創建時間")
+
+    class Meta:
+        verbose_name = "圖片衍生檔"
+        verbose_name_plural = "圖片衍生檔"
+        constraints = [
+            models.UniqueConstraint(fields=['source_name', 'alias', 'format', 'width'], name='derivative_unique_variant'),
+        ]
+
+    def __str__(self):
+        return f"{self.source_name} {self.alias} {self.width}w.{self.format}"
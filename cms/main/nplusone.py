@@ -0,0 +1,234 @@
+"""
+開發期 N+1 偵測
+
+記錄一個請求（或 detect_n_plus_one 區塊）中每一次「延遲載入」關聯的位置：
+
+- 正向外鍵 / 一對一：instance.city 沒有 select_related 時的查詢
+- 反向一對一：package.card 沒有 select_related 時的查詢
+- 反向外鍵 / 多對多：package.periods.all() 沒有 prefetch_related 時建立的查詢
+
+同一個關聯在同一個呼叫位置（專案程式碼的檔案:行號，或樣板名稱:行號）
+載入次數達到 NPLUSONE_THRESHOLD 即視為 N+1：DEBUG 時寫入 main.nplusone logger，
+測試時（NPlusOneTestRunner）直接拋出 NPlusOneError，讓測試失敗並指出位置與次數。
+
+掛勾只在 NPLUSONE_ENABLED 時於 MainConfig.ready() 安裝（測試由 NPlusOneTestRunner 安裝），
+正式環境不修改 Django 的關聯存取；已安裝但目前請求沒有啟用偵測時只多一次 ContextVar 讀取。
+"""
+import logging
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.models import query as query_module
+from django.db.models.fields import related_descriptors
+from django.template import base as template_base
+from django.test.runner import DiscoverRunner
+
+logger = logging.getLogger(__name__)
+
+# 目前的偵測紀錄（未啟用時為 None）
+_current = ContextVar('nplusone', default=None)
+
+_PREFETCH_ONE_LEVEL = query_module.prefetch_one_level.__code__
+_DJANGO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(template_base.__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+
+class NPlusOneError(AssertionError):
+    """測試中偵測到 N+1 延遲載入"""
+
+
+def threshold():
+    return getattr(settings, 'NPLUSONE_THRESHOLD', 3)
+
+
+def is_enabled():
+    return getattr(settings, 'NPLUSONE_ENABLED', False)
+
+
+class LazyLoadLog:
+    """一段程式執行期間的延遲載入次數：{(關聯, 呼叫位置): 次數}"""
+
+    def __init__(self):
+        self.loads = Counter()
+
+    def add(self, relation):
+        self.loads[(relation, call_site())] += 1
+
+    def violations(self, limit=None):
+        """達到門檻的 [(關聯, 呼叫位置, 次數), ...]，次數多的在前"""
+        limit = limit or threshold()
+        return [
+            (relation, site, count)
+            for (relation, site), count in self.loads.most_common() if count >= limit
+        ]
+
+
+def report(violations):
+    return '\n'.join(f'{relation} 在 {site} 延遲載入 {count} 次' for relation, site, count in violations)
+
+
+def _is_project_file(filename):
+    filename = os.path.abspath(filename)
+    return (
+        filename.startswith(str(settings.BASE_DIR))
+        and filename != _THIS_FILE
+        and 'site-packages' not in filename
+    )
+
+
+def call_site():
+    """由內往外找第一個專案程式碼的 frame 或正在渲染的樣板節點"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        code = frame.f_code
+        if code is template_base.Node.render_annotated.__code__:
+            node = frame.f_locals.get('self')
+            origin = getattr(node, 'origin', None)
+            token = getattr(node, 'token', None)
+            if origin is not None and token is not None:
+                return f'{origin.template_name}:{token.lineno}'
+        elif not code.co_filename.startswith(_DJANGO_DIR) and _is_project_file(code.co_filename):
+            return f'{os.path.relpath(code.co_filename, settings.BASE_DIR)}:{frame.f_lineno} ({code.co_name})'
+        frame = frame.f_back
+    return '(未知位置)'
+
+
+def _record(relation):
+    log = _current.get()
+    if log is not None:
+        log.add(relation)
+
+
+# ========== 掛勾 ==========
+
+def _forward_get_object(get_object):
+    def wrapper(self, instance):
+        _record(f'{self.field.model._meta.label}.{self.field.name}')
+        return get_object(self, instance)
+    wrapper._nplusone = True
+    return wrapper
+
+
+def _reverse_one_to_one_get_queryset(get_queryset):
+    def wrapper(self, **hints):
+        # 預先載入（prefetch）不帶 instance，只記錄單筆的延遲載入
+        if 'instance' in hints:
+            _record(f'{self.related.model._meta.label}.{self.related.get_accessor_name()}')
+        return get_queryset(self, **hints)
+    wrapper._nplusone = True
+    return wrapper
+
+
+def _called_from_prefetch():
+    frame = sys._getframe(2)
+    for _ in range(2):
+        if frame is None:
+            return False
+        if frame.f_code is _PREFETCH_ONE_LEVEL:
+            return True
+        frame = frame.f_back
+    return False
+
+
+def _manager_factory(factory):
+    """
+    包裝反向外鍵 / 多對多 manager 的類別工廠；
+    _apply_rel_filters 只在沒有 prefetch 快取、需要另外查詢時才會呼叫。
+    """
+    def wrapper(superclass, rel, *args, **kwargs):
+        manager_class = factory(superclass, rel, *args, **kwargs)
+        apply_rel_filters = manager_class._apply_rel_filters
+        # 多對多的正向 manager 以欄位名稱存取，其餘以反向存取名稱
+        reverse = kwargs.get('reverse', args[0] if args else True)
+        accessor = rel.get_accessor_name() if reverse else rel.field.name
+
+        def _apply_rel_filters(self, queryset):
+            # 未啟用偵測時不檢查呼叫堆疊
+            log = _current.get()
+            # prefetch_related 把預先載入的結果放回 manager 時也會呼叫（直接或經由 get_queryset），但不會查詢
+            if log is not None and not _called_from_prefetch():
+                log.add(f'{type(self.instance)._meta.label}.{accessor}')
+            return apply_rel_filters(self, queryset)
+
+        return type(manager_class.__name__, (manager_class,), {'_apply_rel_filters': _apply_rel_filters})
+    wrapper._nplusone = True
+    return wrapper
+
+
+def install():
+    """安裝延遲載入的掛勾（可重複呼叫）"""
+    descriptors = related_descriptors
+    if getattr(descriptors.ForwardManyToOneDescriptor.get_object, '_nplusone', False):
+        return
+    # ForwardOneToOneDescriptor.get_object 最後也會呼叫父類別的 get_object
+    descriptors.ForwardManyToOneDescriptor.get_object = _forward_get_object(
+        descriptors.ForwardManyToOneDescriptor.get_object
+    )
+    descriptors.ReverseOneToOneDescriptor.get_queryset = _reverse_one_to_one_get_queryset(
+        descriptors.ReverseOneToOneDescriptor.get_queryset
+    )
+    descriptors.create_reverse_many_to_one_manager = _manager_factory(descriptors.create_reverse_many_to_one_manager)
+    descriptors.create_forward_many_to_many_manager = _manager_factory(descriptors.create_forward_many_to_many_manager)
+
+
+@contextmanager
+def detect_n_plus_one(limit=None):
+    """
+    區塊內的延遲載入達到門檻時拋出 NPlusOneError。
+
+    用法：
+        with detect_n_plus_one():
+            self.client.get(url)
+    """
+    log = LazyLoadLog()
+    token = _current.set(log)
+    try:
+        yield log
+    finally:
+        _current.reset(token)
+    violations = log.violations(limit)
+    if violations:
+        raise NPlusOneError('偵測到 N+1 延遲載入：\n' + report(violations))
+
+
+class NPlusOneMiddleware:
+    """
+    NPLUSONE_ENABLED（預設跟隨 DEBUG）時記錄每個請求的延遲載入；
+    達到門檻時寫入 warning log，NPLUSONE_RAISE 為 True 時改為拋出 NPlusOneError。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_enabled() or _current.get() is not None:
+            return self.get_response(request)
+
+        log = LazyLoadLog()
+        token = _current.set(log)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        violations = log.violations()
+        if violations:
+            message = f'{request.method} {request.path} 偵測到 N+1 延遲載入：\n{report(violations)}'
+            if getattr(settings, 'NPLUSONE_RAISE', False):
+                raise NPlusOneError(message)
+            logger.warning(message)
+        return response
+
+
+class NPlusOneTestRunner(DiscoverRunner):
+    """測試時對每個請求啟用偵測，出現 N+1 即讓測試失敗"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.NPLUSONE_ENABLED = True
+        settings.NPLUSONE_RAISE = True
+        install()
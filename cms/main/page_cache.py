@@ -0,0 +1,201 @@
+"""
+匿名訪客的整頁快取（含相依資料追蹤）
+
+每個快取項目會記錄頁面所依賴的資料列（例如套票、期間、酒店、城市…），
+每個資料列在快取中都有一個版本 token。資料列儲存或刪除時由信號更新 token，
+讀取快取時只要任一相依 token 改變，該頁即視為失效並重新渲染。
+ETag 也由同一組相依版本計算，因此 304 判斷不需要查詢資料庫。
+
+頁面存放在預設快取，版本 token 存放在 cache.version_cache()（不會與頁面一起被清除或淘汰）。
+儲存資料的行程（後台、run_worker、管理指令）與提供頁面的行程必須使用同一個快取後端，
+行程內的 LocMemCache 會被系統檢查 main.E001 拒絕（見 checks.py）。
+"""
+import hashlib
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from .cache import version_cache
+from .routers import reading_from_replica
+from .single_flight import single_flight
+
+PAGE_KEY_PREFIX = 'page-cache'
+DEPENDENCY_KEY_PREFIX = 'page-dep'
+
+
+def dependency_key(model, pk=None):
+    """
+    資料列的相依鍵，例如 ``main.package:12``。
+    未提供 pk 時代表整個資料表的集合（新增 / 刪除 / 上下架會影響列表頁）。
+    """
+    label = model._meta.label_lower
+    return f'{label}:{pk}' if pk is not None else f'{label}:*'
+
+
+def add_page_dependencies(request, *instances):
+    """記錄目前請求的頁面依賴哪些資料列（模型實例，或以 model 屬性指出模型的地區紀錄，見 geography.py）"""
+    add_page_dependency_keys(
+        request, *(dependency_key(getattr(obj, 'model', type(obj)), obj.pk) for obj in instances if obj is not None)
+    )
+
+
+def add_page_dependency_keys(request, *keys):
+    """直接以相依鍵記錄依賴，適合只有外鍵 id 而沒有實例的情況"""
+    dependencies = getattr(request, '_page_dependencies', None)
+    if dependencies is not None:
+        dependencies.update(keys)
+
+
+def _new_token():
+    # 以產生時間開頭，讀取複本時可判斷資料是否剛變更（_changed_within）
+    return f'{int(time.time())}-{uuid.uuid4().hex}'
+
+
+def _changed_within(versions, seconds):
+    """任一相依版本是否在 seconds 秒內產生"""
+    threshold = time.time() - seconds
+    for token in versions.values():
+        created, _, _ = str(token).partition('-')
+        if created.isdigit() and int(created) >= threshold:
+            return True
+    return False
+
+
+def bump_dependencies(*keys):
+    """更新相依資料列的版本 token，讓依賴它們的頁面失效"""
+    if keys:
+        version_cache().set_many(
+            {f'{DEPENDENCY_KEY_PREFIX}:{key}': _new_token() for key in keys},
+            timeout=None,
+        )
+
+
+def get_dependency_versions(keys):
+    """取得相依資料列目前的版本；遺失的 token 會補上新值（等同失效）"""
+    versions = version_cache()
+    cache_keys = {f'{DEPENDENCY_KEY_PREFIX}:{key}': key for key in keys}
+    found = versions.get_many(cache_keys.keys())
+    missing = {cache_key: _new_token() for cache_key in cache_keys if cache_key not in found}
+    for cache_key, token in missing.items():
+        if not versions.add(cache_key, token, timeout=None):
+            missing[cache_key] = versions.get(cache_key, token)
+    found.update(missing)
+    return {key: found[cache_key] for cache_key, key in cache_keys.items()}
+
+
+def _page_key(request):
+    path = f'{request.get_host()}{request.get_full_path()}'
+    return f'{PAGE_KEY_PREFIX}:{hashlib.md5(path.encode()).hexdigest()}'
+
+
+def _make_etag(page_key, versions):
+    digest = hashlib.md5(page_key.encode())
+    for key in sorted(versions):
+        digest.update(f'{key}={versions[key]};'.encode())
+    return quote_etag(digest.hexdigest())
+
+
+def _etag_matches(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return '*' in etags or etag in etags
+
+
+def _finalize(response, etag):
+    response['ETag'] = etag
+    patch_cache_control(response, max_age=0, must_revalidate=True)
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def _is_cacheable_request(request):
+    if request.method not in ('GET', 'HEAD'):
+        return False
+    # 有 session cookie 才需要檢查登入狀態，避免匿名請求多一次 session 查詢
+    if settings.SESSION_COOKIE_NAME in request.COOKIES and request.user.is_authenticated:
+        return False
+    return True
+
+
+def _cached_response(request, entry):
+    if _etag_matches(request, entry['etag']):
+        return _finalize(HttpResponseNotModified(), entry['etag'])
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    return _finalize(response, entry['etag'])
+
+
+def _render_and_store(request, page_key, view_func, args, kwargs):
+    request._page_dependencies = set()
+    response = view_func(request, *args, **kwargs)
+    dependencies = request._page_dependencies
+
+    if (
+        response.status_code != 200
+        or response.streaming
+        or response.cookies
+        or not dependencies
+    ):
+        return response
+
+    versions = get_dependency_versions(dependencies)
+    if reading_from_replica() and _changed_within(versions, settings.DATABASE_REPLICA_STICKY_SECONDS):
+        # 複本可能還沒有剛變更的資料，這次的結果不快取
+        return response
+    etag = _make_etag(page_key, versions)
+    cache.set(page_key, {
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'dependencies': sorted(dependencies),
+        'versions': versions,
+        'etag': etag,
+    }, timeout=settings.PAGE_CACHE_TIMEOUT)
+
+    if _etag_matches(request, etag):
+        return _finalize(HttpResponseNotModified(), etag)
+    return _finalize(response, etag)
+
+
+def cache_anonymous_page(view_func):
+    """
+    匿名訪客整頁快取裝飾器。
+
+    view 需透過 add_page_dependencies() 記錄頁面依賴的資料列；
+    未記錄任何依賴、非 200 回應或會設定 cookie 的回應都不會被快取。
+    快取未命中或已失效時以 single_flight 重建：同一頁同時只有一個請求執行 view，
+    其他請求先取得失效前的頁面，沒有舊頁面時等待重建結果。
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable_request(request):
+            return view_func(request, *args, **kwargs)
+
+        page_key = _page_key(request)
+        entry = cache.get(page_key)
+        if entry is not None:
+            versions = get_dependency_versions(entry['dependencies'])
+            if versions == entry['versions']:
+                return _cached_response(request, entry)
+
+        def lookup():
+            # 只接受這次失效之後重建的頁面
+            rebuilt = cache.get(page_key)
+            if rebuilt is None or (entry is not None and rebuilt['etag'] == entry['etag']):
+                return None
+            return _cached_response(request, rebuilt)
+
+        return single_flight(
+            page_key,
+            lambda: _render_and_store(request, page_key, view_func, args, kwargs),
+            lookup,
+            stale=_cached_response(request, entry) if entry is not None else None,
+        )
+
+    return wrapper
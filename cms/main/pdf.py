@@ -0,0 +1,200 @@
+"""
+每天行程 PDF 的產生與儲存快取
+
+- 字型與樣式表每個行程（process）只載入一次
+- 產生的 PDF 存放在預設儲存空間（S3），檔名由套票與行程的最後更新時間決定，
+  內容沒變就直接讀取既有檔案，不必再經過 ReportLab
+- manage.py prebuild_itinerary_pdfs 可事先以多個行程平行產生過期的 PDF
+"""
+import hashlib
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max, Q
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+from .models import DailyItinerary, Package
+from .single_flight import single_flight
+
+# 儲存空間中的 PDF 目錄：itinerary_pdfs/<套票 id>/<版本>.pdf
+PDF_STORAGE_DIR = 'itinerary_pdfs'
+
+FONT_NAME = 'NotoSansTC'
+FALLBACK_FONT_NAME = 'Helvetica'
+
+ACTIVE_ITINERARIES = Q(daily_itineraries__is_active=True)
+
+
+@lru_cache(maxsize=None)
+def get_font_name():
+    """註冊繁體中文字型（每個行程只執行一次），失敗時退回預設字型（中文可能變方框）"""
+    font_path = settings.BASE_DIR / "fonts" / "NotoSansTC-Regular.ttf"
+    try:
+        pdfmetrics.registerFont(TTFont(FONT_NAME, str(font_path)))
+        return FONT_NAME
+    except Exception:
+        return FALLBACK_FONT_NAME
+
+
+@lru_cache(maxsize=None)
+def get_pdf_styles():
+    """回傳套用中文字型的標題 / 副標題 / 小標 / 內文樣式"""
+    font_name = get_font_name()
+    styles = getSampleStyleSheet()
+    selected = {
+        'title': styles['Title'],
+        'subtitle': styles['Heading2'],
+        'heading': styles['Heading3'],
+        'body': styles['BodyText'],
+    }
+    for style in selected.values():
+        style.fontName = font_name
+    return selected
+
+
+def with_pdf_version(queryset):
+    """為套票查詢標註產生 PDF 版本所需的欄位（啟用行程的最後更新時間與數量）"""
+    return queryset.annotate(
+        itinerary_updated_at=Max('daily_itineraries__updated_at', filter=ACTIVE_ITINERARIES),
+        itinerary_count=Count('daily_itineraries', filter=ACTIVE_ITINERARIES),
+    )
+
+
+def pdf_version(package):
+    """
+    PDF 版本：套票本身（名稱、副標題）與啟用中行程的最後更新時間；
+    加入行程數量，刪除或停用較舊的行程時版本也會改變。
+    """
+    itinerary_updated_at = package.itinerary_updated_at.isoformat() if package.itinerary_updated_at else ''
+    raw = f"{package.pk}|{package.updated_at.isoformat()}|{itinerary_updated_at}|{package.itinerary_count}"
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def pdf_last_modified(package):
+    return max(filter(None, [package.updated_at, package.itinerary_updated_at]))
+
+
+def pdf_storage_path(package, version=None):
+    return f"{PDF_STORAGE_DIR}/{package.pk}/{version or pdf_version(package)}.pdf"
+
+
+def _multiline(text):
+    return text.replace('\n', '<br/>')
+
+
+def build_itinerary_pdf(package, daily_itineraries):
+    """以 ReportLab 產生每天行程 PDF，回傳 bytes"""
+    styles = get_pdf_styles()
+    title_style = styles['title']
+    subtitle_style = styles['subtitle']
+    heading_style = styles['heading']
+    body_style = styles['body']
+
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer,
+        pagesize=A4,
+        leftMargin=2 * cm,
+        rightMargin=2 * cm,
+        topMargin=2 * cm,
+        bottomMargin=2 * cm,
+    )
+
+    story = []
+
+    # 標題
+    story.append(Paragraph(f"{package.name}", title_style))
+    if package.subtitle:
+        story.append(Paragraph(str(package.subtitle), subtitle_style))
+    story.append(Spacer(1, 12))
+    story.append(Paragraph("每天行程", heading_style))
+    story.append(Spacer(1, 12))
+
+    if not daily_itineraries:
+        story.append(Paragraph("此套票目前未設定每天行程。", body_style))
+    else:
+        for itinerary in daily_itineraries:
+            day_title = f"第 {itinerary.day_number} 天：{itinerary.title}"
+            story.append(Paragraph(day_title, heading_style))
+            story.append(Spacer(1, 6))
+
+            if itinerary.description:
+                story.append(Paragraph(f"<b>行程描述：</b>{_multiline(itinerary.description)}", body_style))
+                story.append(Spacer(1, 4))
+
+            # 餐食 / 住宿 / 交通
+            if itinerary.meal_info:
+                story.append(Paragraph(f"<b>餐食：</b>{itinerary.meal_info}", body_style))
+            if itinerary.accommodation:
+                story.append(Paragraph(f"<b>住宿：</b>{itinerary.accommodation}", body_style))
+            if itinerary.transportation:
+                story.append(Paragraph(f"<b>交通：</b>{itinerary.transportation}", body_style))
+
+            if itinerary.meal_info or itinerary.accommodation or itinerary.transportation:
+                story.append(Spacer(1, 4))
+
+            if itinerary.notes:
+                story.append(Paragraph(f"<b>備註：</b>{_multiline(itinerary.notes)}", body_style))
+                story.append(Spacer(1, 8))
+
+            # 每天之間加上一些空白
+            story.append(Spacer(1, 12))
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def _remove_old_versions(package, keep_path):
+    """刪除同一套票的舊版 PDF（儲存空間不支援列目錄時略過）"""
+    directory = f"{PDF_STORAGE_DIR}/{package.pk}"
+    try:
+        _, files = default_storage.listdir(directory)
+    except (NotImplementedError, FileNotFoundError):
+        return
+    for name in files:
+        path = f"{directory}/{name}"
+        if path != keep_path:
+            default_storage.delete(path)
+
+
+def ensure_itinerary_pdf(package, force=False):
+    """
+    確保目前版本的 PDF 已存在於儲存空間，回傳 (path, built)。
+
+    package 需由 with_pdf_version() 標註過。同一版本同時只有一個請求產生 PDF（single_flight），
+    其他請求等待同一個檔案完成。
+    """
+    path = pdf_storage_path(package)
+
+    def lookup():
+        return (path, False) if default_storage.exists(path) else None
+
+    def build():
+        daily_itineraries = list(
+            DailyItinerary.objects.filter(package=package, is_active=True).order_by('day_number', 'display_order')
+        )
+        content = build_itinerary_pdf(package, daily_itineraries)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        default_storage.save(path, ContentFile(content))
+        _remove_old_versions(package, path)
+        return path, True
+
+    if force:
+        return build()
+    return lookup() or single_flight(f'pdf:{path}', build, lookup)
+
+
+def pdf_package_queryset():
+    """產生 PDF 只需要的套票欄位"""
+    return with_pdf_version(
+        Package.objects.filter(is_active=True).only('pk', 'name', 'subtitle', 'slug', 'updated_at')
+    )
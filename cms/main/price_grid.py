@@ -0,0 +1,114 @@
+"""
+房價表格編輯
+
+一個套票（或一個城市所有套票）的房價以一張表格編輯：一列一個 RoomPrice（期間 × 酒店 × 房型 × 價格說明），
+不必逐一展開 期間 → 酒店 → 房型 的巢狀表單。管理後台的「房價表」頁面只送出修改過的儲存格，
+由 save_price_changes 驗證後以一個 bulk_update 在同一個交易中寫入，並一次更新最低房價與頁面快取。
+"""
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import RoomPrice
+from .page_cache import dependency_key
+from .pricing import parse_price
+from .tree_saving import refresh_derived_data
+
+# 表格中可編輯的欄位
+GRID_FIELDS = ('price', 'price_description', 'is_active')
+
+PACKAGE_PATH = 'room_type__hotel__period__package'
+
+
+def grid_prices(**filters):
+    """
+    表格的房價，依 套票 → 期間 → 酒店 → 房型 排列；filters 例如 room_type__hotel__period__package=package。
+
+    上層只以 annotate 取名稱（套票有多個富文本欄位，整城市的表格不載入整筆上層資料）。
+    """
+    return (
+        RoomPrice.objects.filter(**filters)
+        .annotate(
+            package_name=F(f'{PACKAGE_PATH}__name'),
+            period_text=F('room_type__hotel__period__period_text'),
+            hotel_name=F('room_type__hotel__hotel_name'),
+            room_type_name=F('room_type__room_type_name'),
+        )
+        .order_by(
+            f'{PACKAGE_PATH}__name', f'{PACKAGE_PATH}_id',
+            'room_type__hotel__period__period_text', 'room_type__hotel__period_id',
+            'room_type__hotel__hotel_name', 'room_type__hotel_id',
+            'room_type__room_type_name', 'room_type_id',
+            'pk',
+        )
+    )
+
+
+def _error_message(error):
+    return '；'.join(error.messages)
+
+
+def save_price_changes(prices, changes):
+    """
+    寫入表格的修改並回傳 (更新筆數, 錯誤)。
+
+    changes 為 [{'id': 房價 id, 欄位: 值, ...}, ...]，只需包含修改過的欄位；只接受 prices 範圍內的房價。
+    錯誤為 {房價 id: 訊息}，有任何錯誤時不寫入任何資料。
+    """
+    wanted = {}
+    errors = {}
+    for change in changes:
+        try:
+            pk = int(change['id'])
+        except (KeyError, TypeError, ValueError):
+            raise ValidationError('缺少房價 id')
+        wanted.setdefault(pk, {}).update(
+            (name, value) for name, value in change.items() if name in GRID_FIELDS
+        )
+
+    rows = {
+        obj.pk: obj
+        for obj in prices.filter(pk__in=wanted).order_by()
+        .annotate(package_id=F(f'{PACKAGE_PATH}_id'))
+    }
+    changed = []
+    fields = set()
+    for pk, values in wanted.items():
+        obj = rows.get(pk)
+        if obj is None:
+            errors[pk] = '找不到此房價'
+            continue
+        row_fields = []
+        for name, value in values.items():
+            field = RoomPrice._meta.get_field(name)
+            if isinstance(value, str):
+                value = value.strip()
+            try:
+                value = field.clean(value, obj)
+            except ValidationError as error:
+                errors[pk] = f'{field.verbose_name}：{_error_message(error)}'
+                break
+            if getattr(obj, name) != value:
+                setattr(obj, name, value)
+                row_fields.append(name)
+        if row_fields and pk not in errors:
+            changed.append(obj)
+            fields.update(row_fields)
+
+    if errors or not changed:
+        return 0, errors
+
+    now = timezone.now()
+    for obj in changed:
+        obj.price_amount, obj.price_currency = parse_price(obj.price)
+        obj.updated_at = now
+    with transaction.atomic():
+        RoomPrice.objects.bulk_update(
+            changed, sorted(fields) + ['price_amount', 'price_currency', 'updated_at'],
+        )
+        refresh_derived_data(
+            {obj.package_id for obj in changed}, {RoomPrice},
+            [dependency_key(RoomPrice, obj.pk) for obj in changed],
+        )
+    return len(changed), {}
@@ -0,0 +1,125 @@
+"""
+價格解析與數值價格索引
+
+Package.price / RoomPrice.price 為自由輸入的文字（例如 "13,790"、"NT$ 25,800 起"），
+這裡把文字解析成 Decimal + 幣別存進獨立欄位，讓資料庫可以直接排序、篩選與彙總。
+"""
+import re
+from decimal import Decimal, InvalidOperation
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Min
+
+# 依出現順序比對幣別標記（較長的標記需排在前面）
+CURRENCY_MARKERS = (
+    ('NT$', 'TWD'),
+    ('NTD', 'TWD'),
+    ('TWD', 'TWD'),
+    ('新台幣', 'TWD'),
+    ('台幣', 'TWD'),
+    ('HK$', 'HKD'),
+    ('HKD', 'HKD'),
+    ('港幣', 'HKD'),
+    ('港元', 'HKD'),
+    ('US$', 'USD'),
+    ('USD', 'USD'),
+    ('美金', 'USD'),
+    ('美元', 'USD'),
+    ('RMB', 'CNY'),
+    ('CNY', 'CNY'),
+    ('人民幣', 'CNY'),
+    ('JPY', 'JPY'),
+    ('日圓', 'JPY'),
+    ('日幣', 'JPY'),
+    ('EUR', 'EUR'),
+    ('€', 'EUR'),
+)
+
+NUMBER_PATTERN = re.compile(r'\d[\d,]*(?:\.\d+)?')
+
+# 數值價格欄位為 DecimalField(max_digits=12, decimal_places=2)，整數部分最多 10 位
+MAX_PRICE_AMOUNT = Decimal('9999999999.99')
+
+
+def parse_price(text) -> Tuple[Optional[Decimal], str]:
+    """
+    解析價格文字，回傳 (金額, 幣別)。
+
+    - 只取第一個數字（"5,000-8,000" 視為 5,000 起）。
+    - 找不到幣別標記時使用 settings.DEFAULT_PRICE_CURRENCY。
+    - 無法解析，或金額超過 MAX_PRICE_AMOUNT 時回傳 (None, '')。
+    """
+    if not text:
+        return None, ''
+
+    text = str(text)
+    match = NUMBER_PATTERN.search(text)
+    if not match:
+        return None, ''
+
+    try:
+        # 超過 Decimal 精度的數字 quantize 時會拋出 InvalidOperation
+        amount = Decimal(match.group(0).replace(',', '')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None, ''
+    if amount > MAX_PRICE_AMOUNT:
+        return None, ''
+
+    upper_text = text.upper()
+    currency = getattr(settings, 'DEFAULT_PRICE_CURRENCY', 'TWD')
+    for marker, code in CURRENCY_MARKERS:
+        if marker in upper_text:
+            currency = code
+            break
+
+    return amount, currency
+
+
+def room_price_minimums(package_ids=None):
+    """
+    以單一彙總查詢計算套票的最低房價（只計算啟用中的期間 / 酒店 / 房型 / 價格）。
+
+    回傳 {package_id: Decimal}；沒有任何可用房價的套票不會出現在結果中。
+    """
+    from .models import RoomPrice
+
+    queryset = RoomPrice.objects.filter(
+        is_active=True,
+        price_amount__isnull=False,
+        room_type__is_active=True,
+        room_type__hotel__is_active=True,
+        room_type__hotel__period__is_active=True,
+    )
+    if package_ids is not None:
+        queryset = queryset.filter(room_type__hotel__period__package_id__in=package_ids)
+
+    rows = (
+        queryset.values('room_type__hotel__period__package_id')
+        .annotate(min_price=Min('price_amount'))
+        .order_by()
+    )
+    return {row['room_type__hotel__period__package_id']: row['min_price'] for row in rows}
+
+
+def update_min_room_prices(package_ids):
+    """
+    重新計算指定套票的 min_room_price，回傳數值有變動的套票 id。
+
+    使用 update() 寫入，不會觸發套票的 post_save；呼叫端需自行更新卡片等衍生資料。
+    """
+    from .models import Package
+
+    package_ids = [pk for pk in set(package_ids) if pk is not None]
+    if not package_ids:
+        return []
+
+    minimums = room_price_minimums(package_ids)
+    changed = []
+    current = Package.objects.filter(pk__in=package_ids).values_list('pk', 'min_room_price')
+    for pk, min_room_price in current:
+        new_value = minimums.get(pk)
+        if new_value != min_room_price:
+            Package.objects.filter(pk=pk).update(min_room_price=new_value)
+            changed.append(pk)
+    return changed
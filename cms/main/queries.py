@@ -0,0 +1,226 @@
+"""
+套票列表共用的查詢層
+
+列表頁（所有套票 / 大陸 / 國家 / 城市）與首頁卡片只需要少數欄位，
+這裡集中定義卡片查詢與分頁邏輯，避免各 view 各自複製 prefetch 鏈。
+卡片資料來自反正規化的 PackageCard 表（見 read_models.py）。
+套票詳情頁的 prefetch 鏈也定義在這裡，query_plans.py 以相同的 queryset 檢查執行計畫。
+"""
+import base64
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import List, Optional
+
+from django.db.models import F, Func, IntegerField, Prefetch, Q, Subquery
+from django.http import Http404
+
+from .models import (
+    DailyItinerary,
+    Hotel,
+    ItineraryImage,
+    Package,
+    PackageCard,
+    Period,
+    RoomImage,
+    RoomPrice,
+    RoomType,
+)
+
+# 每頁顯示的套票數量
+PACKAGE_LIST_PAGE_SIZE = 24
+
+# 列表排序方式；只有預設的「最新」排序支援 keyset 游標分頁
+PACKAGE_SORTS = {
+    'newest': (F('created_at').desc(), F('pk').desc()),
+    # 沒有起價的套票排在最後；以 has_price 代替 NULLS LAST，排序可直接由索引提供
+    'price': (F('has_price').desc(), F('from_price').asc(), F('pk').asc()),
+    '-price': (F('has_price').desc(), F('from_price').desc(), F('pk').desc()),
+    # 全文檢索相關度（需先以 fulltext.rank_by_search 標註 search_rank）
+    'relevance': (F('search_rank').asc(), F('pk').desc()),
+}
+DEFAULT_PACKAGE_SORT = 'newest'
+
+
+def package_card_queryset():
+    """回傳啟用中的套票卡片（PackageCard 單表查詢，不需 join）"""
+    return PackageCard.objects.filter(is_active=True)
+
+
+def package_detail_prefetches():
+    """
+    詳情頁各層 prefetch：[(lookup, 上層外鍵欄位, queryset), ...]
+
+    只載入啟用中的資料列，排序與各表的部分索引（condition=is_active）一致，
+    prefetch 的 <外鍵> IN (...) 查詢可直接由索引取得已排序的資料。
+    """
+    return [
+        ('periods', 'package', Period.objects.filter(is_active=True).order_by('period_text')),
+        ('periods__hotels', 'period', Hotel.objects.filter(is_active=True).order_by('hotel_name')),
+        ('periods__hotels__room_types', 'hotel', RoomType.objects.filter(is_active=True).order_by('room_type_name')),
+        ('periods__hotels__room_types__prices', 'room_type', RoomPrice.objects.filter(is_active=True).order_by('price')),
+        ('periods__hotels__room_types__images', 'room_type', RoomImage.objects.filter(is_active=True).order_by('created_at')),
+        ('daily_itineraries', 'package', DailyItinerary.objects.filter(is_active=True).order_by('day_number', 'display_order')),
+        ('daily_itineraries__images', 'itinerary', ItineraryImage.objects.filter(is_active=True)
+         .select_related('image').order_by('display_order', 'created_at')),
+    ]
+
+
+def package_detail_queryset():
+    """套票詳情頁的查詢：套票種類、標籤與整棵行程 / 房價樹一次載入"""
+    return Package.objects.select_related('package_type').prefetch_related(
+        'tags',
+        *(Prefetch(lookup, queryset=queryset) for lookup, _, queryset in package_detail_prefetches()),
+    )
+
+
+def _parse_decimal(value):
+    try:
+        return Decimal(value) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+def apply_listing_options(queryset, params, default_sort=DEFAULT_PACKAGE_SORT):
+    """
+    依 GET 參數套用價格區間篩選（min_price / max_price），並回傳 (queryset, sort)。
+
+    價格篩選與排序都使用 PackageCard.from_price，由啟用卡片的部分索引支援（見 PackageCard.Meta.indexes）。
+    """
+    min_price = _parse_decimal(params.get('min_price'))
+    max_price = _parse_decimal(params.get('max_price'))
+    if min_price is not None:
+        queryset = queryset.filter(from_price__gte=min_price)
+    if max_price is not None:
+        queryset = queryset.filter(from_price__lte=max_price)
+
+    sort = params.get('sort')
+    if sort not in PACKAGE_SORTS or (sort == 'relevance' and 'search_rank' not in queryset.query.annotations):
+        sort = default_sort
+    return queryset, sort
+
+
+@dataclass
+class PackagePage:
+    """一頁套票結果，總數與資料來自同一個查詢"""
+    object_list: List[PackageCard]
+    total_count: int
+    number: int
+    per_page: int
+    next_cursor: Optional[str] = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def num_pages(self):
+        if not self.total_count:
+            return 1
+        return (self.total_count + self.per_page - 1) // self.per_page
+
+    @property
+    def has_next(self):
+        return self.number * self.per_page < self.total_count
+
+    @property
+    def next_page_number(self):
+        return self.number + 1
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+    @property
+    def previous_page_number(self):
+        return self.number - 1
+
+
+def encode_cursor(card, offset):
+    """將最後一筆的排序鍵與目前位移編碼成 URL 安全的游標"""
+    raw = f"{card.created_at.isoformat()}|{card.pk}|{offset}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+# 主鍵為 BigAutoField，超出範圍的值在查詢時會讓資料庫驅動拋出例外
+MAX_PK = 2 ** 63 - 1
+
+
+def decode_cursor(cursor):
+    """解析游標，格式錯誤或被竄改（無時區、主鍵或位移超出範圍）時回傳 None"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, pk, offset = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        created_at, pk, offset = datetime.fromisoformat(created_at), int(pk), int(offset)
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+    if created_at.tzinfo is None or not 0 < pk <= MAX_PK or not 0 <= offset <= MAX_PK:
+        return None
+    return created_at, pk, offset
+
+
+def counted_page(queryset, start=0, per_page=PACKAGE_LIST_PAGE_SIZE):
+    """
+    取出一頁資料，並以不相關子查詢 (SELECT COUNT(*) ...) 附上符合條件的總數（matched_count）。
+
+    子查詢只執行一次，可以只讀索引計數；外層查詢則依排序索引讀取一頁後即停止。
+    改用 COUNT(*) OVER () 的話，資料庫必須先讀出所有符合條件的資料列，列表頁會退化成全表掃描。
+    """
+    count = queryset.order_by().annotate(
+        matched=Func(template='COUNT(*)', output_field=IntegerField()),
+    ).values('matched')
+    return queryset.annotate(matched_count=Subquery(count, output_field=IntegerField()))[start:start + per_page]
+
+
+def paginate_packages(queryset, page=None, cursor=None, per_page=PACKAGE_LIST_PAGE_SIZE, sort=DEFAULT_PACKAGE_SORT):
+    """
+    分頁取得套票。
+
+    - 一般情況使用 ``page`` 做位移分頁。
+    - 預設排序下提供 ``cursor`` 時改用 keyset 分頁（created_at, pk），深頁不需掃過前面的資料；
+      無法解析的游標視為沒有提供，改用 ``page``。
+
+    總數以計數子查詢附在同一個查詢上，不另外執行 count()。
+    """
+    queryset = queryset.order_by(*PACKAGE_SORTS[sort])
+    keyset = sort == DEFAULT_PACKAGE_SORT
+    decoded = decode_cursor(cursor) if cursor and keyset else None
+
+    if decoded is not None:
+        created_at, pk, offset = decoded
+        # created_at__lte 讓資料庫能以索引做範圍搜尋（只有 OR 條件時無法使用索引）
+        queryset = queryset.filter(created_at__lte=created_at).filter(
+            Q(created_at__lt=created_at) | Q(pk__lt=pk)
+        )
+        start = 0
+    else:
+        cursor = None
+        try:
+            number = int(page or 1)
+        except (TypeError, ValueError):
+            raise Http404('無效的頁碼')
+        if number < 1:
+            raise Http404('無效的頁碼')
+        offset = start = (number - 1) * per_page
+
+    rows = list(counted_page(queryset, start, per_page))
+
+    if not rows:
+        if offset:
+            raise Http404('頁碼超出範圍')
+        return PackagePage(object_list=[], total_count=0, number=1, per_page=per_page)
+
+    # keyset 模式下計數只涵蓋游標之後的資料，需加回已略過的筆數
+    total_count = rows[0].matched_count + (offset if cursor else 0)
+    end = offset + len(rows)
+    next_cursor = encode_cursor(rows[-1], end) if keyset and end < total_count else None
+
+    return PackagePage(
+        object_list=rows,
+        total_count=total_count,
+        number=offset // per_page + 1,
+        per_page=per_page,
+        next_cursor=next_cursor,
+    )
@@ -0,0 +1,118 @@
+"""
+公開頁面查詢的執行計畫檢查
+
+public_queries() 列出首頁、列表頁、搜尋頁、套票詳情與 PDF 實際執行的查詢（以 view 使用的同一組查詢建構函式產生），
+full_table_scans() 以 EXPLAIN（SQLite 為 EXPLAIN QUERY PLAN）找出對大型資料表的全表掃描。
+main/tests.py 在 5 萬個套票的目錄上對每個查詢執行檢查，避免日後修改查詢或索引時退化成全表掃描。
+"""
+import re
+
+from django.db import connection
+from django.db.models import Count, Q
+
+from .facets import FACET_DIMENSIONS, filter_by_facets
+from .models import (
+    City,
+    Continent,
+    Country,
+    DailyItinerary,
+    Hotel,
+    ItineraryImage,
+    Package,
+    PackageFacet,
+    Period,
+    RoomImage,
+    RoomPrice,
+    RoomType,
+)
+from .pdf import pdf_package_queryset
+from .queries import PACKAGE_SORTS, counted_page, package_card_queryset, package_detail_prefetches, package_detail_queryset
+
+# 資料量會隨套票數成長的資料表；地區、種類、標籤等小表全表掃描是合理的
+LARGE_TABLES = {
+    model._meta.db_table
+    for model in (
+        Package, Period, Hotel, RoomType, RoomPrice, RoomImage, DailyItinerary, ItineraryImage, PackageFacet,
+    )
+} | {'main_packagecard', 'main_searchdocument', Package.tags.through._meta.db_table}
+
+# SQLite：「SCAN 表格或別名」且未使用索引；PostgreSQL：「Seq Scan on 表格 [別名]」
+SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(\w+)(?: AS \w+)?(?!.*\bUSING (?:COVERING )?INDEX)')
+POSTGRES_SCAN = re.compile(r'\bSeq Scan on (\w+)')
+# 子查詢與 join 的表格別名（FROM "main_packagecard" U0），SQLite 的查詢計畫只顯示別名
+TABLE_ALIAS = re.compile(r'"(\w+)" (?:AS )?([A-Z]\d+)\b')
+
+
+def explain(queryset):
+    return queryset.explain()
+
+
+def full_table_scans(queryset):
+    """回傳查詢計畫中被全表掃描的大型資料表名稱"""
+    pattern = SQLITE_SCAN if connection.vendor == 'sqlite' else POSTGRES_SCAN
+    sql, _ = queryset.query.sql_with_params()
+    aliases = dict((alias, table) for table, alias in TABLE_ALIAS.findall(sql))
+    tables = []
+    for line in explain(queryset).splitlines():
+        match = pattern.search(line)
+        if not match:
+            continue
+        table = aliases.get(match.group(1), match.group(1))
+        if table in LARGE_TABLES:
+            tables.append(table)
+    return tables
+
+
+def public_queries(package):
+    """
+    以指定的套票（需有城市、國家、大陸）組出公開頁面的查詢，回傳 [(名稱, queryset), ...]。
+    """
+    city = package.city
+    country = city.country
+    continent = country.continent
+    cards = package_card_queryset()
+    newest = PACKAGE_SORTS['newest']
+
+    queries = [
+        # 首頁
+        ('home.featured', cards.filter(is_featured=True)[:6]),
+        ('home.secondary', cards.filter(is_secondary_featured=True).order_by('-package_updated_at', '-created_at')[:4]),
+        # 列表頁
+        ('list.all', counted_page(cards.order_by(*newest))),
+        ('list.all.deep', counted_page(cards.order_by(*newest), start=24 * 100)),
+        ('list.cursor', counted_page(cards.filter(created_at__lte=package.created_at).filter(
+            Q(created_at__lt=package.created_at) | Q(pk__lt=package.pk)
+        ).order_by(*newest))),
+        ('list.continent', counted_page(cards.filter(continent=continent).order_by(*newest))),
+        ('list.country', counted_page(cards.filter(country=country).order_by(*newest))),
+        ('list.city', counted_page(cards.filter(city=city).order_by(*newest))),
+        ('list.price', counted_page(cards.order_by(*PACKAGE_SORTS['price']))),
+        ('list.price_range', counted_page(cards.filter(from_price__gte=10000, from_price__lte=30000).order_by(*PACKAGE_SORTS['price']))),
+        # 分面搜尋
+        ('search.city', counted_page(filter_by_facets(cards, {'city': [str(city.pk)]}).order_by(*newest))),
+        ('search.city_price', counted_page(
+            filter_by_facets(cards, {'city': [str(city.pk)], 'price': ['10000-20000']}).order_by(*newest)
+        )),
+        # slug 解析
+        ('slug.continent', Continent.objects.filter(slug=continent.slug, is_active=True)),
+        ('slug.country', Country.objects.filter(slug=country.slug, continent=continent, is_active=True)),
+        ('slug.city', City.objects.filter(slug=city.slug, country=country, is_active=True)),
+        # 每天行程 PDF
+        ('pdf.package', pdf_package_queryset().filter(slug=package.slug, city=city)),
+    ]
+    # 套票詳情：與 view 相同的查詢與 prefetch queryset，以上一層取得的 id 組出 prefetch 的 IN 查詢
+    queries.append(('detail.package', package_detail_queryset().filter(slug=package.slug, city=city, is_active=True)))
+    queries.append(('detail.tags', package.tags.all()))
+    parent_ids = {'': [package.pk]}
+    for lookup, parent_field, queryset in package_detail_prefetches():
+        prefetch = queryset.filter(**{f'{parent_field}__in': parent_ids[lookup.rpartition('__')[0]]})
+        parent_ids[lookup] = list(prefetch.values_list('pk', flat=True))
+        queries.append((f'detail.{lookup}', prefetch))
+    for dimension in FACET_DIMENSIONS:
+        queries.append((
+            f'search.facets.{dimension}',
+            PackageFacet.objects.filter(dimension=dimension, package_id__in=PackageFacet.objects.filter(
+                dimension='city', value=str(city.pk),
+            ).values('package_id')).values('value', 'label', 'sort_key').annotate(count=Count('package_id')),
+        ))
+    return queries
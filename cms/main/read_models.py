@@ -0,0 +1,137 @@
+"""
+套票讀取模型（PackageCard 卡片與 PackageFacet 分面索引）的建置與增量維護
+"""
+from django.db import transaction
+from django.db.models import Count, Q
+from django.urls import reverse
+
+from .db import chunked
+from .facets import build_facets
+from .images import load_pictures
+from .models import Package, PackageCard, PackageFacet
+
+# 一次處理的套票數量（重建大量卡片時分批寫入）
+REBUILD_BATCH_SIZE = 500
+
+CARD_FIELDS = [
+    field.name for field in PackageCard._meta.concrete_fields
+    if field.name not in ('package', 'updated_at')
+]
+
+
+def card_source_queryset():
+    """建置卡片需要的套票查詢（單一 join + 標籤 prefetch + 行程天數）"""
+    return (
+        Package.objects.select_related('package_type', 'city', 'city__country', 'city__country__continent')
+        .prefetch_related('tags')
+        .annotate(trip_days=Count(
+            'daily_itineraries__day_number',
+            filter=Q(daily_itineraries__is_active=True),
+            distinct=True,
+        ))
+        .defer(
+            'description', 'ai_prompt_description', 'price_include_item', 'price_exclude_item',
+            'flight_info', 'tips', 'rich_text_table_one', 'rich_text_table', 'rich_text_table_three',
+        )
+    )
+
+
+def build_card(package, picture=None):
+    """由套票建立（尚未儲存的）卡片實例；picture 為主要圖片的 card 衍生檔資料"""
+    city = package.city
+    country = city.country if city else None
+    continent = country.continent if country else None
+
+    detail_url = ''
+    if continent and continent.slug and country.slug and city.slug and package.slug:
+        detail_url = reverse('main:package_detail', kwargs={
+            'continent_slug': continent.slug,
+            'country_slug': country.slug,
+            'city_slug': city.slug,
+            'package_slug': package.slug,
+        })
+
+    return PackageCard(
+        package_id=package.pk,
+        name=package.name,
+        slug=package.slug,
+        subtitle=package.subtitle,
+        price=package.price,
+        price_amount=package.price_amount,
+        price_currency=package.price_currency,
+        from_price=package.from_price,
+        has_price=package.from_price is not None,
+        image_url=package.main_image.url if package.main_image else '',
+        image_picture=picture or {},
+        detail_url=detail_url,
+        package_type_name=package.package_type.name if package.package_type_id else '',
+        continent=continent,
+        country=country,
+        city=city,
+        continent_name=continent.name if continent else '',
+        country_name=country.name if country else '',
+        city_name=city.name if city else '',
+        tags=[
+            {'name': tag.name, 'color': tag.color}
+            for tag in package.tags.all() if tag.is_active
+        ],
+        is_active=package.is_active,
+        is_featured=package.is_featured,
+        is_secondary_featured=package.is_secondary_featured,
+        created_at=package.created_at,
+        package_updated_at=package.updated_at,
+    )
+
+
+def refresh_package_cards(packages):
+    """
+    重建指定套票的卡片與分面索引。
+
+    packages 可以是套票查詢或 pk 列表；依批次載入套票，
+    卡片以 bulk_create(update_conflicts=True) 一次寫入（upsert），分面則整批替換。
+    """
+    if isinstance(packages, (list, tuple, set)):
+        pks = list(packages)
+        if not pks:
+            return 0
+        queryset = card_source_queryset().filter(pk__in=pks)
+    else:
+        queryset = card_source_queryset().filter(pk__in=packages.values('pk'))
+
+    total = 0
+    batch = []
+    for package in chunked(queryset.order_by('pk'), REBUILD_BATCH_SIZE):
+        batch.append(package)
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            total += _write_batch(batch)
+            batch = []
+    if batch:
+        total += _write_batch(batch)
+    return total
+
+
+def _write_batch(packages):
+    # 主要圖片的衍生檔整批一次查詢
+    pictures = load_pictures([(package.main_image, 'card') for package in packages])
+    cards = []
+    facets = []
+    for package in packages:
+        card = build_card(package, pictures.get((package.main_image.name, 'card')))
+        cards.append(card)
+        facets.extend(build_facets(package, card, package.trip_days))
+
+    with transaction.atomic():
+        PackageCard.objects.bulk_create(
+            cards,
+            update_conflicts=True,
+            unique_fields=['package'],
+            update_fields=CARD_FIELDS + ['updated_at'],
+        )
+        PackageFacet.objects.filter(package_id__in=[card.package_id for card in cards]).delete()
+        PackageFacet.objects.bulk_create(facets)
+    return len(cards)
+
+
+def rebuild_all_package_cards():
+    """全量重建所有套票的卡片與分面索引"""
+    return refresh_package_cards(Package.objects.all())
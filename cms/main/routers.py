@@ -0,0 +1,106 @@
+"""
+讀取複本（read replica）的資料庫路由
+
+前台的公開頁面只讀取資料，卻和後台的大量巢狀寫入共用同一個資料庫。設定 DATABASE_REPLICA_URL 後：
+
+- ReplicaRoutingMiddleware 讓 REPLICA_VIEW_MODULES（main.views、homepage.views）的 GET / HEAD 請求讀取複本
+- 後台、管理指令、背景工作與所有寫入都使用主資料庫（default）
+- 登入狀態（sessions、auth）一律讀取主資料庫：剛登入的 session 尚未同步到複本時不會被當成匿名訪客
+- 工作人員送出 POST 等寫入請求後，DATABASE_REPLICA_STICKY_SECONDS 秒內的請求都讀取主資料庫
+  （簽章 cookie），剛儲存的內容不會因為複本延遲而看不到
+
+路由以 ContextVar 記錄目前請求的讀取來源，請求以外（指令、背景執行緒）一律為主資料庫。
+未設定複本時 DATABASE_READ_REPLICA 為 None，所有查詢照舊使用 default。
+"""
+from contextvars import ContextVar
+from importlib import import_module
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# 目前請求的讀取來源（None 為主資料庫）
+_read_alias = ContextVar('database_read_alias', default=None)
+
+STICKY_COOKIE_NAME = 'db_primary'
+STICKY_COOKIE_SALT = 'main.routers.sticky'
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# 一律讀取主資料庫的 app
+PRIMARY_APP_LABELS = {'auth', 'sessions'}
+
+
+def reading_from_replica():
+    """目前的查詢是否讀取複本"""
+    return _read_alias.get() is not None
+
+
+class PrimaryReplicaRouter:
+    """讀取依目前請求決定（複本或主資料庫），寫入一律使用主資料庫"""
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APP_LABELS:
+            return DEFAULT_DB_ALIAS
+        return _read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 複本與主資料庫是同一份資料
+        return True
+
+
+def _replica_modules():
+    return tuple(getattr(settings, 'REPLICA_VIEW_MODULES', ()))
+
+
+def _is_sticky(request):
+    return request.get_signed_cookie(
+        STICKY_COOKIE_NAME, default=None, salt=STICKY_COOKIE_SALT,
+        max_age=settings.DATABASE_REPLICA_STICKY_SECONDS,
+    ) is not None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    決定每個請求的讀取來源，並在工作人員寫入後設定讀取主資料庫的 cookie。
+
+    需放在 AuthenticationMiddleware 之後。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # 確認設定的 view 模組存在（拼錯時啟動即失敗，而不是默默不分流）
+        for module in _replica_modules():
+            import_module(module)
+
+    def __call__(self, request):
+        token = _read_alias.set(None)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_alias.reset(token)
+
+        if (
+            settings.DATABASE_READ_REPLICA
+            and request.method not in SAFE_METHODS
+            and getattr(request, 'user', None) is not None
+            and request.user.is_staff
+        ):
+            response.set_signed_cookie(
+                STICKY_COOKIE_NAME, '1', salt=STICKY_COOKIE_SALT,
+                max_age=settings.DATABASE_REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        replica = settings.DATABASE_READ_REPLICA
+        if (
+            replica
+            and request.method in SAFE_METHODS
+            and view_func.__module__ in _replica_modules()
+            and not _is_sticky(request)
+        ):
+            _read_alias.set(replica)
+        return None
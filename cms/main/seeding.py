@@ -0,0 +1,291 @@
+"""
+產生測試 / 壓力測試用的套票目錄
+
+以 bulk_create 分批寫入大量資料（預設 5 萬個套票，每個套票含期間、酒店、房型、價格、房間圖片、
+每天行程與行程相片，描述與表格欄位為接近 CKEditor 實際輸出大小的 HTML），
+用於查詢計畫測試（main/tests.py）、`manage.py seed_catalog` 與效能量測（`manage.py benchmark_pages`）。
+資料內容由亂數種子決定，相同參數會產生相同的目錄。
+bulk_create 不會觸發信號，讀取模型（卡片、分面）在最後統一重建。
+
+圖片只建立資料列（指向 seed/ 下的檔名），不會上傳實體檔案；
+行程相片共用一小組 Django-Filer 圖片。
+"""
+import random
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.utils import timezone
+from filer.models import Image as FilerImage
+
+from .geography import bump_geography_version
+from .models import (
+    City,
+    Continent,
+    Country,
+    DailyItinerary,
+    Hotel,
+    ItineraryImage,
+    Package,
+    PackageTag,
+    PackageType,
+    Period,
+    RoomImage,
+    RoomPrice,
+    RoomType,
+)
+from .pricing import parse_price
+from .read_models import refresh_package_cards
+
+SEED_SLUG_PREFIX = 'seed'
+
+CONTINENTS = [('亞洲', 'asia'), ('歐洲', 'europe'), ('大洋洲', 'oceania'), ('美洲', 'america'), ('非洲', 'africa')]
+# 各大陸的國家與城市名稱；數量不足時以編號補齊
+GEOGRAPHY = {
+    'asia': [
+        ('日本', 'japan', [('沖繩', 'okinawa'), ('石垣島', 'ishigaki'), ('宮古島', 'miyakojima'), ('奄美大島', 'amami')]),
+        ('菲律賓', 'philippines', [('宿霧', 'cebu'), ('薄荷島', 'bohol'), ('杜馬蓋地', 'dumaguete'), ('科隆', 'coron')]),
+        ('印尼', 'indonesia', [('峇里島', 'bali'), ('四王島', 'raja-ampat'), ('科莫多', 'komodo'), ('蘭貝', 'lembeh')]),
+        ('馬來西亞', 'malaysia', [('仙本那', 'semporna'), ('詩巴丹', 'sipadan'), ('停泊島', 'perhentian')]),
+        ('泰國', 'thailand', [('濤島', 'koh-tao'), ('普吉島', 'phuket'), ('攀牙', 'phang-nga')]),
+        ('馬爾地夫', 'maldives', [('馬列', 'male'), ('芭環礁', 'baa-atoll'), ('阿里環礁', 'ari-atoll')]),
+    ],
+    'europe': [
+        ('埃及', 'egypt', [('赫爾格達', 'hurghada'), ('沙姆沙伊赫', 'sharm-el-sheikh')]),
+        ('西班牙', 'spain', [('特內里費', 'tenerife'), ('馬約卡', 'mallorca')]),
+        ('馬爾他', 'malta', [('戈佐', 'gozo'), ('瓦萊塔', 'valletta')]),
+    ],
+    'oceania': [
+        ('澳洲', 'australia', [('凱恩斯', 'cairns'), ('道格拉斯港', 'port-douglas')]),
+        ('帛琉', 'palau', [('科羅', 'koror')]),
+        ('斐濟', 'fiji', [('南迪', 'nadi'), ('塔韋烏尼', 'taveuni')]),
+    ],
+    'america': [
+        ('墨西哥', 'mexico', [('坎昆', 'cancun'), ('科蘇梅爾', 'cozumel')]),
+        ('厄瓜多', 'ecuador', [('加拉巴哥', 'galapagos')]),
+    ],
+    'africa': [
+        ('南非', 'south-africa', [('德班', 'durban')]),
+        ('莫三比克', 'mozambique', [('托佛', 'tofo')]),
+    ],
+}
+PACKAGE_TYPES = ['船潛', '岸潛', '船宿', '潛水課程', '自由潛水']
+TAGS = ['熱門', '新手友善', '大物', '微距', '沉船', '夜潛', '早鳥優惠', '含機票']
+HOTEL_NAMES = ['海景度假村', '潛水旅館', '港灣飯店', '珊瑚礁酒店', '椰林別墅']
+ITINERARY_TITLES = ['抵達', '船潛三支', '岸潛兩支', '自由活動', '賦歸']
+SENTENCES = [
+    '早餐後前往碼頭，搭乘潛水船出海。', '潛點以珊瑚礁與大型魚群聞名，能見度可達二十米以上。',
+    '午餐於船上享用，水面休息時間可浮潛觀賞海龜。', '返回飯店後自由活動，晚餐推薦當地海鮮餐廳。',
+    '教練會依學員程度安排潛點，並於下水前進行詳細簡報。', '本行程含高氧空氣（Nitrox），需持有相關證照。',
+]
+
+
+def html_blob(rng, size):
+    """產生約 size 個字元、結構類似 CKEditor 輸出的 HTML（段落、清單與表格）"""
+    parts = []
+    length = 0
+    while length < size:
+        kind = rng.random()
+        if kind < 0.6:
+            part = '<p>' + ''.join(rng.choice(SENTENCES) for _ in range(rng.randint(2, 5))) + '</p>'
+        elif kind < 0.8:
+            items = ''.join(f'<li>{rng.choice(SENTENCES)}</li>' for _ in range(rng.randint(3, 6)))
+            part = f'<ul>{items}</ul>'
+        else:
+            rows = ''.join(
+                f'<tr><td>{rng.choice(HOTEL_NAMES)}</td><td>{rng.randrange(8, 150) * 1000:,}</td></tr>'
+                for _ in range(rng.randint(3, 8))
+            )
+            part = f'<table border="1" cellpadding="1" cellspacing="1" style="width:100%"><tbody>{rows}</tbody></table>'
+        parts.append(part)
+        length += len(part)
+    return ''.join(parts)
+
+
+def _country_names(continent_slug, index):
+    """取得大陸第 index 個國家的 (名稱, slug, 城市列表)，沒有預設名稱時以編號產生"""
+    names = GEOGRAPHY.get(continent_slug, [])
+    if index < len(names):
+        return names[index]
+    return (f'國家{index}', f'country-{index}', [])
+
+
+def _seed_filer_images(seed, count):
+    """建立行程相片共用的 Django-Filer 圖片（只有資料列，不上傳檔案）"""
+    images = []
+    for number in range(count):
+        image = FilerImage(
+            original_filename=f'seed-{seed}-{number}.jpg', name=f'seed-{seed}-{number}',
+            _width=1200, _height=800, mime_type='image/jpeg',
+        )
+        image.file.name = f'seed/itinerary-{number}.jpg'
+        image.save()
+        images.append(image)
+    return images
+
+
+def seed_catalog(
+    packages=50000,
+    countries_per_continent=4,
+    cities_per_country=5,
+    days_per_package=3,
+    periods_per_package=1,
+    hotels_per_period=1,
+    room_types_per_hotel=1,
+    prices_per_room_type=1,
+    images_per_room_type=1,
+    images_per_day=1,
+    description_size=2000,
+    filer_images=20,
+    batch_size=2000,
+    rebuild_read_models=True,
+    seed=0,
+):
+    """建立套票目錄，回傳各資料表新增的筆數"""
+    rng = random.Random(seed)
+    counts = {}
+
+    with transaction.atomic():
+        continents = Continent.objects.bulk_create([
+            Continent(name=f'{name}{seed}', name_en=slug, slug=f'{SEED_SLUG_PREFIX}-{seed}-{slug}')
+            for name, slug in CONTINENTS
+        ])
+        countries = []
+        city_names = {}
+        for continent, (_, continent_slug) in zip(continents, CONTINENTS):
+            for i in range(countries_per_continent):
+                name, slug, cities_of_country = _country_names(continent_slug, i)
+                country = Country(continent=continent, name=name, name_en=slug, slug=slug)
+                countries.append(country)
+                city_names[id(country)] = cities_of_country
+        Country.objects.bulk_create(countries)
+        cities = []
+        for country in countries:
+            names = city_names[id(country)]
+            for i in range(cities_per_country):
+                name, slug = names[i] if i < len(names) else (f'城市{i}', f'city-{i}')
+                cities.append(City(country=country, name=name, name_en=slug, slug=slug))
+        City.objects.bulk_create(cities)
+        package_types = PackageType.objects.bulk_create([PackageType(name=f'{name}{seed}') for name in PACKAGE_TYPES])
+        tags = PackageTag.objects.bulk_create([PackageTag(name=f'{name}{seed}') for name in TAGS])
+        itinerary_images = _seed_filer_images(seed, filer_images) if images_per_day else []
+
+    # bulk_create 不會送出信號，另外讓各行程的地區登錄表重新載入
+    bump_geography_version()
+    counts.update(continents=len(continents), countries=len(countries), cities=len(cities))
+
+    now = timezone.now()
+    package_ids = []
+    totals = dict.fromkeys([
+        'packages', 'periods', 'hotels', 'room_types', 'room_prices', 'room_images',
+        'daily_itineraries', 'itinerary_images',
+    ], 0)
+
+    for start in range(0, packages, batch_size):
+        with transaction.atomic():
+            batch = []
+            for number in range(start, min(start + batch_size, packages)):
+                price = f'{rng.randrange(8, 150) * 1000:,}'
+                package = Package(
+                    package_type=rng.choice(package_types),
+                    city=rng.choice(cities),
+                    name=f'潛水套票 {number}',
+                    slug=f'{SEED_SLUG_PREFIX}-{seed}-{number}',
+                    subtitle=f'{rng.choice(ITINERARY_TITLES)}・{rng.choice(HOTEL_NAMES)}',
+                    description=f'<p>第 {number} 號測試套票。</p>' + html_blob(rng, description_size),
+                    rich_text_table=html_blob(rng, description_size // 2),
+                    price_include_item=html_blob(rng, description_size // 4),
+                    price_exclude_item=html_blob(rng, description_size // 4),
+                    price=price,
+                    main_image=f'packages/seed-{number % 50}.jpg',
+                    is_active=rng.random() < 0.9,
+                    is_featured=rng.random() < 0.01,
+                    is_secondary_featured=rng.random() < 0.01,
+                )
+                package.price_amount, package.price_currency = parse_price(price)
+                batch.append(package)
+            Package.objects.bulk_create(batch)
+
+            Through = Package.tags.through
+            Through.objects.bulk_create([
+                Through(package_id=package.pk, packagetag_id=tag.pk)
+                for package in batch for tag in rng.sample(tags, 2)
+            ])
+
+            itineraries = DailyItinerary.objects.bulk_create([
+                DailyItinerary(
+                    package=package,
+                    day_number=day,
+                    title=ITINERARY_TITLES[(day - 1) % len(ITINERARY_TITLES)],
+                    description=html_blob(rng, description_size // 4),
+                    display_order=day,
+                )
+                for package in batch for day in range(1, days_per_package + 1)
+            ])
+            day_images = ItineraryImage.objects.bulk_create([
+                ItineraryImage(
+                    itinerary=itinerary,
+                    image=rng.choice(itinerary_images),
+                    caption=rng.choice(ITINERARY_TITLES),
+                    display_order=i,
+                    is_featured=i == 0,
+                )
+                for itinerary in itineraries for i in range(images_per_day)
+            ])
+            periods = Period.objects.bulk_create([
+                Period(package=package, period_text=f'2026 第 {i + 1} 期')
+                for package in batch for i in range(periods_per_package)
+            ])
+            hotels = Hotel.objects.bulk_create([
+                Hotel(period=period, hotel_name=rng.choice(HOTEL_NAMES))
+                for period in periods for _ in range(hotels_per_period)
+            ])
+            room_types = RoomType.objects.bulk_create([
+                RoomType(hotel=hotel, room_type_name=f'房型 {i + 1}')
+                for hotel in hotels for i in range(room_types_per_hotel)
+            ])
+            room_prices = []
+            for room_type in room_types:
+                for _ in range(prices_per_room_type):
+                    room_price = RoomPrice(room_type=room_type, price=f'{rng.randrange(8, 150) * 1000:,}')
+                    room_price.price_amount, room_price.price_currency = parse_price(room_price.price)
+                    room_prices.append(room_price)
+            RoomPrice.objects.bulk_create(room_prices)
+            room_images = RoomImage.objects.bulk_create([
+                RoomImage(room_type=room_type, image=f'seed/room-{rng.randrange(50)}.jpg', image_description=room_type.room_type_name)
+                for room_type in room_types for _ in range(images_per_room_type)
+            ])
+
+            # 最低房價直接由記憶體中的資料計算；建立時間分散，排序與游標分頁才有意義
+            min_prices = {}
+            for room_price in room_prices:
+                package = room_price.room_type.hotel.period.package
+                if package.pk not in min_prices or room_price.price_amount < min_prices[package.pk]:
+                    min_prices[package.pk] = room_price.price_amount
+            for offset, package in enumerate(batch):
+                package.created_at = now - timedelta(minutes=start + offset)
+                package.min_room_price = min_prices.get(package.pk)
+            Package.objects.bulk_update(batch, ['created_at', 'min_room_price'])
+
+        package_ids.extend(package.pk for package in batch)
+        totals['packages'] += len(batch)
+        totals['periods'] += len(periods)
+        totals['hotels'] += len(hotels)
+        totals['room_types'] += len(room_types)
+        totals['room_prices'] += len(room_prices)
+        totals['room_images'] += len(room_images)
+        totals['daily_itineraries'] += len(itineraries)
+        totals['itinerary_images'] += len(day_images)
+
+    counts.update(totals)
+
+    if rebuild_read_models:
+        counts['cards'] = refresh_package_cards(package_ids)
+
+    analyze_database()
+    return counts
+
+
+def analyze_database():
+    """更新資料庫統計資訊，讓查詢規劃器依實際資料量選擇索引"""
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
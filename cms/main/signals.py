@@ -0,0 +1,332 @@
+"""
+main 應用的模型信號：維護套票卡片快取、整頁快取的相依版本、讀取模型與全文索引
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from .cache import bump_card_generation
+from .fulltext import refresh_search_documents
+from .geography import bump_geography_version
+from .images import IMAGE_SOURCES, missing_derivatives
+from .jobs import enqueue
+from .models import (
+    City,
+    Continent,
+    Country,
+    DailyItinerary,
+    Hotel,
+    ItineraryImage,
+    Package,
+    PackageTag,
+    PackageType,
+    Period,
+    RoomImage,
+    RoomPrice,
+    RoomType,
+)
+from .page_cache import bump_dependencies, dependency_key
+from .pricing import update_min_room_prices
+from .read_models import refresh_package_cards
+
+# 套票底下的子資料：(查詢用模型, 外鍵欄位, 從查詢模型到套票 id 的路徑)
+PACKAGE_CHILD_PATHS = {
+    Period: (None, 'package_id', None),
+    DailyItinerary: (None, 'package_id', None),
+    Hotel: (Period, 'period_id', 'package_id'),
+    RoomType: (Hotel, 'hotel_id', 'period__package_id'),
+    RoomPrice: (RoomType, 'room_type_id', 'hotel__period__package_id'),
+    RoomImage: (RoomType, 'room_type_id', 'hotel__period__package_id'),
+    ItineraryImage: (DailyItinerary, 'itinerary_id', 'package_id'),
+}
+
+
+def _owning_package_id(instance):
+    """找出子資料所屬的套票 id（父層已被刪除時回傳 None）"""
+    lookup_model, fk_field, path = PACKAGE_CHILD_PATHS[type(instance)]
+    fk_value = getattr(instance, fk_field)
+    if lookup_model is None:
+        return fk_value
+    return lookup_model.objects.filter(pk=fk_value).values_list(path, flat=True).first()
+
+
+def _deleted_with_parent(instance, kwargs):
+    """
+    是否為上層資料串聯刪除的子資料列（post_delete 的 origin 是套票樹中另一個模型的實例或查詢）。
+
+    刪除套票或期間時 Django 會對底下每一列送出 post_delete；這些列由發起刪除的資料列一次處理
+    （刪除期間時重新計算一次最低房價），不逐列查詢所屬套票。
+    """
+    origin = kwargs.get('origin')
+    if origin is None:
+        return False
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model is not type(instance) and (origin_model is Package or origin_model in PACKAGE_CHILD_PATHS)
+
+
+# 批次寫入套票子資料期間（tree_saving）由呼叫端一次更新衍生資料，子資料的信號不逐列處理
+_children_batched = ContextVar('package_children_batched', default=False)
+
+
+@contextmanager
+def batched_package_children():
+    """區塊內儲存 / 刪除套票子資料不逐列更新最低房價、卡片、全文索引與頁面快取"""
+    token = _children_batched.set(True)
+    try:
+        yield
+    finally:
+        _children_batched.reset(token)
+
+
+# ========== 套票卡片片段快取 ==========
+
+@receiver(post_save, sender=Continent)
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=PackageTag)
+@receiver(post_delete, sender=Continent)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=City)
+@receiver(post_delete, sender=PackageTag)
+@receiver(post_delete, sender=Package)
+def invalidate_package_cards(sender, **kwargs):
+    """卡片會顯示地區名稱與 slug，相關資料變更時讓所有卡片片段失效"""
+    bump_card_generation()
+
+
+@receiver(post_save, sender=Package)
+def invalidate_package_card_on_raw_save(sender, instance, update_fields=None, **kwargs):
+    """
+    一般儲存會更新 updated_at，卡片快取鍵自然改變；
+    只有指定 update_fields 且未包含 updated_at 時才需要主動失效。
+    """
+    if update_fields is not None and 'updated_at' not in update_fields:
+        bump_card_generation()
+
+
+@receiver(m2m_changed, sender=Package.tags.through)
+def invalidate_package_cards_on_tags(sender, action, **kwargs):
+    """套票標籤異動不會改變 updated_at，需主動失效"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_card_generation()
+
+
+# ========== 地區登錄表 ==========
+
+@receiver(post_save, sender=Continent)
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=Continent)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=City)
+def invalidate_geography(sender, **kwargs):
+    """
+    地區變更時更新登錄表的版本 token；提交後再更新一次，
+    避免其他行程在交易提交前以舊資料重新載入、卻記下新的版本
+    """
+    bump_geography_version()
+    transaction.on_commit(bump_geography_version)
+
+
+# ========== 整頁快取相依版本 ==========
+
+@receiver(post_save, sender=Continent)
+@receiver(post_save, sender=Country)
+@receiver(post_save, sender=City)
+@receiver(post_save, sender=PackageTag)
+@receiver(post_save, sender=PackageType)
+@receiver(post_delete, sender=Continent)
+@receiver(post_delete, sender=Country)
+@receiver(post_delete, sender=City)
+@receiver(post_delete, sender=PackageTag)
+@receiver(post_delete, sender=PackageType)
+def purge_pages_for_row(sender, instance, **kwargs):
+    """地區、標籤與套票種類由多個頁面共用，只更新該資料列本身的版本"""
+    bump_dependencies(dependency_key(sender, instance.pk))
+
+
+@receiver(post_init, sender=Package)
+def remember_package_listing_state(sender, instance, **kwargs):
+    """記下影響列表內容的欄位（直接讀 __dict__，避免觸發延遲載入欄位的查詢）"""
+    instance._listing_state = (instance.__dict__.get('is_active'), instance.__dict__.get('city_id'))
+
+
+@receiver(post_save, sender=Package)
+def purge_pages_for_package(sender, instance, created, **kwargs):
+    """套票更新只影響依賴它的頁面；新增、上下架或換城市時列表集合也跟著失效"""
+    keys = [dependency_key(Package, instance.pk)]
+    listing_state = (instance.is_active, instance.city_id)
+    if created or getattr(instance, '_listing_state', None) != listing_state:
+        keys.append(dependency_key(Package))
+    instance._listing_state = listing_state
+    bump_dependencies(*keys)
+
+
+@receiver(post_delete, sender=Package)
+def purge_pages_for_deleted_package(sender, instance, **kwargs):
+    bump_dependencies(dependency_key(Package, instance.pk), dependency_key(Package))
+
+
+@receiver(m2m_changed, sender=Package.tags.through)
+def purge_pages_for_package_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump_dependencies(dependency_key(Package, instance.pk))
+    else:
+        keys = [dependency_key(PackageTag, instance.pk)]
+        keys.extend(dependency_key(Package, pk) for pk in pk_set or ())
+        bump_dependencies(*keys)
+
+
+def remember_package_child_state(sender, instance, **kwargs):
+    """記下啟用狀態：詳情頁只載入啟用中的子資料，停用的資料列不在頁面的相依清單中"""
+    instance._active_state = instance.__dict__.get('is_active')
+
+
+def purge_pages_for_package_child(sender, instance, created=False, **kwargs):
+    """
+    子資料更新只需更新該資料列；新增、刪除或切換啟用狀態時頁面原本可能並未依賴它，
+    因此同時更新所屬套票的版本。
+    """
+    if _children_batched.get() or _deleted_with_parent(instance, kwargs):
+        return
+    keys = [dependency_key(sender, instance.pk)]
+    toggled = getattr(instance, '_active_state', None) != instance.is_active
+    instance._active_state = instance.is_active
+    if created or toggled or kwargs.get('signal') is post_delete:
+        package_id = _owning_package_id(instance)
+        if package_id is not None:
+            keys.append(dependency_key(Package, package_id))
+    bump_dependencies(*keys)
+
+
+for _model in PACKAGE_CHILD_PATHS:
+    post_init.connect(remember_package_child_state, sender=_model, dispatch_uid=f'page-cache-{_model.__name__}-init')
+    post_save.connect(purge_pages_for_package_child, sender=_model, dispatch_uid=f'page-cache-{_model.__name__}-save')
+    post_delete.connect(purge_pages_for_package_child, sender=_model, dispatch_uid=f'page-cache-{_model.__name__}-delete')
+
+
+# ========== 套票卡片與分面索引讀取模型 ==========
+
+@receiver(post_save, sender=Package)
+def refresh_card_for_package(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_package_cards([instance.pk])
+
+
+@receiver(m2m_changed, sender=Package.tags.through)
+def refresh_cards_for_package_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            refresh_package_cards([instance.pk])
+    elif action == 'pre_clear':
+        # 反向清除時信號不會提供 pk_set，先記下受影響的套票
+        instance._card_package_pks = list(instance.package_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        refresh_package_cards(getattr(instance, '_card_package_pks', []))
+    elif action in ('post_add', 'post_remove'):
+        refresh_package_cards(list(pk_set or ()))
+
+
+@receiver(pre_delete, sender=PackageTag)
+def remember_tagged_packages(sender, instance, **kwargs):
+    instance._card_package_pks = list(instance.package_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=PackageTag)
+def refresh_cards_for_deleted_tag(sender, instance, **kwargs):
+    refresh_package_cards(getattr(instance, '_card_package_pks', []))
+
+
+@receiver(post_save, sender=DailyItinerary)
+@receiver(post_delete, sender=DailyItinerary)
+def refresh_cards_for_itinerary(sender, instance, raw=False, **kwargs):
+    """行程天數是搜尋分面之一"""
+    if not raw and not _children_batched.get() and not _deleted_with_parent(instance, kwargs):
+        refresh_package_cards([instance.package_id])
+
+
+@receiver(post_save, sender=PackageTag)
+def refresh_cards_for_tag(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_package_cards(Package.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=PackageType)
+def refresh_cards_for_package_type(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_package_cards(Package.objects.filter(package_type=instance))
+
+
+@receiver(post_save, sender=City)
+def refresh_cards_for_city(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_package_cards(Package.objects.filter(city=instance))
+
+
+@receiver(post_save, sender=Country)
+def refresh_cards_for_country(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_package_cards(Package.objects.filter(city__country=instance))
+
+
+@receiver(post_save, sender=Continent)
+def refresh_cards_for_continent(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_package_cards(Package.objects.filter(city__country__continent=instance))
+
+
+# ========== 最低房價彙總 ==========
+
+def refresh_min_room_price(sender, instance, **kwargs):
+    """房價或其上層（期間 / 酒店 / 房型）變動時重新計算所屬套票的最低房價"""
+    if kwargs.get('raw') or _children_batched.get() or _deleted_with_parent(instance, kwargs):
+        return
+    changed = update_min_room_prices([_owning_package_id(instance)])
+    if changed:
+        refresh_package_cards(changed)
+        # 起價改變會影響依價格排序 / 篩選的列表
+        bump_dependencies(dependency_key(Package))
+
+
+for _model in (Period, Hotel, RoomType, RoomPrice):
+    post_save.connect(refresh_min_room_price, sender=_model, dispatch_uid=f'min-room-price-{_model.__name__}-save')
+    post_delete.connect(refresh_min_room_price, sender=_model, dispatch_uid=f'min-room-price-{_model.__name__}-delete')
+
+
+# ========== 全文檢索文件 ==========
+
+@receiver(post_save, sender=Package)
+def refresh_search_document_for_package(sender, instance, raw=False, **kwargs):
+    if not raw:
+        refresh_search_documents([instance.pk])
+
+
+def refresh_search_document_for_child(sender, instance, **kwargs):
+    """行程內容與酒店名稱都在索引內；期間停用會讓底下的酒店退出索引"""
+    if kwargs.get('raw') or _children_batched.get() or _deleted_with_parent(instance, kwargs):
+        return
+    refresh_search_documents([_owning_package_id(instance)])
+
+
+for _model in (Period, Hotel, DailyItinerary):
+    post_save.connect(refresh_search_document_for_child, sender=_model, dispatch_uid=f'search-{_model.__name__}-save')
+    post_delete.connect(refresh_search_document_for_child, sender=_model, dispatch_uid=f'search-{_model.__name__}-delete')
+
+
+# ========== 響應式圖片衍生檔 ==========
+
+def schedule_image_derivatives(sender, instance, raw=False, **kwargs):
+    """圖片儲存後若清單中還沒有對應的衍生檔，排入背景工作產生（不在訪客請求時產生）"""
+    if raw or not missing_derivatives(instance):
+        return
+    enqueue('generate_image_derivatives', {'model': sender._meta.label, 'pk': instance.pk})
+
+
+for _label, _field, _aliases in IMAGE_SOURCES:
+    post_save.connect(schedule_image_derivatives, sender=_label, dispatch_uid=f'derivatives-{_label}')
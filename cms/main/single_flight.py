@@ -0,0 +1,171 @@
+"""
+快取未命中時的單一重建（single flight）
+
+熱門套票編輯後頁面快取失效，同時進來的請求會各自重跑詳情頁的多層 prefetch 或 ReportLab。
+這裡對每個鍵取得一把鎖：只有取得鎖的請求重建，其他請求
+
+- 有舊資料（stale）時直接使用舊資料
+- 沒有舊資料時輪詢等待重建結果，最多 SINGLE_FLIGHT_WAIT_TIMEOUT 秒；
+  持有鎖的請求結束卻沒有產生結果（例如不可快取的回應）時自行重建，
+  逾時則拋出 SingleFlightTimeout（由 SingleFlightTimeoutMiddleware 回應 503），不在沒有鎖的情況下重建
+
+- Redis、Memcached 等後端以 cache.add（不可分割的「不存在才寫入」）作為鎖，
+  期限 SINGLE_FLIGHT_LOCK_TIMEOUT 秒，重建中止時不會永久卡住
+- 檔案快取的 cache.add 是先檢查再寫入，改以快取目錄下鎖檔的 fcntl.flock 互斥（同一台主機的所有行程）；
+  行程結束時作業系統即釋放鎖，不需要期限，也不必判斷與移除逾期的鎖檔
+"""
+import fcntl
+import hashlib
+import math
+import os
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.http import HttpResponse
+
+LOCK_KEY_PREFIX = 'single-flight'
+
+# 檔案快取的鎖檔目錄（位於快取目錄下；檔案快取只管理 *.djcache，不會清除或淘汰鎖檔）
+LOCK_DIRECTORY = 'single-flight-locks'
+
+# 等待期間輪詢結果的間隔秒數
+POLL_INTERVAL = 0.05
+
+
+class CacheLock:
+    """以 cache.add 實作的鎖"""
+
+    def __init__(self, key):
+        self.key = f'{LOCK_KEY_PREFIX}:{key}'
+        self.token = uuid.uuid4().hex
+
+    def acquire(self):
+        return cache.add(self.key, self.token, timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+
+    def release(self):
+        # 鎖已逾期並被其他請求取得時不刪除
+        if cache.get(self.key) == self.token:
+            cache.delete(self.key)
+
+    def is_held(self):
+        return cache.get(self.key) is not None
+
+
+class FileLock:
+    """以 fcntl.flock 鎖住鎖檔的鎖（檔案快取使用）"""
+
+    def __init__(self, key, directory):
+        digest = hashlib.md5(f'{LOCK_KEY_PREFIX}:{key}'.encode()).hexdigest()
+        self.path = os.path.join(directory, f'{digest}.lock')
+        self.fd = None
+
+    def acquire(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        while True:
+            fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            # 前一個持有者釋放時會刪除鎖檔：確認鎖住的仍是目前路徑上的檔案，否則重新開啟
+            try:
+                current = os.stat(self.path).st_ino == os.fstat(fd).st_ino
+            except FileNotFoundError:
+                current = False
+            if current:
+                self.fd = fd
+                return True
+            os.close(fd)
+
+    def release(self):
+        if self.fd is None:
+            return
+        # 持有鎖時刪除鎖檔，再關閉檔案釋放鎖
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+        os.close(self.fd)
+        self.fd = None
+
+    def is_held(self):
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return False
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+        finally:
+            os.close(fd)
+        return False
+
+
+def get_lock(key):
+    """依預設快取後端取得 key 的鎖"""
+    backend = caches['default']
+    if isinstance(backend, FileBasedCache):
+        return FileLock(key, os.path.join(backend._dir, LOCK_DIRECTORY))
+    return CacheLock(key)
+
+
+class SingleFlightTimeout(Exception):
+    """等待其他請求重建逾時，且沒有舊資料可用"""
+
+
+def single_flight(key, build, lookup, stale=None):
+    """
+    對同一個 key 同時只執行一次 build()。
+
+    - build()：重建並回傳結果，結果需由 build 自行寫入快取 / 儲存空間，讓 lookup 找得到
+    - lookup()：回傳已重建好的結果，尚未完成時回傳 None（等待期間反覆呼叫）
+    - stale：沒有取得鎖時可以先回傳的舊結果
+
+    沒有舊結果且等待 SINGLE_FLIGHT_WAIT_TIMEOUT 秒仍未完成時拋出 SingleFlightTimeout。
+    """
+    lock = get_lock(key)
+    if lock.acquire():
+        try:
+            # 前一個持有鎖的請求可能剛好完成
+            result = lookup()
+            return result if result is not None else build()
+        finally:
+            lock.release()
+
+    if stale is not None:
+        return stale
+
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        result = lookup()
+        if result is not None:
+            return result
+        if not lock.is_held():
+            # 持有鎖的請求已結束；結果可能在檢查鎖之前剛寫入
+            result = lookup()
+            return result if result is not None else build()
+    # 重建仍在進行：不在沒有鎖的情況下另外重建，避免慢速重建時所有等待的請求一起重建
+    raise SingleFlightTimeout(key)
+
+
+class SingleFlightTimeoutMiddleware:
+    """view 等待重建逾時（SingleFlightTimeout）時回應 503，並以 Retry-After 請瀏覽器稍後重試"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if not isinstance(exception, SingleFlightTimeout):
+            return None
+        response = HttpResponse('頁面正在更新，請稍後再試', status=503, content_type='text/plain; charset=utf-8')
+        response['Retry-After'] = str(math.ceil(settings.SINGLE_FLIGHT_WAIT_TIMEOUT))
+        return response
@@ -0,0 +1,93 @@
+"""
+背景工作定義（由 manage.py run_worker 執行，見 main/jobs.py）
+
+工作在 worker 行程中儲存資料，信號更新的頁面快取、卡片與首頁版本寫在共用的預設快取，
+網站的各個行程下次讀取時即失效（行程內的 LocMemCache 由系統檢查 main.E001 拒絕）。
+"""
+from django.apps import apps
+
+from .copying import copy_packages as copy_package_tree
+from .images import generate_for_instance
+from .jobs import task
+from .models import ItineraryImage, Package, RoomImage
+from .page_cache import bump_dependencies, dependency_key
+from .pdf import ensure_itinerary_pdf, pdf_package_queryset
+from .read_models import rebuild_all_package_cards, refresh_package_cards
+from .utils import generate_content_with_perplexity
+
+
+@task('generate_ai_description', max_attempts=2)
+def generate_ai_description(package_id, prompt):
+    """呼叫 Perplexity 產生套票描述並寫回套票"""
+    content, error = generate_content_with_perplexity(prompt)
+    if not content:
+        raise RuntimeError(error or 'AI 生成內容失敗，請檢查 API 設定或稍後再試')
+    package = Package.objects.get(pk=package_id)
+    package.description = content
+    # 只寫入描述：排入佇列後在後台編輯的其他欄位不會被覆寫
+    package.save(update_fields=['description', 'updated_at'])
+    return {'content': content}
+
+
+@task('copy_packages')
+def copy_packages(package_ids):
+    """批量複製套票：整批一次載入、以 bulk_create 寫入，並在同一個 transaction 內完成"""
+    new_packages = copy_package_tree(sorted(package_ids))
+    return {'copied': [{'id': package.pk, 'name': package.name} for package in new_packages]}
+
+
+@task('rebuild_package_cards')
+def rebuild_package_cards(package_ids=None):
+    """重建套票卡片與分面索引（遷移 0038 在卡片表為空時排入）"""
+    if package_ids:
+        count = refresh_package_cards(Package.objects.filter(pk__in=package_ids))
+    else:
+        count = rebuild_all_package_cards()
+    return {'cards': count}
+
+
+@task('prebuild_itinerary_pdfs')
+def prebuild_itinerary_pdfs(package_ids=None, force=False):
+    """產生過期的每天行程 PDF"""
+    packages = pdf_package_queryset()
+    if package_ids:
+        packages = packages.filter(pk__in=package_ids)
+    built = [package.pk for package in packages if ensure_itinerary_pdf(package, force=force)[1]]
+    return {'built': built}
+
+
+@task('generate_image_derivatives', max_attempts=3)
+def generate_image_derivatives(model, pk, force=False):
+    """
+    產生單一圖片資料列的響應式衍生檔（圖片儲存時由信號排入）。
+    完成後更新套票卡片，並讓顯示這張圖片的頁面快取失效，下次渲染即使用 srcset。
+    """
+    model_class = apps.get_model(model)
+    instance = model_class.objects.filter(pk=pk).first()
+    if instance is None:
+        return {'images': 0}
+    count = generate_for_instance(instance, force=force)
+    if count:
+        if model_class is Package:
+            refresh_package_cards([pk])
+        bump_dependencies(dependency_key(model_class, pk))
+    return {'images': count}
+
+
+@task('warm_thumbnails')
+def warm_thumbnails(package_ids, force=False):
+    """為套票主圖、房間圖片與行程相片補產生缺少的衍生檔"""
+    count = 0
+    sources = [
+        Package.objects.filter(pk__in=package_ids),
+        RoomImage.objects.filter(room_type__hotel__period__package_id__in=package_ids, is_active=True),
+        ItineraryImage.objects.filter(
+            itinerary__package_id__in=package_ids, is_active=True, image__isnull=False,
+        ).select_related('image'),
+    ]
+    for queryset in sources:
+        for instance in queryset:
+            count += generate_for_instance(instance, force=force)
+    refresh_package_cards(list(package_ids))
+    bump_dependencies(*(dependency_key(Package, pk) for pk in package_ids))
+    return {'images': count}
@@ -0,0 +1,31 @@
+from django import template
+
+from main.cache import render_package_cards as _render_package_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def render_package_cards(packages, template_name):
+    """
+    以快取渲染套票卡片列表
+
+    用法：{% render_package_cards packages "main/includes/package_card.html" %}
+    """
+    return _render_package_cards(packages, template_name)
+
+
+@register.simple_tag(takes_context=True)
+def listing_query(context, **changes):
+    """
+    以目前的查詢字串為基礎替換參數（值為 None 時移除），用於保留篩選條件的分頁連結
+
+    用法：?{% listing_query page=page.next_page_number after=None %}
+    """
+    params = context['request'].GET.copy()
+    for key, value in changes.items():
+        if value is None:
+            params.pop(key, None)
+        else:
+            params[key] = value
+    return params.urlencode()
@@ -0,0 +1,50 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html, format_html_join
+
+from main.images import source_name
+
+register = template.Library()
+
+
+def _image_url(image):
+    if not image:
+        return ''
+    return image.url
+
+
+@register.simple_tag(takes_context=True)
+def picture(context, image, alias='', **attrs):
+    """
+    輸出含 WebP / JPEG srcset 的 <picture>，並帶上寬高避免版面位移
+
+    image 可以是 picture 資料（例如 PackageCard.image_picture），
+    或是圖片欄位 / Django-Filer 圖片（由 view 以 images.load_pictures 載入到 context 的 pictures）。
+    尚未產生衍生檔時輸出原圖的 <img>（picture 資料需以 fallback 指定原圖網址）。
+
+    用法：{% picture package.main_image "hero" alt=package.name class="package-hero-image" %}
+          {% picture package.image_picture fallback=package.image_url alt=package.name %}
+    """
+    fallback_url = attrs.pop('fallback', '')
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+
+    if isinstance(image, dict):
+        data = image or None
+    else:
+        data = context.get('pictures', {}).get((source_name(image), alias))
+        fallback_url = _image_url(image)
+
+    if not data:
+        if not fallback_url:
+            return ''
+        return format_html('<img src="{}"{}>', fallback_url, flatatt(attrs))
+
+    *sources, fallback = data['sources']
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}"{}></picture>',
+        format_html_join('', '<source type="{}" srcset="{}" sizes="{}">', (
+            (source['type'], source['srcset'], data['sizes']) for source in sources
+        )),
+        data['src'], fallback['srcset'], data['sizes'], data['width'], data['height'], flatatt(attrs),
+    )
@@ -0,0 +1,38 @@
+"""
+測試執行器
+
+在 NPlusOneTestRunner（見 nplusone.py）之外，讓測試使用暫存目錄下的檔案快取：
+測試會呼叫 cache.clear()，不可清除開發環境或部署環境 CACHE_LOCATION 的快取。
+"""
+import os
+import shutil
+import tempfile
+
+from django.test.utils import override_settings
+
+from .nplusone import NPlusOneTestRunner
+
+
+class TestRunner(NPlusOneTestRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_directory = tempfile.mkdtemp(prefix='cms-test-cache-')
+        self._cache_settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'main.cache_backends.FileBasedCache',
+                'LOCATION': self._cache_directory,
+            },
+            'versions': {
+                'BACKEND': 'main.cache_backends.FileBasedCache',
+                'LOCATION': os.path.join(self._cache_directory, 'versions'),
+                'TIMEOUT': None,
+                'OPTIONS': {'CULL': False},
+            },
+        })
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        shutil.rmtree(self._cache_directory, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1733 @@
-from django.test import TestCase
+import base64
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from types import SimpleNamespace
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser, Permission
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, router, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings, tag
+from django.urls import reverse
+from django.utils import timezone
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+
+from .cache import bump_card_generation, render_package_cards
+from .cache_backends import FileBasedCache
+from .checks import check_shared_cache
+from .copying import copy_packages
+from .fulltext import search_package_ids, tokenize
+from .geography import geography, resolve_regions
+from .jobs import (
+    RETRY_DELAY_SECONDS, STALE_JOB_TIMEOUT, claim_jobs, enqueue, execute_job, get_task, heartbeat, requeue_stale_jobs,
+)
+from filer.models import Image as FilerImage
+from homepage.cache import HOMEPAGE_CACHE_KEY, HOMEPAGE_REFRESH_LOCK_KEY, _is_stale, get_homepage, refresh_homepage
+from homepage.models import HeroSlide, HomepageSettings
+
+from .models import (
+    City,
+    Continent,
+    Country,
+    DailyItinerary,
+    Hotel,
+    ItineraryImage,
+    Job,
+    Package,
+    PackageCard,
+    PackageTag,
+    PackageType,
+    Period,
+    RoomImage,
+    RoomPrice,
+    RoomType,
+)
+from .nplusone import NPlusOneError, detect_n_plus_one
+from .pdf import build_itinerary_pdf, pdf_package_queryset, pdf_version
+from .price_grid import grid_prices, save_price_changes
+from .queries import encode_cursor, package_card_queryset, paginate_packages
+from .pricing import parse_price, update_min_room_prices
+from .query_plans import full_table_scans, public_queries
+from . import views as main_views
+from .routers import STICKY_COOKIE_NAME, ReplicaRoutingMiddleware
+from .seeding import seed_catalog
+from .single_flight import SingleFlightTimeout, SingleFlightTimeoutMiddleware, get_lock, single_flight
+from .timing import RequestTimingMiddleware, RequestTimingViewMiddleware
+from . import timing
+
+# 查詢數在主資料庫的連線上計算，設定了複本（DATABASE_REPLICA_URL）時也不分流
+primary_database_only = override_settings(DATABASE_READ_REPLICA=None)
+
+
+def make_city():
+    """建立 亞洲 / 日本 / 沖繩，回傳城市"""
+    continent = Continent.objects.create(name='亞洲', name_en='Asia')
+    country = Country.objects.create(name='日本', name_en='Japan', continent=continent)
+    return City.objects.create(name='沖繩', name_en='Okinawa', country=country)
+
+
+def make_filer_image(name):
+    """只建立 Django-Filer 圖片資料列，不上傳檔案"""
+    image = FilerImage(original_filename=f'{name}.jpg', _width=1200, _height=800, mime_type='image/jpeg')
+    image.file.name = f'test/{name}.jpg'
+    image.save()
+    return image
+
+
+def make_package(city, package_type, slug, days=0, size=0, images=(), tags=(), **fields):
+    """
+    建立套票與子資料：days 天行程（每天附上 images 的相片），
+    以及每層 size 筆的期間 → 酒店 → 房型 → 房價（價格依序為 10000、11000…）
+    """
+    package = Package.objects.create(
+        package_type=package_type, city=city, slug=slug,
+        **{'name': slug, 'description': '<p>套票</p>', 'price': '13,790', 'main_image': 'packages/a.jpg', **fields},
+    )
+    package.tags.add(*tags)
+    for day in range(1, days + 1):
+        itinerary = DailyItinerary.objects.create(package=package, day_number=day, title=f'第{day}天', description='潛水')
+        for order, image in enumerate(images):
+            ItineraryImage.objects.create(itinerary=itinerary, image=image, display_order=order)
+    for i in range(size):
+        period = Period.objects.create(package=package, period_text=f'期間{i + 1}')
+        for h in range(size):
+            hotel = Hotel.objects.create(period=period, hotel_name=f'酒店{h}')
+            for r in range(size):
+                room_type = RoomType.objects.create(hotel=hotel, room_type_name=f'房型{r}')
+                for p in range(size):
+                    RoomPrice.objects.create(room_type=room_type, price=f'{10000 + p * 1000}')
+    package.refresh_from_db()
+    return package
+
+
+class CopyPackageTests(TestCase):
+    """套票深層複製"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.city = make_city()
+        cls.package_type = PackageType.objects.create(name='船潛')
+        cls.tag = PackageTag.objects.create(name='熱門')
+
+    def make_package(self, slug, size):
+        """每層都有 size 筆子資料的套票"""
+        return make_package(self.city, self.package_type, slug, days=size, size=size, tags=[self.tag])
+
+    def count_copy_queries(self, packages):
+        with CaptureQueriesContext(connection) as queries:
+            copy_packages(packages)
+        return len(queries)
+
+    def test_copy_duplicates_whole_tree(self):
+        source = self.make_package('okinawa', 2)
+        new_package = source.copy_package()
+
+        self.assertEqual(new_package.name, 'okinawa (複製)')
+        self.assertEqual(new_package.slug, 'okinawa-copy')
+        self.assertFalse(new_package.is_active)
+        self.assertEqual(list(new_package.tags.all()), [self.tag])
+        self.assertEqual(new_package.daily_itineraries.count(), 2)
+        self.assertEqual(Period.objects.filter(package=new_package).count(), 2)
+        self.assertEqual(Hotel.objects.filter(period__package=new_package).count(), 4)
+        self.assertEqual(RoomType.objects.filter(hotel__period__package=new_package).count(), 8)
+        prices = RoomPrice.objects.filter(room_type__hotel__period__package=new_package)
+        self.assertEqual(prices.count(), 16)
+        self.assertFalse(prices.filter(price_amount__isnull=True).exists())
+
+        new_package.refresh_from_db()
+        self.assertEqual(new_package.min_room_price, 10000)
+        self.assertEqual(new_package.card.name, 'okinawa (複製)')
+
+    def test_copy_again_gets_unique_slug(self):
+        source = self.make_package('okinawa', 1)
+        source.copy_package()
+        self.assertEqual(source.copy_package().slug, 'okinawa-copy-2')
+
+    def test_query_count_is_independent_of_tree_size(self):
+        # 大小需在單一 bulk_create 批次內（SQLite 的參數數量上限會讓大量資料分批寫入）
+        small = [self.make_package('small-a', 1), self.make_package('small-b', 1)]
+        large = [self.make_package('large-a', 2), self.make_package('large-b', 2)]
+        self.assertEqual(self.count_copy_queries(small), self.count_copy_queries(large))
+
+
+@primary_database_only
+class ImageQueryCountTests(TestCase):
+    """詳情頁與首頁的查詢數不隨圖片數量增加"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.city = make_city()
+        cls.package_type = PackageType.objects.create(name='船潛')
+        cls.images = [make_filer_image(f'image-{i}') for i in range(6)]
+
+    def setUp(self):
+        cache.clear()
+
+    def count_queries(self, url):
+        cache.clear()
+        # 地區登錄表的版本不隨頁面清除，先載入，兩次請求都不計入重新載入的查詢
+        geography()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def make_package(self, slug, images_per_day):
+        return make_package(self.city, self.package_type, slug, days=2, images=self.images[:images_per_day])
+
+    def test_detail_query_count_is_independent_of_image_count(self):
+        few = self.make_package('few', 1)
+        many = self.make_package('many', 3)
+        self.assertEqual(
+            self.count_queries(few.card.detail_url),
+            self.count_queries(many.card.detail_url),
+        )
+
+    def test_home_query_count_is_independent_of_slide_count(self):
+        homepage = HomepageSettings.objects.create()
+        HeroSlide.objects.create(settings=homepage, title='1', image=self.images[0])
+        few = self.count_queries('/homepage/')
+        for i in range(1, 4):
+            HeroSlide.objects.create(settings=homepage, title=str(i + 1), image=self.images[i], order=i)
+        self.assertEqual(few, self.count_queries('/homepage/'))
+
+
+class CascadeDeleteTests(TestCase):
+    """刪除套票或期間時，底下的每一列不逐列重新計算衍生資料"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.city = make_city()
+        cls.package_type = PackageType.objects.create(name='船潛')
+
+    def count_delete_queries(self, instance):
+        with CaptureQueriesContext(connection) as queries:
+            instance.delete()
+        return len(queries)
+
+    def test_package_delete_query_count_is_independent_of_tree_size(self):
+        small = make_package(self.city, self.package_type, 'small', days=1, size=1)
+        large = make_package(self.city, self.package_type, 'large', days=2, size=2)
+        self.assertEqual(self.count_delete_queries(small), self.count_delete_queries(large))
+
+    def test_period_delete_recomputes_min_price_once(self):
+        package = make_package(self.city, self.package_type, 'okinawa', size=2)
+        cheaper = Period.objects.create(package=package, period_text='特價')
+        RoomPrice.objects.create(room_type=RoomType.objects.create(hotel=Hotel.objects.create(period=cheaper)), price='5,000')
+        package.refresh_from_db()
+        self.assertEqual(package.min_room_price, 5000)
+
+        with patch('main.signals.update_min_room_prices', wraps=update_min_room_prices) as recompute:
+            cheaper.delete()
+        recompute.assert_called_once_with([package.pk])
+        package.refresh_from_db()
+        self.assertEqual(package.min_room_price, 10000)
+        self.assertEqual(package.card.from_price, 10000)
+
+
+class PackagePaginationTests(TestCase):
+    """套票列表分頁：keyset 游標在 created_at 相同時不重複、不遺漏，總數與當頁共用一個查詢"""
+
+    PER_PAGE = 3
+
+    @classmethod
+    def setUpTestData(cls):
+        city = make_city()
+        package_type = PackageType.objects.create(name='船潛')
+        for i in range(8):
+            make_package(city, package_type, f'package-{i}', is_active=i != 7)
+        # 同一時間建立（例如批次匯入）的套票
+        PackageCard.objects.update(created_at=timezone.now())
+
+    def setUp(self):
+        cache.clear()
+
+    def walk(self, **kwargs):
+        """以游標逐頁讀完所有套票，回傳 [[pk, ...], ...]"""
+        pages, cursor = [], None
+        while True:
+            page = paginate_packages(package_card_queryset(), cursor=cursor, per_page=self.PER_PAGE, **kwargs)
+            pages.append([card.pk for card in page])
+            if not page.next_cursor:
+                return pages
+            cursor = page.next_cursor
+
+    def test_cursor_pages_are_stable_with_identical_created_at(self):
+        expected = list(package_card_queryset().order_by('-created_at', '-pk').values_list('pk', flat=True))
+        pages = self.walk()
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), expected)
+        offset_pages = [
+            [card.pk for card in paginate_packages(package_card_queryset(), page=number, per_page=self.PER_PAGE)]
+            for number in (1, 2, 3)
+        ]
+        self.assertEqual(offset_pages, pages)
+
+    def test_total_count(self):
+        page = paginate_packages(package_card_queryset(), per_page=self.PER_PAGE)
+        self.assertEqual((page.total_count, page.num_pages), (7, 3))
+        second = paginate_packages(package_card_queryset(), cursor=page.next_cursor, per_page=self.PER_PAGE)
+        self.assertEqual((second.total_count, second.number), (7, 2))
+        filtered = paginate_packages(package_card_queryset().filter(slug__in=['package-1', 'package-2']))
+        self.assertEqual(filtered.total_count, 2)
+
+    def test_invalid_cursor_is_ignored(self):
+        card = package_card_queryset().first()
+        first_page = self.client.get(reverse('main:package_list'))
+        tampered = [
+            'not-a-cursor!',
+            '%%%',
+            base64.urlsafe_b64encode(b'a|b|c').decode(),
+            base64.urlsafe_b64encode(b'\xff\xfe').decode(),
+            base64.urlsafe_b64encode(b'2026-01-01T00:00:00|1|0').decode(),
+            base64.urlsafe_b64encode(f'{card.created_at.isoformat()}|{2 ** 80}|0'.encode()).decode(),
+            base64.urlsafe_b64encode(f'{card.created_at.isoformat()}|{card.pk}|-3'.encode()).decode(),
+        ]
+        for cursor in tampered:
+            with self.subTest(cursor):
+                response = self.client.get(reverse('main:package_list'), {'after': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    [card.pk for card in response.context['packages']],
+                    [card.pk for card in first_page.context['packages']],
+                )
+        self.assertEqual(
+            self.client.get(reverse('main:package_list'), {'after': encode_cursor(card, 1)}).status_code, 200,
+        )
+
+
+class PackageCardCacheTests(TestCase):
+    """卡片片段快取：套票修改只讓自己的片段失效，世代號遞增讓所有片段失效"""
+
+    TEMPLATE = 'main/includes/package_card.html'
+
+    @classmethod
+    def setUpTestData(cls):
+        city = make_city()
+        package_type = PackageType.objects.create(name='船潛')
+        cls.packages = [make_package(city, package_type, slug) for slug in ('okinawa', 'ishigaki')]
+
+    def backends(self):
+        """本機記憶體與檔案快取"""
+        yield 'locmem', {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'package-cards'}
+        with tempfile.TemporaryDirectory() as location:
+            yield 'file', {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+
+    def render(self):
+        """渲染所有卡片，回傳 (HTML, 重新渲染的套票 pk)"""
+        with patch('main.cache.render_to_string', wraps=render_to_string) as render:
+            html = render_package_cards(package_card_queryset().order_by('pk'), self.TEMPLATE)
+        return html, [call.args[1]['package'].pk for call in render.call_args_list]
+
+    def test_invalidation(self):
+        first, second = self.packages
+        for name, backend in self.backends():
+            with self.subTest(name), override_settings(CACHES={'default': backend}):
+                cache.clear()
+                self.assertEqual(self.render()[1], [first.pk, second.pk])
+                self.assertEqual(self.render()[1], [])
+
+                first.name = f'慶良間 {name}'
+                first.save()
+                html, rendered = self.render()
+                self.assertEqual(rendered, [first.pk])
+                self.assertIn(f'慶良間 {name}', html)
+
+                bump_card_generation()
+                self.assertEqual(self.render()[1], [first.pk, second.pk])
+                self.assertEqual(self.render()[1], [])
+
+
+@primary_database_only
+class PageCacheTests(TestCase):
+    """匿名訪客整頁快取：命中時不查詢資料庫，相依資料變更時失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = make_package(make_city(), PackageType.objects.create(name='船潛'), 'okinawa', days=1, size=1)
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+
+    def urls(self):
+        city = self.package.city
+        return [
+            reverse('main:package_list'),
+            reverse('main:package_list_by_city', args=[city.country.continent.slug, city.country.slug, city.slug]),
+            self.package.card.detail_url,
+        ]
+
+    def test_second_request_is_served_from_cache(self):
+        for url in self.urls():
+            with self.subTest(url):
+                first = self.client.get(url)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.status_code, 200)
+                self.assertEqual(second.content, first.content)
+                self.assertEqual(second['ETag'], first['ETag'])
+
+    def test_if_none_match_returns_304(self):
+        url = self.package.card.detail_url
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_package_edit_invalidates_pages(self):
+        urls = self.urls()
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        self.package.name = '沖繩慶良間'
+        self.package.save()
+        for url in urls:
+            with self.subTest(url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertContains(response, '沖繩慶良間')
+        response = self.client.get(reverse('main:package_search'), {'q': '慶良間'})
+        self.assertContains(response, '沖繩慶良間')
+
+    def test_child_row_edit_invalidates_detail_page(self):
+        url = self.package.card.detail_url
+        self.assertNotContains(self.client.get(url), '座間味酒店')
+        hotel = Hotel.objects.get(period__package=self.package)
+        hotel.hotel_name = '座間味酒店'
+        hotel.save()
+        response = self.client.get(url)
+        self.assertContains(response, '座間味酒店')
+        self.assertContains(response, '10000')
+
+        RoomPrice.objects.filter(room_type__hotel=hotel).get().delete()
+        self.assertNotContains(self.client.get(url), '10000')
+
+    def test_package_type_rename_invalidates_detail_page(self):
+        url = self.package.card.detail_url
+        self.assertContains(self.client.get(url), '船潛')
+        package_type = self.package.package_type
+        package_type.name = '浮潛'
+        package_type.save()
+        response = self.client.get(url)
+        self.assertContains(response, '浮潛')
+        self.assertNotContains(response, '船潛')
+
+    def test_reactivated_child_row_invalidates_detail_page(self):
+        """詳情頁只載入啟用中的子資料，重新啟用的資料列不在相依清單中，需由所屬套票的版本失效"""
+        url = self.package.card.detail_url
+        hotel = Hotel.objects.get(period__package=self.package)
+        hotel.is_active = False
+        hotel.save()
+        self.assertNotContains(self.client.get(url), hotel.hotel_name)
+
+        hotel = Hotel.objects.get(pk=hotel.pk)
+        hotel.is_active = True
+        hotel.save()
+        self.assertContains(self.client.get(url), hotel.hotel_name)
+
+    def test_authenticated_requests_bypass_cache(self):
+        url = self.package.card.detail_url
+        self.client.get(url)
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(queries), 0)
+        self.assertFalse(response.has_header('ETag'))
+
+
+@primary_database_only
+class FacetSearchTests(TestCase):
+    """分面搜尋：同維度複選的分離式計數，查詢數與目錄大小無關"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package_type = PackageType.objects.create(name='船潛')
+        cls.tag = PackageTag.objects.create(name='熱門')
+        cls.okinawa = make_city()
+        cls.ishigaki = City.objects.create(name='石垣島', name_en='Ishigaki', country=cls.okinawa.country)
+        make_package(cls.okinawa, cls.package_type, 'okinawa-a', tags=[cls.tag])
+        make_package(cls.okinawa, cls.package_type, 'okinawa-b')
+        make_package(cls.ishigaki, cls.package_type, 'ishigaki-a', tags=[cls.tag])
+
+    def search(self, **params):
+        response = self.client.get(reverse('main:package_search'), {**params, 'format': 'json'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def counts(self, data, dimension):
+        return {option['label']: (option['count'], option['selected']) for option in data['facets'][dimension]}
+
+    def test_search_route_does_not_shadow_continent_slug(self):
+        continent = Continent.objects.create(name='搜尋', name_en='Search', slug='search')
+        response = self.client.get(reverse('main:package_list_by_continent', args=[continent.slug]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.resolver_match.url_name, 'package_list_by_continent')
+
+    def test_counts_within_selected_dimension_ignore_its_own_filter(self):
+        data = self.search(city=self.okinawa.pk)
+        self.assertEqual(data['total_count'], 2)
+        # 已選擇沖繩，石垣島仍顯示可加選的數量
+        self.assertEqual(self.counts(data, 'city'), {'沖繩': (2, True), '石垣島': (1, False)})
+        # 其他維度的數量只計算沖繩的套票
+        self.assertEqual(self.counts(data, 'tag'), {'熱門': (1, False)})
+
+        data = self.search(city=[self.okinawa.pk, self.ishigaki.pk], tag=self.tag.pk)
+        self.assertEqual(data['total_count'], 2)
+        self.assertEqual(self.counts(data, 'city'), {'沖繩': (1, True), '石垣島': (1, True)})
+        self.assertEqual(self.counts(data, 'tag'), {'熱門': (2, True)})
+
+    def test_query_count_is_independent_of_catalog_size(self):
+        params = {'city': self.okinawa.pk, 'tag': self.tag.pk, 'q': '套票'}
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.search(**params)
+            return len(queries)
+
+        few = count_queries()
+        for i in range(6):
+            city = self.okinawa if i % 2 else self.ishigaki
+            make_package(city, self.package_type, f'more-{i}', tags=[self.tag])
+        self.assertEqual(few, count_queries())
+
+
+class ItineraryPdfTests(TestCase):
+    """每天行程 PDF 依版本存放在儲存空間，內容不變時重複使用並回應 304"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = make_package(make_city(), PackageType.objects.create(name='船潛'), 'okinawa', days=2)
+
+    def setUp(self):
+        cache.clear()
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.storage = FileSystemStorage(location=location.name)
+        for target in ('main.pdf.default_storage', 'main.views.default_storage'):
+            patcher = patch(target, self.storage)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        city = self.package.city
+        self.url = reverse('main:package_daily_itinerary_pdf', args=[
+            city.country.continent.slug, city.country.slug, city.slug, self.package.slug,
+        ])
+
+    def download(self, **headers):
+        response = self.client.get(self.url, **headers)
+        if response.status_code == 200:
+            self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        response.close()
+        return response
+
+    def version(self):
+        return pdf_version(pdf_package_queryset().get(pk=self.package.pk))
+
+    def stored_files(self):
+        return self.storage.listdir(f'itinerary_pdfs/{self.package.pk}')[1]
+
+    def test_second_download_reuses_stored_file(self):
+        with patch('main.pdf.build_itinerary_pdf', wraps=build_itinerary_pdf) as build:
+            first = self.download()
+            second = self.download()
+        build.assert_called_once()
+        self.assertEqual(first['ETag'], second['ETag'])
+        self.assertEqual(self.stored_files(), [f'{self.version()}.pdf'])
+
+    def test_conditional_requests_return_304(self):
+        response = self.download()
+        with patch('main.pdf.build_itinerary_pdf') as build:
+            self.assertEqual(self.download(HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            self.assertEqual(self.download(HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        build.assert_not_called()
+
+    def test_itinerary_edit_regenerates_pdf(self):
+        old_version = self.version()
+        etag = self.download()['ETag']
+
+        itinerary = self.package.daily_itineraries.get(day_number=1)
+        itinerary.title = '慶良間一日遊'
+        itinerary.save()
+        self.assertNotEqual(self.version(), old_version)
+
+        with patch('main.pdf.build_itinerary_pdf', wraps=build_itinerary_pdf) as build:
+            response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        build.assert_called_once()
+        self.assertIn('慶良間一日遊', [day.title for day in build.call_args.args[1]])
+        self.assertEqual(self.stored_files(), [f'{self.version()}.pdf'])
+
+
+class FullTextSearchTests(TestCase):
+    """CJK 二元組全文檢索：索引由 trigger 同步，名稱的權重高於內容"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.city = make_city()
+        cls.package_type = PackageType.objects.create(name='船潛')
+
+    def make_package(self, slug, name, description):
+        return make_package(self.city, self.package_type, slug, name=name, description=description)
+
+    def test_tokenize(self):
+        self.assertEqual(tokenize('石垣島 Diving'), ['石垣', '垣島', 'diving'])
+        self.assertEqual(tokenize('<島>'), ['島'])
+        self.assertEqual(tokenize(''), [])
+
+    def test_chinese_bigram_match(self):
+        package = self.make_package('ishigaki', '石垣島', '<p>與鬼蝠魟共游</p>')
+        self.make_package('okinawa', '沖繩本島', '<p>青洞浮潛</p>')
+        self.assertEqual(search_package_ids('鬼蝠魟'), [package.pk])
+        self.assertEqual(search_package_ids('蝠魟共游'), [package.pk])
+        self.assertEqual(search_package_ids('曼波'), [])
+
+    def test_title_ranks_above_body(self):
+        title = self.make_package('title', '石垣島', '<p>五天行程</p>')
+        body = self.make_package('body', '沖繩', '<p>第二天前往石垣島，再回到本島</p>')
+        self.assertEqual(search_package_ids('石垣島'), [title.pk, body.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        package = self.make_package('ishigaki', '石垣島', '<p>鬼蝠魟</p>')
+        package.description = '<p>曼波魚</p>'
+        package.save()
+        self.assertEqual(search_package_ids('鬼蝠魟'), [])
+        self.assertEqual(search_package_ids('曼波魚'), [package.pk])
+
+        package.delete()
+        self.assertEqual(search_package_ids('曼波魚'), [])
+        self.assertEqual(search_package_ids('石垣島'), [])
+
+    def test_single_character_tokens(self):
+        island = self.make_package('ishigaki', '石垣島', '<p>船潛</p>')
+        self.make_package('okinawa', '沖繩', '<p>船潛</p>')
+        self.assertEqual(search_package_ids('島'), [island.pk])
+        # 「島」只以「垣島」二元組存在索引中，需以純文字比對
+        self.assertEqual(search_package_ids('船潛 島'), [island.pk])
+        self.assertEqual(search_package_ids('船潛 海'), [])
+
+    def test_results_beyond_ranking_limit_are_counted(self):
+        packages = [self.make_package(f'dive-{i}', f'潛水{i}', '<p>船潛</p>') for i in range(3)]
+        ranked = patch('main.views.search_package_ids', lambda query: search_package_ids(query, limit=2))
+        with ranked:
+            response = self.client.get(reverse('main:package_search'), {'q': '船潛', 'format': 'json'})
+        data = response.json()
+        self.assertEqual(data['total_count'], 3)
+        self.assertEqual(sorted(result['id'] for result in data['results']), sorted(p.pk for p in packages))
+        # 排名之外的結果排在最後
+        self.assertEqual([result['id'] for result in data['results'][:2]], search_package_ids('船潛', limit=2))
+        self.assertEqual(sum(option['count'] for option in data['facets']['city']), 3)
+
+
+@override_settings(DEFAULT_PRICE_CURRENCY='TWD')
+class ParsePriceTests(SimpleTestCase):
+    """自由輸入的價格文字解析成 (金額, 幣別)"""
+
+    def test_parse_price(self):
+        cases = [
+            ('13,790', (Decimal('13790.00'), 'TWD')),
+            ('NT$12,000起', (Decimal('12000.00'), 'TWD')),
+            ('USD 1,200', (Decimal('1200.00'), 'USD')),
+            ('us$99.5', (Decimal('99.50'), 'USD')),
+            ('港幣 3,000', (Decimal('3000.00'), 'HKD')),
+            ('5,000-8,000', (Decimal('5000.00'), 'TWD')),
+            ('9,999,999,999.99', (Decimal('9999999999.99'), 'TWD')),
+            ('', (None, '')),
+            (None, (None, '')),
+            ('請洽詢', (None, '')),
+            # DecimalField(max_digits=12, decimal_places=2) 放不下的金額
+            ('10,000,000,000', (None, '')),
+            ('9' * 40, (None, '')),
+        ]
+        for text, expected in cases:
+            with self.subTest(text):
+                self.assertEqual(parse_price(text), expected)
+
+
+class MinRoomPriceTests(TestCase):
+    """套票的數值價格與最低房價隨房價、上層資料的啟用狀態維護"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = make_package(make_city(), PackageType.objects.create(name='船潛'), 'okinawa', size=1)
+        cls.room_type = RoomType.objects.get(hotel__period__package=cls.package)
+
+    def assertMinPrice(self, expected):
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.min_room_price, expected)
+        # 卡片的起價在沒有房價時使用套票價格
+        self.assertEqual(self.package.card.from_price, self.package.price_amount if expected is None else expected)
+
+    def test_package_price_is_parsed_on_save(self):
+        self.assertEqual((self.package.price_amount, self.package.price_currency), (Decimal('13790.00'), 'TWD'))
+        self.package.price = '請洽詢'
+        self.package.save()
+        self.package.refresh_from_db()
+        self.assertEqual((self.package.price_amount, self.package.price_currency), (None, ''))
+
+    def test_min_room_price_follows_room_prices(self):
+        self.assertMinPrice(10000)
+        cheaper = RoomPrice.objects.create(room_type=self.room_type, price='NT$8,500 起')
+        self.assertMinPrice(8500)
+        cheaper.is_active = False
+        cheaper.save()
+        self.assertMinPrice(10000)
+        cheaper.delete()
+        self.assertMinPrice(10000)
+
+    def test_inactive_hotel_is_ignored(self):
+        hotel = self.room_type.hotel
+        hotel.is_active = False
+        hotel.save()
+        self.assertMinPrice(None)
+
+    def test_backfill_migration(self):
+        backfill = import_module('main.migrations.0037_backfill_prices').backfill_prices
+        Package.objects.update(price_amount=None, price_currency='', min_room_price=None)
+        RoomPrice.objects.update(price_amount=None, price_currency='')
+        backfill(apps, None)
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.price_amount, Decimal('13790.00'))
+        self.assertEqual(self.package.min_room_price, 10000)
+        self.assertEqual(RoomPrice.objects.get().price_amount, 10000)
+
+
+def make_catalog(user, numbers):
+    """為每個編號建立一組國家、城市、套票與各層子資料、背景工作與 Hero 圖片"""
+    continent, _ = Continent.objects.get_or_create(name='亞洲', name_en='Asia')
+    package_type, _ = PackageType.objects.get_or_create(name='船潛')
+    tag, _ = PackageTag.objects.get_or_create(name='熱門')
+    homepage = HomepageSettings.objects.first() or HomepageSettings.objects.create()
+    for i in numbers:
+        image = make_filer_image(f'image-{i}')
+        country = Country.objects.create(name=f'國家{i}', name_en=f'Country {i}', continent=continent)
+        city = City.objects.create(name=f'城市{i}', name_en=f'City {i}', country=country)
+        package = make_package(
+            city, package_type, f'package-{i}', days=1, size=1, images=[image], tags=[tag], name=f'套票{i}',
+        )
+        RoomImage.objects.create(room_type=RoomType.objects.get(hotel__period__package=package), image='room_images/a.jpg')
+        Job.objects.create(task='copy_packages', created_by=user, run_after=package.created_at)
+        HeroSlide.objects.create(settings=homepage, title=str(i), image=image, order=i)
+
+
+def admin_changelist_urls():
+    """main 與 homepage 所有管理後台列表頁：[(模型標籤, 網址), ...]"""
+    return [
+        (model._meta.label, reverse(f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist'))
+        for model in admin.site._registry if model._meta.app_label in ('main', 'homepage')
+    ]
+
+
+class FormFields(HTMLParser):
+    """依瀏覽器送出表單的規則收集欄位值（與套票編輯頁的 formData() 相同），略過 nested_admin 的 __prefix__ 範本列"""
+
+    def __init__(self):
+        super().__init__()
+        self.data = {}
+        self.select = None
+        self.textarea = None
+
+    def add(self, name, value):
+        if name and '__prefix__' not in name:
+            self.data.setdefault(name, []).append(value)
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if 'disabled' in attrs:
+            return
+        if tag == 'select':
+            self.select = {'name': attrs.get('name'), 'multiple': 'multiple' in attrs, 'first': None, 'chosen': False}
+        elif tag == 'option' and self.select is not None:
+            value = attrs.get('value', '')
+            if self.select['first'] is None:
+                self.select['first'] = value
+            if 'selected' in attrs:
+                self.select['chosen'] = True
+                self.add(self.select['name'], value)
+        elif tag == 'textarea':
+            self.textarea = [attrs.get('name'), '']
+        elif tag == 'input':
+            kind = attrs.get('type', 'text')
+            if kind in ('submit', 'button', 'image', 'file'):
+                return
+            if kind in ('checkbox', 'radio'):
+                if 'checked' in attrs:
+                    self.add(attrs.get('name'), attrs.get('value') or 'on')
+                return
+            self.add(attrs.get('name'), attrs.get('value') or '')
+
+    def handle_data(self, data):
+        if self.textarea is not None:
+            self.textarea[1] += data
+
+    def handle_endtag(self, tag):
+        if tag == 'select' and self.select is not None:
+            select = self.select
+            if not select['chosen'] and not select['multiple'] and select['first'] is not None:
+                self.add(select['name'], select['first'])
+            self.select = None
+        elif tag == 'textarea' and self.textarea is not None:
+            self.add(*self.textarea)
+            self.textarea = None
+
+
+def form_data(response):
+    """回應中的表單欄位 {名稱: [值, ...]}，可修改後直接 POST"""
+    parser = FormFields()
+    parser.feed(response.content.decode())
+    return parser.data
+
+
+# 套票子樹的資料表
+PACKAGE_CHILD_TABLES = {
+    model._meta.db_table for model in (Period, Hotel, RoomType, RoomPrice, RoomImage, DailyItinerary, ItineraryImage)
+}
+
+
+def child_writes(queries):
+    """查詢中對套票子樹資料表的寫入：[(INSERT / UPDATE / DELETE, 資料表), ...]"""
+    writes = []
+    for query in queries:
+        match = re.match(r'(INSERT INTO|UPDATE|DELETE FROM) "(\w+)"', query['sql'])
+        if match and match[2] in PACKAGE_CHILD_TABLES:
+            writes.append((match[1].split()[0], match[2]))
+    return writes
+
+
+@primary_database_only
+class NPlusOneTests(TestCase):
+    """
+    管理後台列表與公開頁面不可有 N+1 延遲載入。
+
+    測試使用 NPlusOneTestRunner，每個請求的延遲載入達到門檻就會拋出 NPlusOneError；
+    每一層資料都建立超過門檻的筆數，讓逐列載入關聯的頁面一定會被偵測到。
+    """
+
+    ROWS = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        make_catalog(cls.user, range(cls.ROWS))
+        cls.package = Package.objects.select_related('city__country__continent').get(slug='package-0')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertPageOk(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+
+    def test_detector_reports_relation_and_call_site(self):
+        with self.assertRaises(NPlusOneError) as raised:
+            with detect_n_plus_one():
+                [hotel.period.period_text for hotel in Hotel.objects.all()]
+        self.assertIn('main.Hotel.period', str(raised.exception))
+        self.assertIn('main/tests.py', str(raised.exception))
+        self.assertIn(f'{self.ROWS} 次', str(raised.exception))
+
+        with detect_n_plus_one():
+            [hotel.period.period_text for hotel in Hotel.objects.select_related('period')]
+
+    def test_hooks_do_nothing_without_detection(self):
+        with patch('main.nplusone._called_from_prefetch') as walk_stack:
+            list(self.package.periods.all())
+        walk_stack.assert_not_called()
+
+    def test_hooks_are_installed_only_when_enabled(self):
+        config = apps.get_app_config('main')
+        for enabled in (False, True):
+            with self.subTest(enabled=enabled), override_settings(NPLUSONE_ENABLED=enabled), \
+                    patch('main.nplusone.install') as install:
+                config.ready()
+            self.assertEqual(install.called, enabled)
+
+    def test_admin_changelists(self):
+        self.client.force_login(self.user)
+        for label, url in admin_changelist_urls():
+            with self.subTest(label):
+                self.assertPageOk(url)
+
+    def test_public_views(self):
+        city = self.package.city
+        country = city.country
+        continent = country.continent
+        urls = [
+            reverse('homepage:home'),
+            reverse('main:package_list'),
+            reverse('main:package_search'),
+            reverse('main:package_list_by_continent', args=[continent.slug]),
+            reverse('main:package_list_by_country', args=[continent.slug, country.slug]),
+            reverse('main:package_list_by_city', args=[continent.slug, country.slug, city.slug]),
+            self.package.card.detail_url,
+        ]
+        for url in urls:
+            with self.subTest(url):
+                self.assertPageOk(url)
+
+
+class AdminChangelistQueryTests(TestCase):
+    """管理後台列表頁的查詢數不隨資料筆數增加"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        make_catalog(cls.user, range(2))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_query_count_is_independent_of_row_count(self):
+        urls = admin_changelist_urls()
+        few = {label: self.count_queries(url) for label, url in urls}
+        make_catalog(self.user, range(2, 8))
+        for label, url in urls:
+            with self.subTest(label):
+                self.assertEqual(few[label], self.count_queries(url))
+
+    def test_search_filter(self):
+        url = reverse('admin:main_roomprice_changelist')
+        response = self.client.get(url, {'room_type__hotel__period__package__search': '套票1'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, 'value="套票1"')
+
+
+class TreeSavingTests(TestCase):
+    """套票編輯頁的子資料只寫入有變更的列，並批次更新衍生資料（tree_saving.py）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.city = make_city()
+        cls.package_type = PackageType.objects.create(name='船潛')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def make_package(self, slug, size, **kwargs):
+        return make_package(self.city, self.package_type, slug, size=size, **kwargs)
+
+    def post(self, url, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertTrue(response.json()['success'])
+        return queries
+
+    def period_branch(self, package):
+        """第一個期間的子樹：(網址, 表單資料, 表單前綴)"""
+        period = package.periods.order_by('pk').first()
+        url = reverse('admin:main_package_branch', args=[package.pk, 'period', period.pk])
+        return url, form_data(self.client.get(url)), f'period-{period.pk}-hotels'
+
+    def edit_first_price(self, package):
+        url, data, prefix = self.period_branch(package)
+        data[f'{prefix}-0-room_types-0-prices-0-price'] = ['9,000']
+        return self.post(url, data)
+
+    def test_editing_one_price_uses_constant_queries(self):
+        small = self.make_package('small', 2)
+        large = self.make_package('large', 3)
+        small_queries = self.edit_first_price(small)
+        large_queries = self.edit_first_price(large)
+
+        self.assertEqual(len(small_queries), len(large_queries))
+        # 工作階段、使用者、異動紀錄、子樹各層與衍生資料，與套票大小無關
+        self.assertLessEqual(len(large_queries), 35)
+        self.assertEqual(child_writes(large_queries), [('UPDATE', RoomPrice._meta.db_table)])
+        price = RoomPrice.objects.filter(room_type__hotel__period__package=large).order_by('pk').first()
+        self.assertEqual((price.price, price.price_amount), ('9,000', 9000))
+        large.refresh_from_db()
+        self.assertEqual(large.min_room_price, 9000)
+        self.assertEqual(large.card.from_price, 9000)
+
+    def test_unchanged_rows_are_skipped(self):
+        package = self.make_package('okinawa', 2, days=2)
+        url, data, _ = self.period_branch(package)
+        self.assertEqual(child_writes(self.post(url, data)), [])
+
+        url = reverse('admin:main_package_change', args=[package.pk])
+        data = form_data(self.client.get(url))
+        data['_continue'] = ['1']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, data)
+        self.assertRedirects(response, url)
+        self.assertEqual(child_writes(queries), [])
+
+    def test_new_and_deleted_rows(self):
+        package = self.make_package('okinawa', 2)
+        url, data, prefix = self.period_branch(package)
+        prices = f'{prefix}-0-room_types-0-prices'
+        room_type_id = data[f'{prices}-0-room_type'][0]
+        deleted_price = int(data[f'{prices}-1-id'][0])
+        deleted_hotel = int(data[f'{prefix}-1-id'][0])
+        data[f'{prices}-1-DELETE'] = ['on']
+        data[f'{prefix}-1-DELETE'] = ['on']
+        data[f'{prices}-TOTAL_FORMS'] = ['3']
+        data.update({
+            f'{prices}-2-price': ['8000'],
+            f'{prices}-2-is_active': ['on'],
+            f'{prices}-2-room_type': [room_type_id],
+        })
+        queries = self.post(url, data)
+
+        self.assertFalse(RoomPrice.objects.filter(pk=deleted_price).exists())
+        self.assertFalse(Hotel.objects.filter(pk=deleted_hotel).exists())
+        self.assertFalse(RoomType.objects.filter(hotel_id=deleted_hotel).exists())
+        added = RoomPrice.objects.get(room_type_id=room_type_id, price='8000')
+        self.assertEqual(added.price_amount, 8000)
+        self.assertEqual(child_writes(queries).count(('INSERT', RoomPrice._meta.db_table)), 1)
+        package.refresh_from_db()
+        self.assertEqual(package.min_room_price, 8000)
+
+    def test_one_featured_image_per_itinerary(self):
+        package = self.make_package('okinawa', 0, days=1, images=[make_filer_image(f'day-{i}') for i in range(3)])
+        itinerary = package.daily_itineraries.get()
+        images = list(itinerary.images.order_by('display_order'))
+        ItineraryImage.objects.filter(pk=images[0].pk).update(is_featured=True)
+
+        # filer 的相片欄位在顯示時會向儲存空間確認檔案，這裡直接組出表單資料
+        prefix = f'itinerary-{itinerary.pk}-images'
+        data = {f'{prefix}-TOTAL_FORMS': len(images), f'{prefix}-INITIAL_FORMS': len(images)}
+        for i, image in enumerate(images):
+            data.update({
+                f'{prefix}-{i}-id': image.pk,
+                f'{prefix}-{i}-itinerary': itinerary.pk,
+                f'{prefix}-{i}-image': image.image_id,
+                f'{prefix}-{i}-display_order': image.display_order,
+                f'{prefix}-{i}-is_featured': 'on',
+                f'{prefix}-{i}-is_active': 'on',
+            })
+        queries = self.post(reverse('admin:main_package_branch', args=[package.pk, 'itinerary', itinerary.pk]), data)
+
+        # 與逐列 save() 相同，最後一張勾選的相片成為主要相片
+        featured = ItineraryImage.objects.filter(itinerary=itinerary, is_featured=True)
+        self.assertEqual(list(featured), [images[2]])
+        # 勾選的相片以 bulk_update 寫入，其他相片以一個 UPDATE 取消主要相片
+        unfeature = [
+            query for query in queries
+            if re.match(rf'UPDATE "{ItineraryImage._meta.db_table}" SET "is_featured" = (0|false)\b', query['sql'], re.I)
+        ]
+        self.assertEqual(len(unfeature), 1)
+
+
+class PriceGridTests(TestCase):
+    """房價表一次送出多個儲存格（price_grid.py）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        package_type = PackageType.objects.create(name='船潛')
+        cls.city = make_city()
+        cls.other_city = City.objects.create(name='北海道', name_en='Hokkaido', country=cls.city.country)
+        cls.package = make_package(cls.city, package_type, 'okinawa', size=1)
+        cls.neighbour = make_package(cls.city, package_type, 'ishigaki', size=1)
+        cls.elsewhere = make_package(cls.other_city, package_type, 'sapporo', size=1)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def price(self, package):
+        return RoomPrice.objects.get(room_type__hotel__period__package=package)
+
+    def post(self, url, changes):
+        return self.client.post(url, {'changes': changes}, content_type='application/json')
+
+    def test_batch_is_one_bulk_update(self):
+        changes = [
+            {'id': self.price(self.package).pk, 'price': '9,000', 'price_description': '淡季'},
+            {'id': self.price(self.neighbour).pk, 'price': '8,000'},
+        ]
+        with patch.object(RoomPrice.objects, 'bulk_update', wraps=RoomPrice.objects.bulk_update) as bulk_update, \
+                CaptureQueriesContext(connection) as queries:
+            response = self.post(reverse('admin:main_city_prices', args=[self.city.pk]), changes)
+
+        self.assertEqual(response.json(), {'success': True, 'updated': 2})
+        bulk_update.assert_called_once()
+        writes = [query['sql'] for query in queries if query['sql'].startswith(f'UPDATE "{RoomPrice._meta.db_table}"')]
+        self.assertEqual(len(writes), 1)
+        price = self.price(self.package)
+        self.assertEqual((price.price, price.price_amount, price.price_description), ('9,000', 9000, '淡季'))
+
+    def test_failure_after_write_rolls_back_batch(self):
+        # 衍生資料與房價在同一個交易中寫入
+        changes = [{'id': self.price(self.package).pk, 'price': '9000'}]
+        prices = grid_prices(room_type__hotel__period__package=self.package)
+        with patch('main.price_grid.refresh_derived_data', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            save_price_changes(prices, changes)
+        self.assertEqual(self.price(self.package).price, '10000')
+
+    def test_invalid_cell_rejects_whole_batch(self):
+        valid, invalid = self.price(self.package), self.price(self.neighbour)
+        changes = [{'id': valid.pk, 'price': '9000'}, {'id': invalid.pk, 'price': '   '}]
+        response = self.post(reverse('admin:main_city_prices', args=[self.city.pk]), changes)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.json()['errors']), [str(invalid.pk)])
+        self.assertEqual(self.price(self.package).price, '10000')
+        self.assertEqual(self.price(self.neighbour).price, '10000')
+
+    def test_price_outside_grid_is_rejected(self):
+        outside = self.price(self.elsewhere)
+        grids = [
+            reverse('admin:main_package_prices', args=[self.package.pk]),
+            reverse('admin:main_city_prices', args=[self.city.pk]),
+        ]
+        changes = [{'id': self.price(self.package).pk, 'price': '9000'}, {'id': outside.pk, 'price': '1'}]
+        for url in grids:
+            with self.subTest(url):
+                response = self.post(url, changes)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['errors'], {str(outside.pk): '找不到此房價'})
+        self.assertEqual(self.price(self.package).price, '10000')
+        self.assertEqual(self.price(self.elsewhere).price, '10000')
+
+    def test_derived_data_is_refreshed(self):
+        changes = [{'id': self.price(self.package).pk, 'price': '7,500'}]
+        self.post(reverse('admin:main_package_prices', args=[self.package.pk]), changes)
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.min_room_price, 7500)
+        self.assertEqual(self.package.card.from_price, 7500)
+        self.neighbour.refresh_from_db()
+        self.assertEqual(self.neighbour.min_room_price, 10000)
+
+    def test_requires_change_permission(self):
+        staff = get_user_model().objects.create_user('staff', password='password', is_staff=True)
+        self.client.force_login(staff)
+        response = self.post(reverse('admin:main_package_prices', args=[self.package.pk]), [])
+        self.assertEqual(response.status_code, 403)
+
+
+class PackageBranchTests(TestCase):
+    """套票編輯頁的子樹展開時才載入（PackageAdmin.branch_view 與 PackageBranchAdmin）"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.city = make_city()
+        cls.package_type = PackageType.objects.create(name='船潛')
+        cls.package = make_package(cls.city, cls.package_type, 'okinawa', days=2, size=2)
+        cls.other = make_package(cls.city, cls.package_type, 'ishigaki', days=1, size=1)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def branch_url(self, package, branch, obj):
+        return reverse('admin:main_package_branch', args=[package.pk, branch, obj.pk])
+
+    def test_branch_renders_inline_for_object(self):
+        period = self.package.periods.order_by('pk').last()
+        response = self.client.get(self.branch_url(self.package, 'period', period))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, '<form')
+        data = form_data(response)
+        prefix = f'period-{period.pk}-hotels'
+        self.assertEqual(
+            {int(data[f'{prefix}-{i}-id'][0]) for i in range(int(data[f'{prefix}-TOTAL_FORMS'][0]))},
+            set(period.hotels.values_list('pk', flat=True)),
+        )
+        self.assertIn(f'{prefix}-0-room_types-0-prices-TOTAL_FORMS', data)
+
+        itinerary = self.package.daily_itineraries.order_by('pk').last()
+        response = self.client.get(self.branch_url(self.package, 'itinerary', itinerary))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'itinerary-{itinerary.pk}-images-TOTAL_FORMS', form_data(response))
+
+    def test_object_from_other_package_is_not_found(self):
+        urls = [
+            self.branch_url(self.package, 'period', self.other.periods.get()),
+            self.branch_url(self.package, 'itinerary', self.other.daily_itineraries.get()),
+            reverse('admin:main_package_branch', args=[self.package.pk, 'hotels', self.package.periods.first().pk]),
+        ]
+        for url in urls:
+            with self.subTest(url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+                self.assertEqual(self.client.post(url).status_code, 404)
+
+    def test_permissions(self):
+        period = self.package.periods.order_by('pk').first()
+        url = self.branch_url(self.package, 'period', period)
+        self.client.logout()
+        self.assertRedirects(self.client.get(url), f"{reverse('admin:login')}?next={url}")
+
+        staff = get_user_model().objects.create_user('staff', password='password', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+        # 只能檢視時可以展開，但不能儲存
+        view_permissions = Permission.objects.filter(codename__startswith='view_', content_type__app_label='main')
+        staff.user_permissions.add(*view_permissions)
+        staff = get_user_model().objects.get(pk=staff.pk)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        price = RoomPrice.objects.filter(room_type__hotel__period=period).order_by('pk').first()
+        prefix = f'period-{period.pk}-hotels'
+        data = {
+            f'{prefix}-TOTAL_FORMS': 1, f'{prefix}-INITIAL_FORMS': 1,
+            f'{prefix}-0-id': price.room_type.hotel_id, f'{prefix}-0-period': period.pk,
+            f'{prefix}-0-hotel_name': '改名',
+        }
+        self.assertEqual(self.client.post(url, data).status_code, 403)
+        self.assertFalse(Hotel.objects.filter(hotel_name='改名').exists())
+
+    def test_change_form_loads_branches_lazily(self):
+        url = reverse('admin:main_package_change', args=[self.package.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for period in self.package.periods.all():
+            self.assertContains(response, f'data-url="{self.branch_url(self.package, "period", period)}"')
+        for itinerary in self.package.daily_itineraries.all():
+            self.assertContains(response, f'data-url="{self.branch_url(self.package, "itinerary", itinerary)}"')
+        data = form_data(response)
+        self.assertFalse([name for name in data if '-hotels-' in name or '-images-' in name])
+
+        # 深層資料不載入，查詢數與子樹大小無關
+        large = make_package(self.city, self.package_type, 'large', days=2, size=3)
+        counts = []
+        for package in (self.package, large):
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('admin:main_package_change', args=[package.pk]))
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class GeographyRegistryTests(TestCase):
+    """其他行程更新地區後，這個行程的登錄表也會重新載入"""
+
+    def test_bump_from_another_process_reloads_registry(self):
+        # 與 settings.py 的檔案快取相同：版本 token 在 CACHE_LOCATION 下的 versions 目錄
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            'default': {'BACKEND': 'main.cache_backends.FileBasedCache', 'LOCATION': location},
+            'versions': {'BACKEND': 'main.cache_backends.FileBasedCache', 'LOCATION': os.path.join(location, 'versions')},
+        }):
+            continent = Continent.objects.create(name='亞洲', name_en='Asia', slug='asia')
+            loaded = geography()
+            # 模擬另一個行程（例如後台）新增國家：這個行程沒有收到信號，版本由另一個行程更新
+            Country.objects.bulk_create([Country(name='日本', name_en='Japan', slug='japan', continent=continent)])
+            self.assertIs(geography(), loaded)
+            subprocess.run(
+                [sys.executable, 'manage.py', 'shell', '-c',
+                 'from main.geography import bump_geography_version; bump_geography_version()'],
+                cwd=settings.BASE_DIR, env={**os.environ, 'CACHE_BACKEND': 'file', 'CACHE_LOCATION': location},
+                check=True, capture_output=True,
+            )
+            self.assertEqual(resolve_regions('asia', 'japan')[1].name, '日本')
+
+
+class BackgroundJobInvalidationTests(TestCase):
+    """背景工作（run_worker）儲存的資料會讓已快取的頁面失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = make_package(make_city(), PackageType.objects.create(name='船潛'), 'okinawa', days=1, size=1)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ai_description_invalidates_cached_detail_page(self):
+        url = self.package.card.detail_url
+        self.assertNotContains(self.client.get(url), 'AI 產生的描述')
+        with patch('main.tasks.generate_content_with_perplexity', return_value=('<p>AI 產生的描述</p>', None)), \
+                self.captureOnCommitCallbacks(execute=True):
+            get_task('generate_ai_description')(package_id=self.package.pk, prompt='介紹沖繩')
+        self.assertContains(self.client.get(url), 'AI 產生的描述')
+
+    def test_hero_derivatives_expire_cached_homepage(self):
+        homepage = HomepageSettings.objects.create()
+        slide = HeroSlide.objects.create(settings=homepage, title='1', image=make_filer_image('hero'))
+        get_homepage()
+        self.assertFalse(_is_stale(cache.get(HOMEPAGE_CACHE_KEY)))
+        with patch('main.tasks.generate_for_instance', return_value=2):
+            get_task('generate_image_derivatives')(model='homepage.HeroSlide', pk=slide.pk)
+        self.assertTrue(_is_stale(cache.get(HOMEPAGE_CACHE_KEY)))
+
+
+    def test_ai_description_keeps_later_admin_edits(self):
+        job = enqueue('generate_ai_description', {'package_id': self.package.pk, 'prompt': '介紹沖繩'})
+        # 工作讀取套票之後、寫回之前，後台修改了套票的其他欄位
+        loaded = Package.objects.get(pk=self.package.pk)
+        Package.objects.filter(pk=self.package.pk).update(name='沖繩（已修改）')
+        with patch('main.tasks.generate_content_with_perplexity', return_value=('<p>AI 產生的描述</p>', None)), \
+                patch.object(Package.objects, 'get', return_value=loaded), patch('main.jobs.close_old_connections'):
+            execute_job(job.pk)
+        self.package.refresh_from_db()
+        self.assertEqual(self.package.name, '沖繩（已修改）')
+        self.assertEqual(self.package.description, '<p>AI 產生的描述</p>')
+
+
+@patch('main.jobs.close_old_connections')
+class JobQueueTests(TestCase):
+    """以資料庫為佇列的背景工作：搶占、重試、逾時重新排入與後台重新執行"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def enqueue_failing_job(self):
+        return enqueue('generate_ai_description', {'package_id': 0, 'prompt': '介紹沖繩'})
+
+    def run_claimed(self, worker_id='worker'):
+        with patch('main.tasks.generate_content_with_perplexity', return_value=(None, 'API 錯誤')), \
+                self.assertLogs('main.jobs', 'ERROR'):
+            return [execute_job(job.pk) for job in claim_jobs(worker_id, 10)]
+
+    def test_claimed_job_is_not_claimed_again(self, _):
+        first = enqueue('copy_packages', {'package_ids': []})
+        second = enqueue('copy_packages', {'package_ids': []})
+        self.assertEqual([job.pk for job in claim_jobs('a', 1)], [first.pk])
+        self.assertEqual([job.pk for job in claim_jobs('b', 10)], [second.pk])
+        self.assertEqual(claim_jobs('c', 10), [])
+        self.assertEqual(Job.objects.get(pk=first.pk).locked_by, 'a')
+
+    def test_failed_job_is_retried_with_backoff(self, _):
+        job = self.enqueue_failing_job()
+        self.assertEqual(job.max_attempts, 2)
+
+        before = timezone.now()
+        self.assertEqual(self.run_claimed(), [Job.STATUS_PENDING])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 1)
+        self.assertGreaterEqual(job.run_after, before + timedelta(seconds=RETRY_DELAY_SECONDS))
+        self.assertIn('API 錯誤', job.error)
+        # 等待時間未到，不會被取得
+        self.assertEqual(claim_jobs('worker', 10), [])
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        self.assertEqual(self.run_claimed(), [Job.STATUS_FAILED])
+        job.refresh_from_db()
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_stale_running_job_is_requeued(self, _):
+        stale = enqueue('copy_packages', {'package_ids': []})
+        fresh = enqueue('copy_packages', {'package_ids': []})
+        claim_jobs('crashed', 10)
+        Job.objects.filter(pk=stale.pk).update(locked_at=timezone.now() - STALE_JOB_TIMEOUT - timedelta(minutes=1))
+
+        self.assertEqual(requeue_stale_jobs(), 1)
+        self.assertEqual([job.pk for job in claim_jobs('worker', 10)], [stale.pk])
+        self.assertEqual(Job.objects.get(pk=fresh.pk).locked_by, 'crashed')
+
+    def test_heartbeat_keeps_long_running_job_claimed(self, _):
+        job = enqueue('prebuild_itinerary_pdfs', {})
+        claim_jobs('busy', 10)
+        Job.objects.filter(pk=job.pk).update(locked_at=timezone.now() - STALE_JOB_TIMEOUT - timedelta(minutes=1))
+        # 其他 worker 的心跳不會更新這筆工作
+        self.assertEqual(heartbeat('other', [job.pk]), 0)
+        self.assertEqual(heartbeat('busy', [job.pk]), 1)
+
+        self.assertEqual(requeue_stale_jobs(), 0)
+        self.assertEqual(claim_jobs('other', 10), [])
+        self.assertEqual(Job.objects.get(pk=job.pk).locked_by, 'busy')
+
+    def test_retry_jobs_action(self, _):
+        failed = self.enqueue_failing_job()
+        Job.objects.filter(pk=failed.pk).update(status=Job.STATUS_FAILED, attempts=2, finished_at=timezone.now())
+        succeeded = enqueue('copy_packages', {'package_ids': []})
+        Job.objects.filter(pk=succeeded.pk).update(status=Job.STATUS_SUCCEEDED)
+
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:main_job_changelist'), {
+            'action': 'retry_jobs', '_selected_action': [failed.pk, succeeded.pk],
+        })
+        self.assertEqual(response.status_code, 302)
+        failed.refresh_from_db()
+        self.assertEqual((failed.status, failed.attempts, failed.finished_at), (Job.STATUS_PENDING, 0, None))
+        self.assertEqual(Job.objects.get(pk=succeeded.pk).status, Job.STATUS_SUCCEEDED)
+        self.assertEqual([job.pk for job in claim_jobs('worker', 10)], [failed.pk])
+
+    def test_empty_card_table_enqueues_rebuild_on_migrate(self, _):
+        enqueue_rebuild = import_module('main.migrations.0038_enqueue_package_card_rebuild').enqueue_card_rebuild
+        schema_editor = SimpleNamespace(connection=connection)
+        enqueue_rebuild(apps, schema_editor)
+        self.assertFalse(Job.objects.filter(task='rebuild_package_cards').exists())
+
+        make_package(make_city(), PackageType.objects.create(name='船潛'), 'okinawa')
+        PackageCard.objects.all().delete()
+        with self.assertLogs('main.migrations', 'WARNING'):
+            enqueue_rebuild(apps, schema_editor)
+        rebuild = Job.objects.get(task='rebuild_package_cards')
+        self.assertEqual(execute_job(rebuild.pk), Job.STATUS_SUCCEEDED)
+        self.assertEqual(PackageCard.objects.count(), 1)
+
+        enqueue_rebuild(apps, schema_editor)
+        self.assertEqual(Job.objects.filter(task='rebuild_package_cards').count(), 1)
+
+
+@skipUnless(connection.features.has_select_for_update_skip_locked, '資料庫不支援 SELECT ... FOR UPDATE SKIP LOCKED')
+class JobClaimSkipLockedTests(TransactionTestCase):
+    """另一個 worker 鎖住的工作直接略過，不需等待"""
+
+    def test_locked_job_is_skipped(self):
+        first = enqueue('copy_packages', {'package_ids': []})
+        second = enqueue('copy_packages', {'package_ids': []})
+        locked, release = threading.Event(), threading.Event()
+
+        def hold_lock():
+            try:
+                with transaction.atomic():
+                    Job.objects.select_for_update().get(pk=first.pk)
+                    locked.set()
+                    release.wait(10)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold_lock)
+        holder.start()
+        try:
+            locked.wait(10)
+            self.assertEqual([job.pk for job in claim_jobs('worker', 10)], [second.pk])
+        finally:
+            release.set()
+            holder.join()
+
+
+class RequestTimingTests(TestCase):
+    """抽樣請求的 Server-Timing 標頭與管理後台的計時統計"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        cache.clear()
+        timing.reset()
+        self.addCleanup(timing.reset)
+
+    def server_timing(self, response):
+        """{'sql': 毫秒, ...}"""
+        return {
+            name: float(duration)
+            for name, duration in re.findall(r'(\w+);dur=([\d.]+)', response.get('Server-Timing', ''))
+        }
+
+    def test_sample_rate(self):
+        with override_settings(REQUEST_TIMING_SAMPLE_RATE=0):
+            self.assertFalse(self.client.get(reverse('main:package_list')).has_header('Server-Timing'))
+        self.assertEqual(timing.endpoint_stats(), [])
+
+        # 不讀取上一個請求存入的整頁快取
+        cache.clear()
+        with override_settings(REQUEST_TIMING_SAMPLE_RATE=1):
+            response = self.client.get(reverse('main:package_list'))
+        self.assertEqual(set(self.server_timing(response)), {'sql', 'tpl', 'view', 'total'})
+        self.assertRegex(response['Server-Timing'], r'desc="[1-9]\d* queries"')
+        self.assertEqual([row['endpoint'] for row in timing.endpoint_stats()], ['main:package_list'])
+
+    def test_view_time_excludes_response_middleware(self):
+        def view(request):
+            view_middleware.process_view(request, view, (), {})
+            return HttpResponse()
+
+        def slow_response_middleware(request):
+            response = view_middleware(request)
+            time.sleep(0.2)
+            return response
+
+        view_middleware = RequestTimingViewMiddleware(view)
+        with override_settings(REQUEST_TIMING_SAMPLE_RATE=1):
+            response = RequestTimingMiddleware(slow_response_middleware)(RequestFactory().get('/'))
+        durations = self.server_timing(response)
+        self.assertGreaterEqual(durations['total'], 200)
+        self.assertLess(durations['view'], 100)
+
+    def test_request_timing_view(self):
+        url = reverse('request_timing')
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        with override_settings(REQUEST_TIMING_SAMPLE_RATE=1):
+            self.client.get(reverse('main:package_list'))
+        self.client.force_login(self.user)
+        self.assertContains(self.client.get(url), 'main:package_list')
+
+        self.assertRedirects(self.client.post(url), url)
+        self.assertEqual(timing.endpoint_stats(), [])
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    """頁面快取的失效需要所有行程共用同一個快取"""
+
+    def test_process_local_cache_is_rejected(self):
+        locmem = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+        with override_settings(CACHES={'default': locmem}):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['main.E001'])
+        with override_settings(CACHES={'default': settings.CACHES['default'], 'versions': locmem}):
+            self.assertEqual([error.id for error in check_shared_cache(None)], ['main.E001'])
+        self.assertEqual(check_shared_cache(None), [])
+
+
+class FileCacheBackendTests(SimpleTestCase):
+    """檔案快取：寫入不必每次列出整個目錄，版本 token 不會被清除"""
+
+    def test_cull_runs_at_most_once_per_interval(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = FileBasedCache(location, {'OPTIONS': {'MAX_ENTRIES': 5, 'CULL_INTERVAL': 60}})
+            with patch.object(backend, '_list_cache_files', wraps=backend._list_cache_files) as listed:
+                for i in range(20):
+                    backend.set(f'page-{i}', i)
+            self.assertEqual(listed.call_count, 1)
+
+    def test_version_tokens_are_never_culled(self):
+        with tempfile.TemporaryDirectory() as location:
+            backend = FileBasedCache(location, {'TIMEOUT': None, 'OPTIONS': {'MAX_ENTRIES': 5, 'CULL': False}})
+            for i in range(20):
+                backend.set(f'token-{i}', i)
+            self.assertEqual(len(backend.get_many([f'token-{i}' for i in range(20)])), 20)
+
+    def test_tests_do_not_use_the_configured_cache_directory(self):
+        self.assertNotEqual(settings.CACHES['default']['LOCATION'], str(settings.BASE_DIR / '.cache'))
+
+
+class SingleFlightTests(SimpleTestCase):
+    """快取未命中時，同時進來的請求只重建一次"""
+
+    WORKERS = 8
+
+    def run_concurrently(self, stale=None):
+        cache.clear()
+        builds = []
+        barrier = threading.Barrier(self.WORKERS)
+
+        def build():
+            builds.append(1)
+            time.sleep(0.3)
+            cache.set('single-flight-test', 'rebuilt')
+            return 'rebuilt'
+
+        def request():
+            barrier.wait()
+            return single_flight('test', build, lambda: cache.get('single-flight-test'), stale=stale)
+
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            results = list(pool.map(lambda _: request(), range(self.WORKERS)))
+        return len(builds), results
+
+    def backends(self):
+        """本機記憶體（cache.add 的鎖）與檔案快取（鎖檔）"""
+        yield 'locmem', {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'single-flight'}
+        with tempfile.TemporaryDirectory() as location:
+            yield 'file', {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}
+
+    def test_rebuild_runs_once_while_others_wait(self):
+        for name, backend in self.backends():
+            with self.subTest(name), override_settings(CACHES={'default': backend}):
+                builds, results = self.run_concurrently()
+                self.assertEqual(builds, 1)
+                self.assertEqual(results, ['rebuilt'] * self.WORKERS)
+
+    def test_waiters_serve_stale_data(self):
+        for name, backend in self.backends():
+            with self.subTest(name), override_settings(CACHES={'default': backend}):
+                builds, results = self.run_concurrently(stale='stale')
+                self.assertEqual(builds, 1)
+                self.assertEqual(sorted(results), ['rebuilt'] + ['stale'] * (self.WORKERS - 1))
+
+    @override_settings(SINGLE_FLIGHT_WAIT_TIMEOUT=0.2)
+    def test_waiters_give_up_without_building(self):
+        for name, backend in self.backends():
+            with self.subTest(name), override_settings(CACHES={'default': backend}):
+                holder = get_lock('slow')
+                self.assertTrue(holder.acquire())
+                try:
+                    with self.assertRaises(SingleFlightTimeout):
+                        single_flight('slow', lambda: self.fail('沒有鎖時不可重建'), lambda: None)
+                finally:
+                    holder.release()
+
+        response = SingleFlightTimeoutMiddleware(None).process_exception(None, SingleFlightTimeout('slow'))
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '1'))
+
+    def test_file_lock(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location,
+        }}):
+            first, second = get_lock('key'), get_lock('key')
+            self.assertTrue(first.acquire())
+            self.assertFalse(second.acquire())
+            self.assertTrue(second.is_held())
+            first.release()
+            self.assertFalse(second.is_held())
+            self.assertTrue(second.acquire())
+
+            # 持有鎖的行程中止（沒有呼叫 release）時，作業系統釋放鎖，鎖檔留在原處
+            os.close(second.fd)
+            third = get_lock('key')
+            self.assertFalse(third.is_held())
+            self.assertTrue(third.acquire())
+            self.assertFalse(get_lock('key').acquire())
+            third.release()
+
+
+class HomepageCacheTests(SimpleTestCase):
+    """首頁 stale-while-revalidate：過期時提供舊頁面並只在背景重建一次，沒有快取時只同步產生一次"""
+
+    WORKERS = 8
+
+    def setUp(self):
+        cache.clear()
+        self.builds = []
+        self.release = threading.Event()
+        patcher = patch('homepage.cache.rebuild_homepage', self.rebuild)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.release.set)
+
+    def rebuild(self):
+        self.builds.append(1)
+        self.release.wait(5)
+        entry = {'content': 'rebuilt', 'built_at': time.time(), 'versions': {}}
+        cache.set(HOMEPAGE_CACHE_KEY, entry, timeout=None)
+        return entry
+
+    def wait_for_refresh(self):
+        deadline = time.monotonic() + 5
+        while get_lock(HOMEPAGE_REFRESH_LOCK_KEY).is_held() and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def test_stale_page_is_served_while_one_refresh_runs(self):
+        cache.set(HOMEPAGE_CACHE_KEY, {'content': 'stale', 'built_at': 0, 'versions': {}}, timeout=None)
+        self.assertEqual([get_homepage() for _ in range(self.WORKERS)], ['stale'] * self.WORKERS)
+        self.release.set()
+        self.wait_for_refresh()
+        self.assertEqual(len(self.builds), 1)
+        self.assertEqual(get_homepage(), 'rebuilt')
+
+    def test_refresh_lock_dedupes_refreshes(self):
+        # 與其他行程相同的鎖（檔案快取為鎖檔），而非先檢查再寫入的 cache.add
+        holder = get_lock(HOMEPAGE_REFRESH_LOCK_KEY)
+        self.assertTrue(holder.acquire())
+        self.assertFalse(refresh_homepage())
+        holder.release()
+        self.assertTrue(refresh_homepage())
+        self.assertFalse(refresh_homepage())
+        self.release.set()
+        self.wait_for_refresh()
+        self.assertEqual(len(self.builds), 1)
+
+    def test_concurrent_stale_hits_start_one_daemon_refresh(self):
+        barrier = threading.Barrier(self.WORKERS)
+
+        def request():
+            barrier.wait()
+            return refresh_homepage()
+
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            started = list(pool.map(lambda _: request(), range(self.WORKERS)))
+        self.assertEqual(started.count(True), 1)
+        refreshes = [thread for thread in threading.enumerate() if thread.name == 'homepage-refresh']
+        self.assertTrue(refreshes and all(thread.daemon for thread in refreshes))
+        self.release.set()
+        self.wait_for_refresh()
+        self.assertEqual(len(self.builds), 1)
+
+    def test_cold_cache_is_built_once(self):
+        # 重建需要一段時間，其他請求在這段期間進來
+        threading.Timer(0.3, self.release.set).start()
+        barrier = threading.Barrier(self.WORKERS)
+
+        def request():
+            barrier.wait()
+            return get_homepage()
+
+        with ThreadPoolExecutor(self.WORKERS) as pool:
+            results = list(pool.map(lambda _: request(), range(self.WORKERS)))
+        self.assertEqual(len(self.builds), 1)
+        self.assertEqual(results, ['rebuilt'] * self.WORKERS)
+
+
+@override_settings(DATABASE_READ_REPLICA='replica')
+class ReplicaRoutingTests(SimpleTestCase):
+    """公開頁面讀取複本，後台與工作人員剛寫入後讀取主資料庫"""
+
+    def route(self, request, view):
+        """以 view 處理 request，回傳 (請求中的讀取來源, 回應)"""
+        seen = []
+
+        def get_response(request):
+            middleware.process_view(request, view, (), {})
+            seen.append(router.db_for_read(Package))
+            # 登入狀態不受複本延遲影響
+            self.assertEqual(router.db_for_read(Session), 'default')
+            return HttpResponse()
+
+        middleware = ReplicaRoutingMiddleware(get_response)
+        response = middleware(request)
+        self.assertEqual(router.db_for_read(Package), 'default')
+        return seen[0], response
+
+    def test_public_reads_use_replica(self):
+        request = RequestFactory().get('/packages/')
+        request.user = AnonymousUser()
+        self.assertEqual(self.route(request, main_views.package_list)[0], 'replica')
+        self.assertEqual(self.route(request, admin.site.index)[0], 'default')
+
+    def test_staff_reads_primary_after_writing(self):
+        staff = SimpleNamespace(is_staff=True, is_authenticated=True)
+        request = RequestFactory().post('/admin/main/package/1/change/')
+        request.user = staff
+        _, response = self.route(request, admin.site.index)
+        cookie = response.cookies[STICKY_COOKIE_NAME]
+
+        request = RequestFactory().get('/packages/')
+        request.user = staff
+        request.COOKIES[STICKY_COOKIE_NAME] = cookie.value
+        self.assertEqual(self.route(request, main_views.package_list)[0], 'default')
+
+
+@tag('query_plan')
+class QueryPlanTests(TestCase):
+    """
+    公開頁面的查詢在大型目錄上不可退化成全表掃描。
+
+    預設建立 2000 個套票，隨一般測試執行；CI 以環境變數 QUERY_PLAN_PACKAGES=50000
+    在大型目錄上另外執行（manage.py test --tag query_plan，約需 1～2 分鐘）。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(packages=int(os.environ.get('QUERY_PLAN_PACKAGES', 2000)))
+        cls.package = (
+            Package.objects.filter(is_active=True)
+            .select_related('city__country__continent')
+            .order_by('pk')[10]
+        )
+
+    def test_public_queries_use_indexes(self):
+        for label, queryset in public_queries(self.package):
+            with self.subTest(label):
+                self.assertEqual(full_table_scans(queryset), [])
+
+    @primary_database_only
+    def test_detail_queries_match_the_view(self):
+        """public_queries() 的詳情 prefetch 必須是詳情頁實際執行的查詢"""
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.client.get(self.package.get_absolute_url()).status_code, 200)
+        executed = {query['sql'] for query in captured.captured_queries}
+        for label, queryset in public_queries(self.package):
+            if label.startswith('detail.') and label not in ('detail.package', 'detail.tags'):
+                with self.subTest(label):
+                    self.assertIn(str(queryset.query), executed)
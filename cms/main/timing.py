@@ -0,0 +1,215 @@
+"""
+請求計時（SQL / 樣板 / view）
+
+RequestTimingMiddleware 依 REQUEST_TIMING_SAMPLE_RATE 抽樣請求，被抽中的請求會：
+
+- 以 connection.execute_wrapper 記錄查詢數、SQL 總時間與最慢的幾個查詢
+- 記錄樣板渲染時間（Django 樣板後端的 Template.render）與 view 時間
+  （view 時間由放在 MIDDLEWARE 最後一個的 RequestTimingViewMiddleware 量測，不含外層 middleware）
+- 在回應加上 Server-Timing 標頭（瀏覽器開發者工具的 Timing 分頁可直接看到）
+- 將結果加入各端點的滾動視窗，於管理後台「請求計時」頁面顯示延遲百分位數
+
+未被抽中的請求只多一次亂數判斷。統計資料存在各行程的記憶體中，
+多個 gunicorn worker 各自統計，重新啟動後清空。
+"""
+import heapq
+import random
+import threading
+from collections import defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template as DjangoBackendTemplate
+
+# 目前請求的計時紀錄（未抽樣時為 None）
+_current = ContextVar('request_timing', default=None)
+
+_lock = threading.Lock()
+_samples = defaultdict(deque)
+_slow_queries = defaultdict(list)
+
+
+def sample_rate():
+    return getattr(settings, 'REQUEST_TIMING_SAMPLE_RATE', 0.0)
+
+
+class RequestTiming:
+    """單一請求的計時資料"""
+
+    def __init__(self, slowest=3):
+        self.slowest = slowest
+        self.query_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.view_time = 0.0
+        self.total_time = 0.0
+        self.slow_queries = []  # [(秒數, SQL), ...] 以 heap 保留最慢的幾個
+        self._template_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """connection.execute_wrapper 的掛勾"""
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = perf_counter() - start
+            self.query_count += 1
+            self.sql_time += duration
+            entry = (duration, sql[:500])
+            if len(self.slow_queries) < self.slowest:
+                heapq.heappush(self.slow_queries, entry)
+            elif duration > self.slow_queries[0][0]:
+                heapq.heapreplace(self.slow_queries, entry)
+
+    def server_timing(self):
+        """Server-Timing 標頭內容（毫秒）"""
+        return ', '.join([
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.query_count} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'view;dur={self.view_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+
+
+def _timed_render(render):
+    """包裝樣板後端的 render()；巢狀渲染（樣板標籤內再 render）只計算最外層"""
+    def wrapper(self, *args, **kwargs):
+        timing = _current.get()
+        if timing is None:
+            return render(self, *args, **kwargs)
+        timing._template_depth += 1
+        start = perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            timing._template_depth -= 1
+            if not timing._template_depth:
+                timing.template_time += perf_counter() - start
+    wrapper._request_timing = True
+    return wrapper
+
+
+def install_template_timer():
+    if not getattr(DjangoBackendTemplate.render, '_request_timing', False):
+        DjangoBackendTemplate.render = _timed_render(DjangoBackendTemplate.render)
+
+
+def endpoint_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '(未解析)'
+    return match.view_name or match._func_path
+
+
+def record(endpoint, timing):
+    """將一次請求加入端點的滾動視窗"""
+    window = getattr(settings, 'REQUEST_TIMING_WINDOW', 1000)
+    keep = getattr(settings, 'REQUEST_TIMING_SLOW_QUERIES', 10)
+    with _lock:
+        samples = _samples[endpoint]
+        samples.append((timing.total_time, timing.view_time, timing.sql_time, timing.template_time, timing.query_count))
+        while len(samples) > window:
+            samples.popleft()
+        slow = _slow_queries[endpoint]
+        for entry in timing.slow_queries:
+            if len(slow) < keep:
+                heapq.heappush(slow, entry)
+            elif entry[0] > slow[0][0]:
+                heapq.heapreplace(slow, entry)
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _slow_queries.clear()
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def endpoint_stats():
+    """各端點的延遲統計（毫秒），依 p95 由慢到快排序"""
+    with _lock:
+        snapshot = {endpoint: list(samples) for endpoint, samples in _samples.items()}
+        slow = {endpoint: sorted(entries, reverse=True) for endpoint, entries in _slow_queries.items()}
+
+    stats = []
+    for endpoint, samples in snapshot.items():
+        if not samples:
+            continue
+        count = len(samples)
+        totals = sorted(sample[0] for sample in samples)
+        stats.append({
+            'endpoint': endpoint,
+            'count': count,
+            'p50': percentile(totals, 0.5) * 1000,
+            'p95': percentile(totals, 0.95) * 1000,
+            'p99': percentile(totals, 0.99) * 1000,
+            'max': totals[-1] * 1000,
+            'view': sum(sample[1] for sample in samples) / count * 1000,
+            'sql': sum(sample[2] for sample in samples) / count * 1000,
+            'template': sum(sample[3] for sample in samples) / count * 1000,
+            'queries': sum(sample[4] for sample in samples) / count,
+            'slow_queries': [(duration * 1000, sql) for duration, sql in slow.get(endpoint, [])],
+        })
+    stats.sort(key=lambda row: row['p95'], reverse=True)
+    return stats
+
+
+class RequestTimingMiddleware:
+    """
+    抽樣計時的 middleware，建議放在 MIDDLEWARE 的第一個，計入其他 middleware 的時間。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_timer()
+
+    def __call__(self, request):
+        rate = sample_rate()
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        timing = RequestTiming(slowest=getattr(settings, 'REQUEST_TIMING_SLOW_QUERIES', 10))
+        token = _current.set(timing)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        timing.total_time = perf_counter() - start
+
+        response['Server-Timing'] = timing.server_timing()
+        record(endpoint_name(request), timing)
+        return response
+
+
+class RequestTimingViewMiddleware:
+    """
+    量測抽樣請求的 view 時間，需放在 MIDDLEWARE 的最後一個：
+    從最後一個 process_view 到 view 回應（含 TemplateResponse 的渲染），不含其他 middleware 處理回應的時間。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = _current.get()
+        response = self.get_response(request)
+        view_start = getattr(request, '_timing_view_start', None)
+        if timing is not None and view_start is not None:
+            timing.view_time = perf_counter() - view_start
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if _current.get() is not None:
+            request._timing_view_start = perf_counter()
+        return None
@@ -0,0 +1,260 @@
+"""
+套票子樹的批次儲存
+
+管理後台儲存套票（或展開的子樹）時，nested_admin 的 formset.save() 會對每一列各查詢兩次再逐列 save()，
+每列的 post_save 又各自重算最低房價、卡片、全文索引與頁面快取。這裡改為比對後批次寫入：
+
+- 巢狀 formset 以 BatchedInlineFormSet 載入：同一層的資料一個查詢，未變更的列不驗證
+- 只處理有變更、新增或刪除的表單，未變更的列不讀也不寫
+- 同一模型的新增 / 修改以 bulk_create / bulk_update 一次寫入；上層先寫，新增的上層取得 pk 後再寫下層
+- 刪除時每個模型一個 delete()（串聯刪除照常執行，子資料的信號在 batched_package_children 中不逐列處理）
+- 行程相片「每個行程只有一張主要相片」的規則以一個 UPDATE 處理
+- 最後依受影響的套票批次更新最低房價、卡片、全文索引與頁面快取，並為新圖片排入衍生檔工作
+
+bulk 寫入不會呼叫 save() 也不會送出 post_save，save() 與信號中的工作在這裡直接處理。
+PackageAdmin / PackageBranchAdmin 的 save_related 使用 save_formsets。
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import FileField
+from django.forms.models import BaseInlineFormSet
+from nested_admin.formsets import NestedInlineFormSet
+
+from .fulltext import refresh_search_documents
+from .images import source_aliases
+from .models import DailyItinerary, Hotel, ItineraryImage, Package, Period, RoomPrice, RoomType
+from .page_cache import bump_dependencies, dependency_key
+from .pricing import parse_price, update_min_room_prices
+from .read_models import refresh_package_cards
+from .signals import PACKAGE_CHILD_PATHS, batched_package_children, schedule_image_derivatives
+
+# 影響最低房價與全文索引的模型（與 signals.py 中的信號相同）
+MIN_PRICE_MODELS = {Period, Hotel, RoomType, RoomPrice}
+SEARCH_MODELS = {Period, Hotel, DailyItinerary}
+
+
+class BatchedInlineFormSet(NestedInlineFormSet):
+    """
+    巢狀 inline formset：同一層的所有 formset 共用一個查詢，送出時未變更的列不驗證。
+
+    nested_admin 對每個巢狀 formset 各查詢一次，驗證時 id 與外鍵欄位又對每一列各查詢一次，
+    儲存 100 列的子樹光驗證就需要上百個查詢。這裡以上一層所有資料的 id 一次載入這一層，
+    依外鍵分組後交給各個 formset（使用 inline 的 get_queryset，保留 select_related 與排序）；
+    既有的列與額外表單一樣設為 empty_permitted，沒有變更就略過驗證（也不會被儲存）。
+    """
+
+    def __init__(self, *args, queryset=None, **kwargs):
+        self.base_queryset = queryset if queryset is not None else self.model._default_manager.all()
+        super().__init__(*args, queryset=queryset, **kwargs)
+
+    def _construct_form(self, i, **kwargs):
+        form = super()._construct_form(i, **kwargs)
+        if self.is_bound and i < self.initial_form_count():
+            form.empty_permitted = True
+        return form
+
+    def _level_rows(self):
+        """這一層的所有資料 {上層 id: [資料, ...]}，快取在最上層的 formset 上"""
+        parent_formset = self.parent_form.parent_formset
+        root = parent_formset
+        while getattr(root, 'parent_form', None) is not None:
+            root = root.parent_form.parent_formset
+        cache = root.__dict__.setdefault('_nested_rows', {})
+        key = (parent_formset.model, self.model, self.fk.name)
+        if key not in cache:
+            if isinstance(parent_formset, BatchedInlineFormSet) and getattr(parent_formset, 'parent_form', None) is not None:
+                parents = [row for rows in parent_formset._level_rows().values() for row in rows]
+            else:
+                parents = parent_formset.get_queryset()
+            queryset = self.base_queryset
+            if not queryset.ordered:
+                queryset = queryset.order_by(self.model._meta.pk.name)
+            grouped = defaultdict(list)
+            for row in queryset.filter(**{f'{self.fk.name}__in': [obj.pk for obj in parents]}):
+                grouped[getattr(row, self.fk.attname)].append(row)
+            cache[key] = grouped
+        return cache[key]
+
+    def get_queryset(self):
+        if self.instance.pk is None:
+            return super().get_queryset()
+        if not hasattr(self, '_batched_rows'):
+            if getattr(self, 'parent_form', None) is None:
+                # 最上層照 Django 原本的查詢（nested_admin 送出時改用預設 manager，會失去 select_related）
+                rows = BaseInlineFormSet.get_queryset(self)
+            else:
+                rows = self._level_rows().get(self.instance.pk, [])
+            if self.is_bound:
+                # 與 nested_admin 相同，只使用表單送出的資料
+                posted = {
+                    self.data.get(f'{self.add_prefix(i)}-{self.model._meta.pk.name}')
+                    for i in range(self.initial_form_count())
+                }
+                rows = [row for row in rows if str(row.pk) in posted]
+            self._batched_rows = rows
+        return self._batched_rows
+
+
+def _should_delete(formset, form):
+    return formset.can_delete and formset._should_delete_form(form)
+
+
+def _inside_deleted_form(formset):
+    """巢狀 formset 的上層表單（任一層）被刪除時，整個 formset 隨串聯刪除，不需處理"""
+    form = getattr(formset, 'parent_form', None)
+    while form is not None:
+        parent = form.parent_formset
+        if _should_delete(parent, form):
+            return True
+        form = getattr(parent, 'parent_form', None)
+    return False
+
+
+def _is_changed(formset, form):
+    # 新增的上層只有下層有資料時，nested_admin 的 all_valid 會把它標示為已變更
+    return not _should_delete(formset, form) and form.has_changed()
+
+
+def _pre_save(model, objs, fields=()):
+    """
+    bulk 寫入不會呼叫 save()：在這裡解析價格；
+    bulk_update 也不會呼叫 pre_save()，修改的列另外套用 auto_now 與上傳檔案
+    """
+    for obj in objs:
+        if model is RoomPrice:
+            obj.price_amount, obj.price_currency = parse_price(obj.price)
+        for field in fields:
+            if getattr(field, 'auto_now', False) or isinstance(field, FileField):
+                setattr(obj, field.attname, field.pre_save(obj, False))
+
+
+def _package_ids(rows):
+    """{模型: [資料, ...]} 所屬的套票 id；由外鍵往上查，每個模型最多一個查詢"""
+    package_ids = set()
+    for model, objs in rows.items():
+        lookup_model, fk_field, path = PACKAGE_CHILD_PATHS[model]
+        fk_values = {getattr(obj, fk_field) for obj in objs}
+        if lookup_model is None:
+            package_ids.update(fk_values)
+        elif fk_values:
+            package_ids.update(lookup_model.objects.filter(pk__in=fk_values).values_list(path, flat=True))
+    package_ids.discard(None)
+    return package_ids
+
+
+def save_formsets(formsets):
+    """
+    儲存（巢狀）inline formset 並回傳受影響的套票 id。
+
+    formsets 需依上層在前的順序排列（與 ModelAdmin._create_formsets 相同），且都已通過驗證；
+    與 formset.save() 相同，會設定 new_objects / changed_objects / deleted_objects 供管理後台記錄異動。
+    """
+    models = []
+    creates = defaultdict(list)
+    updates = defaultdict(dict)
+    update_fields = defaultdict(set)
+    deletes = defaultdict(list)
+    images = defaultdict(list)  # 圖片有變更、需要檢查衍生檔的列
+    featured = {}  # 行程 → 最後一張設為主要相片的相片（與逐列 save() 的結果相同）
+
+    for formset in formsets:
+        formset.new_objects, formset.changed_objects, formset.deleted_objects = [], [], []
+        if _inside_deleted_form(formset):
+            continue
+        model = formset.model
+        if model not in models:
+            models.append(model)
+        image_fields = {field for field, _ in source_aliases(model)}
+
+        for index, form in enumerate(formset.forms):
+            is_initial = index < formset.initial_form_count()
+            if _should_delete(formset, form):
+                if is_initial and form.instance.pk is not None:
+                    deletes[model].append(form.instance)
+                    formset.deleted_objects.append(form.instance)
+                continue
+            if not _is_changed(formset, form):
+                continue
+
+            setattr(form.instance, formset.fk.name, formset.instance)
+            obj = form.save(commit=False)
+            if is_initial:
+                updates[model][obj.pk] = obj
+                update_fields[model].update(form.changed_data)
+                formset.changed_objects.append((obj, form.changed_data))
+            else:
+                creates[model].append(obj)
+                formset.new_objects.append(obj)
+            if image_fields and (not is_initial or image_fields & set(form.changed_data)):
+                images[model].append(obj)
+            if model is ItineraryImage and obj.is_featured:
+                featured[obj.itinerary_id or id(obj.itinerary)] = obj
+
+    with transaction.atomic(), batched_package_children():
+        # 被刪除的列要在刪除前找出所屬套票（上層可能一起被刪除）
+        package_ids = _package_ids(deletes)
+        row_keys = []
+        for model, objs in deletes.items():
+            model.objects.filter(pk__in=[obj.pk for obj in objs]).delete()
+            row_keys += [dependency_key(model, obj.pk) for obj in objs]
+
+        for model in models:
+            if creates[model]:
+                _pre_save(model, creates[model])
+                model.objects.bulk_create(creates[model])
+            if updates[model]:
+                fields = [
+                    field for field in model._meta.concrete_fields
+                    if not field.primary_key and (
+                        field.name in update_fields[model] or getattr(field, 'auto_now', False)
+                    )
+                ]
+                _pre_save(model, updates[model].values(), fields)
+                names = [field.name for field in fields]
+                if model is RoomPrice and 'price' in names:
+                    names += ['price_amount', 'price_currency']
+                model.objects.bulk_update(updates[model].values(), names)
+            row_keys += [dependency_key(model, pk) for pk in updates[model]]
+
+        if featured:
+            winners = list(featured.values())
+            ItineraryImage.objects.filter(
+                itinerary_id__in={image.itinerary_id for image in winners}, is_featured=True,
+            ).exclude(pk__in=[image.pk for image in winners]).update(is_featured=False)
+
+        written = {model: creates[model] + list(updates[model].values()) for model in models}
+        package_ids |= _package_ids(written)
+        touched = {model for model in models if written[model]} | set(deletes)
+        if package_ids:
+            refresh_derived_data(package_ids, touched, row_keys)
+
+        for model, objs in images.items():
+            for obj in objs:
+                transaction.on_commit(lambda model=model, obj=obj: schedule_image_derivatives(model, obj))
+
+    return package_ids
+
+
+def refresh_derived_data(package_ids, models, row_keys=()):
+    """
+    取代逐列 post_save 的工作：每個套票只重算一次。
+
+    models 為有寫入的子資料模型（決定要更新哪些衍生資料），row_keys 為修改過的資料列的頁面快取相依鍵。
+    """
+    cards = set(package_ids) if DailyItinerary in models else set()
+    listing_changed = False
+    if models & MIN_PRICE_MODELS:
+        changed = update_min_room_prices(package_ids)
+        cards.update(changed)
+        listing_changed = bool(changed)
+    if cards:
+        refresh_package_cards(list(cards))
+    if models & SEARCH_MODELS:
+        refresh_search_documents(package_ids)
+
+    keys = list(row_keys) + [dependency_key(Package, pk) for pk in package_ids]
+    if listing_changed:
+        # 起價改變會影響依價格排序 / 篩選的列表
+        keys.append(dependency_key(Package))
+    bump_dependencies(*keys)
@@ -7,6 +7,9 @@ urlpatterns = [
     # 套票列表頁面
     path('packages/', views.package_list, name='package_list'),
     
+    # 套票分面搜尋（不放在 packages/ 底下，避免與 slug 為 search 的大陸列表衝突）
+    path('search/', views.package_search, name='package_search'),
+    
     # 按大陸篩選套票列表
     path('packages/<slug:continent_slug>/', views.package_list_by_continent, name='package_list_by_continent'),
     
@@ -1,157 +1,205 @@
 from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse
-from django.db.models import Prefetch
-from django.conf import settings
-from io import BytesIO
+from django.http import FileResponse, JsonResponse
+from django.core.files.storage import default_storage
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import Package, City, Country, Continent, RoomImage, ItineraryImage, PackageFacet
+from .facets import facet_counts, filter_by_facets, parse_facet_filters
+from .fulltext import SEARCH_RESULT_LIMIT, matching_documents, rank_by_search, search_package_ids
+from .geography import resolve_regions
+from .images import load_pictures
+from .pdf import ensure_itinerary_pdf, pdf_last_modified, pdf_package_queryset, pdf_version
+from .page_cache import add_page_dependencies, add_page_dependency_keys, cache_anonymous_page, dependency_key
+from .queries import apply_listing_options, package_card_queryset, package_detail_queryset, paginate_packages
 
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
+# Create your views here.
 
-from .models import Package, PackageType, City, Country, Continent, Period, Hotel, RoomType, RoomPrice, RoomImage, DailyItinerary, ItineraryImage
+def _render_package_list(request, packages, context):
+    """分頁並渲染套票列表，總數與當頁資料共用同一個查詢"""
+    packages, sort = apply_listing_options(packages, request.GET)
+    page = paginate_packages(
+        packages,
+        page=request.GET.get('page'),
+        cursor=request.GET.get('after'),
+        sort=sort,
+    )
+    # 列表會顯示每張卡片的城市 / 國家 / 大陸，套票新增或上下架也會改變列表內容
+    add_page_dependency_keys(request, dependency_key(Package))
+    add_page_dependencies(request, *(context.get(name) for name in ('continent', 'country', 'city')))
+    for card in page:
+        add_page_dependency_keys(request, dependency_key(Package, card.pk))
+        for model, pk in ((City, card.city_id), (Country, card.country_id), (Continent, card.continent_id)):
+            if pk is not None:
+                add_page_dependency_keys(request, dependency_key(model, pk))
+
+    context.update({
+        'packages': page,
+        'page': page,
+        'total_count': page.total_count,
+        'sort': sort,
+        'min_price': request.GET.get('min_price', ''),
+        'max_price': request.GET.get('max_price', ''),
+    })
+    return render(request, 'main/package_list.html', context)
 
-# Create your views here.
 
+@cache_anonymous_page
 def package_list(request):
     """顯示所有套票的測試頁面"""
-    packages = Package.objects.filter(is_active=True).select_related(
-        'package_type', 'city', 'city__country', 'city__country__continent'
-    ).prefetch_related(
-        'tags',
-        'periods',
-        'periods__hotels',
-        'periods__hotels__room_types',
-        'periods__hotels__room_types__prices',
-        'periods__hotels__room_types__images',
-        'daily_itineraries',
-        'daily_itineraries__images'
-    )
-    
-    context = {
-        'packages': packages,
-        'total_count': packages.count(),
+    return _render_package_list(request, package_card_queryset(), {
         'page_title': '所有套票'
-    }
-    return render(request, 'main/package_list.html', context)
+    })
 
 
+@cache_anonymous_page
 def package_list_by_continent(request, continent_slug):
     """按大陸篩選套票列表"""
-    continent = get_object_or_404(Continent, slug=continent_slug, is_active=True)
-    packages = Package.objects.filter(
-        is_active=True,
-        city__country__continent=continent
-    ).select_related(
-        'package_type', 'city', 'city__country', 'city__country__continent'
-    ).prefetch_related(
-        'tags',
-        'periods',
-        'periods__hotels',
-        'periods__hotels__room_types',
-        'periods__hotels__room_types__prices',
-        'periods__hotels__room_types__images',
-        'daily_itineraries',
-        'daily_itineraries__images'
-    )
-    
-    context = {
-        'packages': packages,
-        'total_count': packages.count(),
+    continent, = resolve_regions(continent_slug)
+    packages = package_card_queryset().filter(continent_id=continent.pk)
+    return _render_package_list(request, packages, {
         'continent': continent,
         'page_title': f'{continent.name} - 套票列表'
-    }
-    return render(request, 'main/package_list.html', context)
+    })
 
 
+@cache_anonymous_page
 def package_list_by_country(request, continent_slug, country_slug):
     """按國家篩選套票列表"""
-    continent = get_object_or_404(Continent, slug=continent_slug, is_active=True)
-    country = get_object_or_404(Country, slug=country_slug, continent=continent, is_active=True)
-    packages = Package.objects.filter(
-        is_active=True,
-        city__country=country
-    ).select_related(
-        'package_type', 'city', 'city__country', 'city__country__continent'
-    ).prefetch_related(
-        'tags',
-        'periods',
-        'periods__hotels',
-        'periods__hotels__room_types',
-        'periods__hotels__room_types__prices',
-        'periods__hotels__room_types__images',
-        'daily_itineraries',
-        'daily_itineraries__images'
-    )
-    
-    context = {
-        'packages': packages,
-        'total_count': packages.count(),
+    continent, country = resolve_regions(continent_slug, country_slug)
+    packages = package_card_queryset().filter(country_id=country.pk)
+    return _render_package_list(request, packages, {
         'continent': continent,
         'country': country,
         'page_title': f'{country.name} ({continent.name}) - 套票列表'
-    }
-    return render(request, 'main/package_list.html', context)
+    })
 
 
+@cache_anonymous_page
 def package_list_by_city(request, continent_slug, country_slug, city_slug):
     """按城市篩選套票列表"""
-    continent = get_object_or_404(Continent, slug=continent_slug, is_active=True)
-    country = get_object_or_404(Country, slug=country_slug, continent=continent, is_active=True)
-    city = get_object_or_404(City, slug=city_slug, country=country, is_active=True)
-    packages = Package.objects.filter(
-        is_active=True,
-        city=city
-    ).select_related(
-        'package_type', 'city', 'city__country', 'city__country__continent'
-    ).prefetch_related(
-        'tags',
-        'periods',
-        'periods__hotels',
-        'periods__hotels__room_types',
-        'periods__hotels__room_types__prices',
-        'periods__hotels__room_types__images',
-        'daily_itineraries',
-        'daily_itineraries__images'
-    )
-    
-    context = {
-        'packages': packages,
-        'total_count': packages.count(),
+    continent, country, city = resolve_regions(continent_slug, country_slug, city_slug)
+    packages = package_card_queryset().filter(city_id=city.pk)
+    return _render_package_list(request, packages, {
         'continent': continent,
         'country': country,
         'city': city,
         'page_title': f'{city.name} ({country.name}, {continent.name}) - 套票列表'
-    }
-    return render(request, 'main/package_list.html', context)
+    })
 
 
+def package_search(request):
+    """
+    套票分面搜尋：依大陸 / 國家 / 城市、套票種類、標籤、價格區間與行程天數篩選，
+    並回傳每個維度的分面數量。加上 ?format=json 可取得 JSON 結果。
+    ?q= 為全文檢索關鍵字，有關鍵字時預設依相關度排序。
+    """
+    query = request.GET.get('q', '').strip()
+    selected = parse_facet_filters(request.GET)
+    packages = filter_by_facets(package_card_queryset(), selected)
+    matched_ids = None
+    default_sort = 'newest'
+    if query:
+        # 總數與分面涵蓋所有符合的套票，只有前 SEARCH_RESULT_LIMIT 筆依相關度排名
+        matched_ids = matching_documents(query).values('package_id')
+        packages = rank_by_search(packages.filter(pk__in=matched_ids), search_package_ids(query))
+        default_sort = 'relevance'
+    packages, sort = apply_listing_options(packages, request.GET, default_sort=default_sort)
+    page = paginate_packages(
+        packages,
+        page=request.GET.get('page'),
+        cursor=request.GET.get('after'),
+        sort=sort,
+    )
+    facets = facet_counts(selected, package_ids=matched_ids)
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'query': query,
+            'total_count': page.total_count,
+            'page': page.number,
+            'num_pages': page.num_pages,
+            'next_cursor': page.next_cursor,
+            'results': [
+                {
+                    'id': card.pk,
+                    'name': card.name,
+                    'subtitle': card.subtitle,
+                    'price': card.price,
+                    'from_price': str(card.from_price) if card.from_price is not None else None,
+                    'image_url': card.image_url,
+                    'url': card.detail_url,
+                    'city': card.city_name,
+                    'country': card.country_name,
+                    'tags': card.tags,
+                }
+                for card in page
+            ],
+            'facets': facets,
+        })
+
+    facet_groups = [
+        {'dimension': dimension, 'label': label, 'values': facets[dimension]}
+        for dimension, label in PackageFacet.DIMENSION_CHOICES
+        if facets[dimension]
+    ]
+    context = {
+        'packages': page,
+        'page': page,
+        'total_count': page.total_count,
+        'facet_groups': facet_groups,
+        'selected': selected,
+        'query': query,
+        'ranked_limit': SEARCH_RESULT_LIMIT,
+        'sort': sort,
+        'min_price': request.GET.get('min_price', ''),
+        'max_price': request.GET.get('max_price', ''),
+        'page_title': '搜尋套票',
+    }
+    return render(request, 'main/package_search.html', context)
+
+
+def _package_tree(package):
+    """列出詳情頁渲染時用到的所有資料列（皆已 prefetch，不會產生查詢）"""
+    yield package
+    yield package.package_type
+    yield from package.tags.all()
+    for period in package.periods.all():
+        yield period
+        for hotel in period.hotels.all():
+            yield hotel
+            for room_type in hotel.room_types.all():
+                yield room_type
+                yield from room_type.prices.all()
+                yield from room_type.images.all()
+    for itinerary in package.daily_itineraries.all():
+        yield itinerary
+        yield from itinerary.images.all()
+
+
+@cache_anonymous_page
 def package_detail(request, continent_slug, country_slug, city_slug, package_slug):
     """顯示單個套票詳情的測試頁面（使用 slug）"""
-    continent = get_object_or_404(Continent, slug=continent_slug, is_active=True)
-    country = get_object_or_404(Country, slug=country_slug, continent=continent, is_active=True)
-    city = get_object_or_404(City, slug=city_slug, country=country, is_active=True)
+    continent, country, city = resolve_regions(continent_slug, country_slug, city_slug)
     package = get_object_or_404(
-        Package.objects.select_related('package_type', 'city', 'city__country', 'city__country__continent')
-        .prefetch_related(
-            'tags',
-            'periods',
-            'periods__hotels',
-            'periods__hotels__room_types',
-            'periods__hotels__room_types__prices',
-            'periods__hotels__room_types__images',
-            Prefetch('daily_itineraries', 
-                     queryset=DailyItinerary.objects.filter(is_active=True).order_by('day_number', 'display_order')
-                     .prefetch_related('images')),
-        ),
+        package_detail_queryset(),
         slug=package_slug,
-        city=city,
+        city_id=city.pk,
         is_active=True
     )
     
+    rows = list(_package_tree(package))
+    add_page_dependencies(request, continent, country, city, *rows)
+
+    # 行程相片的 Django-Filer 圖片已由 prefetch 一併載入；主圖、房間圖片與行程相片的衍生檔一次查詢
+    pictures = load_pictures(
+        [(package.main_image, 'hero')]
+        + [(row.image, 'room') for row in rows if isinstance(row, RoomImage)]
+        + [(row.image, 'itinerary') for row in rows if isinstance(row, ItineraryImage) and row.image_id]
+    )
+
     context = {
+        'pictures': pictures,
         'package': package,
         'continent': continent,
         'country': country,
@@ -162,106 +210,23 @@ def package_detail(request, continent_slug, country_slug, city_slug, package_slu
 
 def package_daily_itinerary_pdf(request, continent_slug, country_slug, city_slug, package_slug):
     """
-    產生指定套票的「每天行程」PDF，提供桌機與手機下載使用。
-    """
-    continent = get_object_or_404(Continent, slug=continent_slug, is_active=True)
-    country = get_object_or_404(Country, slug=country_slug, continent=continent, is_active=True)
-    city = get_object_or_404(City, slug=city_slug, country=country, is_active=True)
-
-    package = get_object_or_404(
-        Package.objects.select_related('package_type', 'city', 'city__country', 'city__country__continent')
-        .prefetch_related(
-            Prefetch(
-                'daily_itineraries',
-                queryset=DailyItinerary.objects.filter(is_active=True).order_by('day_number', 'display_order')
-                .prefetch_related('images'),
-            ),
-        ),
-        slug=package_slug,
-        city=city,
-        is_active=True,
-    )
-
-    # 若沒有每天行程，回傳簡單提示 PDF
-    daily_itineraries = list(package.daily_itineraries.all())
+    提供指定套票的「每天行程」PDF 下載（桌機與手機使用）。
 
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer,
-        pagesize=A4,
-        leftMargin=2 * cm,
-        rightMargin=2 * cm,
-        topMargin=2 * cm,
-        bottomMargin=2 * cm,
-    )
-
-    # ===== 註冊繁體中文字型（請確認字型檔路徑與檔名） =====
-    # 你目前把字型放在：BASE_DIR / 'fonts' / 'NotoSansTC-Regular.ttf'
-    font_path = settings.BASE_DIR / "fonts" / "NotoSansTC-Regular.ttf"
-    try:
-        pdfmetrics.registerFont(TTFont("NotoSansTC", str(font_path)))
-        font_name = "NotoSansTC"
-    except Exception:
-        # 若註冊失敗則退回預設字型（英文正常，中文可能變方框）
-        font_name = "Helvetica"
-
-    styles = getSampleStyleSheet()
-    # 使用自訂中文字型
-    title_style = styles['Title']
-    title_style.fontName = font_name
-    subtitle_style = styles['Heading2']
-    subtitle_style.fontName = font_name
-    heading_style = styles['Heading3']
-    heading_style.fontName = font_name
-    body_style = styles['BodyText']
-    body_style.fontName = font_name
-
-    story = []
-
-    # 標題
-    story.append(Paragraph(f"{package.name}", title_style))
-    if package.subtitle:
-        story.append(Paragraph(str(package.subtitle), subtitle_style))
-    story.append(Spacer(1, 12))
-    story.append(Paragraph("每天行程", heading_style))
-    story.append(Spacer(1, 12))
-
-    if not daily_itineraries:
-        story.append(Paragraph("此套票目前未設定每天行程。", body_style))
-    else:
-        for itinerary in daily_itineraries:
-            day_title = f"第 {itinerary.day_number} 天：{itinerary.title}"
-            story.append(Paragraph(day_title, heading_style))
-            story.append(Spacer(1, 6))
-
-            if itinerary.description:
-                story.append(Paragraph(f"<b>行程描述：</b>{itinerary.description.replace('\n', '<br/>')}", body_style))
-                story.append(Spacer(1, 4))
-
-            # 餐食 / 住宿 / 交通
-            if itinerary.meal_info:
-                story.append(Paragraph(f"<b>餐食：</b>{itinerary.meal_info}", body_style))
-            if itinerary.accommodation:
-                story.append(Paragraph(f"<b>住宿：</b>{itinerary.accommodation}", body_style))
-            if itinerary.transportation:
-                story.append(Paragraph(f"<b>交通：</b>{itinerary.transportation}", body_style))
-
-            if itinerary.meal_info or itinerary.accommodation or itinerary.transportation:
-                story.append(Spacer(1, 4))
-
-            if itinerary.notes:
-                story.append(Paragraph(f"<b>備註：</b>{itinerary.notes.replace('\n', '<br/>')}", body_style))
-                story.append(Spacer(1, 8))
-
-            # 每天之間加上一些空白
-            story.append(Spacer(1, 12))
+    PDF 依版本存放在儲存空間，只有行程變更後第一次下載才需要重新產生；
+    回應帶有 ETag / Last-Modified，瀏覽器重複下載時可直接得到 304。
+    """
+    continent, country, city = resolve_regions(continent_slug, country_slug, city_slug)
+    package = get_object_or_404(pdf_package_queryset(), slug=package_slug, city_id=city.pk)
 
-    doc.build(story)
-    pdf = buffer.getvalue()
-    buffer.close()
+    etag = quote_etag(pdf_version(package))
+    last_modified = int(pdf_last_modified(package).timestamp())
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
 
+    path, _ = ensure_itinerary_pdf(package)
     filename = f"{package.slug}_daily_itinerary.pdf"
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="{filename}"'
-    response.write(pdf)
+    response = FileResponse(default_storage.open(path, 'rb'), as_attachment=True, filename=filename, content_type="application/pdf")
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
     return response